@@ -0,0 +1,293 @@
+import asyncio
+import base64
+import contextvars
+import math
+import os
+import secrets
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import server_metrics
+
+# Tool calls running at once across all clients (GA4 allows 10 concurrent requests per property; 0 disables)
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+# Tool calls one client may run at once; the rest of its calls wait in the queue
+ADMISSION_CLIENT_CONCURRENCY = int(os.getenv("ADMISSION_CLIENT_CONCURRENCY", "4"))
+# Calls waiting per lane; further calls are rejected with 429 straight away
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+# Seconds a call may wait for a slot before it is rejected with 429
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "20"))
+# Share of slots each lane gets while both have calls waiting, e.g. "interactive=4,batch=1"
+ADMISSION_LANE_WEIGHTS = os.getenv("ADMISSION_LANE_WEIGHTS", "interactive=4,batch=1")
+# Optional per-client weights by client id, e.g. "user:admin=2,ip:10.0.0.7=1" (clients not listed weigh 1)
+ADMISSION_CLIENT_WEIGHTS = os.getenv("ADMISSION_CLIENT_WEIGHTS", "")
+# Basic auth credentials (as on the HTTP servers); only callers presenting them are
+# identified by user name and may choose their lane with X-Priority
+API_USERNAME = os.getenv("API_USERNAME", "admin")
+API_PASSWORD = os.getenv("API_PASSWORD", "changeme")
+
+LANES = ("interactive", "batch")
+# Paths whose calls default to the batch lane (REST APIs used by workflows)
+BATCH_PATH_PREFIXES = ("/api/", "/rest/", "/data")
+PRIORITY_HEADER = "x-priority"
+
+# (client, lane) of the request being handled, set by AdmissionMiddleware
+request_client = contextvars.ContextVar("request_client", default=("local", "interactive"))
+
+
+def _parse_weights(value):
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() and weight.strip():
+            weights[name.strip()] = float(weight)
+    return weights
+
+
+class Overloaded(Exception):
+    """A call was not admitted; the client should retry after `retry_after` seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Server busy ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("client", "lane", "tag", "future", "queued_at")
+
+    def __init__(self, client, lane, tag, future):
+        self.client = client
+        self.lane = lane
+        self.tag = tag
+        self.future = future
+        self.queued_at = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Admission control for tool calls: a global and a per-client concurrency
+    limit, with waiting calls served by weighted fair queuing.
+
+    Every (client, lane) pair is a flow whose weight is the lane weight times
+    the client weight. A queued call gets the virtual finish tag
+    max(virtual time, flow's last tag) + 1 / weight, and a freed slot goes to the
+    eligible call with the smallest tag (self-clocked fair queuing). A busy
+    batch client therefore cannot starve interactive callers or other clients.
+    Full lanes and calls that wait longer than `queue_timeout` are rejected with
+    Overloaded, carrying a Retry-After estimate.
+
+    Runs on one event loop; acquire/release are not thread-safe.
+    """
+
+    def __init__(self, capacity, per_client, queue_size, queue_timeout, lane_weights, client_weights=None):
+        self.capacity = capacity
+        self.per_client = per_client
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.lane_weights = lane_weights
+        self.client_weights = client_weights or {}
+        self.active = 0
+        self.active_by_client = {}
+        self.waiters = []
+        self.virtual_time = 0.0
+        self.flow_tags = {}
+        # Moving average of call duration, for Retry-After
+        self.avg_duration = 1.0
+
+    def _weight(self, client, lane):
+        return self.lane_weights.get(lane, 1.0) * self.client_weights.get(client, 1.0)
+
+    def _eligible(self, client):
+        return self.active < self.capacity and self.active_by_client.get(client, 0) < self.per_client
+
+    def queued(self, lane=None):
+        return sum(1 for w in self.waiters if lane is None or w.lane == lane)
+
+    def retry_after(self):
+        """Seconds until a queued call would likely get a slot, rounded up"""
+        backlog = self.active + len(self.waiters)
+        return max(1, math.ceil(self.avg_duration * backlog / max(self.capacity, 1)))
+
+    def _start(self, client):
+        self.active += 1
+        self.active_by_client[client] = self.active_by_client.get(client, 0) + 1
+
+    def _dispatch(self):
+        """Hand freed slots to the eligible waiters with the smallest finish tags"""
+        while self.waiters and self.active < self.capacity:
+            eligible = [w for w in self.waiters if self._eligible(w.client)]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: w.tag)
+            self.waiters.remove(waiter)
+            self.virtual_time = max(self.virtual_time, waiter.tag)
+            self._start(waiter.client)
+            waiter.future.set_result(None)
+
+    def _reject(self, lane, reason):
+        server_metrics.ADMISSION_REJECTED.inc(labels=(lane, reason))
+        return Overloaded(reason, self.retry_after())
+
+    async def acquire(self, client, lane):
+        if not self.waiters and self._eligible(client):
+            self._start(client)
+            server_metrics.ADMISSION_WAIT.observe(0.0, (lane,))
+            return
+        if self.queued(lane) >= self.queue_size:
+            raise self._reject(lane, "queue_full")
+
+        flow = (client, lane)
+        tag = max(self.virtual_time, self.flow_tags.get(flow, 0.0)) + 1.0 / self._weight(client, lane)
+        self.flow_tags[flow] = tag
+        waiter = _Waiter(client, lane, tag, asyncio.get_running_loop().create_future())
+        self.waiters.append(waiter)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done():
+                # Admitted just as we gave up: hand the slot on
+                self.release(client)
+            else:
+                self.waiters.remove(waiter)
+                waiter.future.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject(lane, "timeout") from None
+        server_metrics.ADMISSION_WAIT.observe(time.monotonic() - waiter.queued_at, (lane,))
+
+    def release(self, client, duration=None):
+        self.active -= 1
+        remaining = self.active_by_client.get(client, 1) - 1
+        if remaining:
+            self.active_by_client[client] = remaining
+        else:
+            self.active_by_client.pop(client, None)
+        if duration is not None:
+            self.avg_duration += 0.2 * (duration - self.avg_duration)
+        if not self.waiters:
+            # Idle: restart virtual time so old tags do not grow without bound
+            self.flow_tags.clear()
+            self.virtual_time = 0.0
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, client, lane):
+        """Hold one concurrency slot for `client` in `lane` (no-op when capacity is 0)"""
+        if self.capacity <= 0:
+            yield
+            return
+        await self.acquire(client, lane)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(client, time.monotonic() - started)
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "queued": {lane: self.queued(lane) for lane in LANES},
+            "clients": len(self.active_by_client),
+        }
+
+
+admission = AdmissionController(
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_CLIENT_CONCURRENCY,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_QUEUE_TIMEOUT,
+    _parse_weights(ADMISSION_LANE_WEIGHTS),
+    _parse_weights(ADMISSION_CLIENT_WEIGHTS),
+)
+server_metrics.register_admission_collector(admission)
+
+
+@contextmanager
+def lane(name):
+    """Run the enclosed calls in another lane, keeping the client (e.g. batch for JSON-RPC batches)"""
+    client, _ = request_client.get()
+    token = request_client.set((client, name))
+    try:
+        yield
+    finally:
+        request_client.reset(token)
+
+
+def _authenticated_user(headers):
+    """User name of valid Basic auth credentials in the request, else None"""
+    scheme, _, value = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    if scheme.lower() != "basic":
+        return None
+    try:
+        username, _, password = base64.b64decode(value).decode("utf-8").partition(":")
+    except Exception:
+        return None
+    is_correct_username = secrets.compare_digest(username.encode("utf8"), API_USERNAME.encode("utf8"))
+    is_correct_password = secrets.compare_digest(password.encode("utf8"), API_PASSWORD.encode("utf8"))
+    return username if is_correct_username and is_correct_password else None
+
+
+def _client_id(user, scope):
+    """
+    Who is calling: the authenticated user, else the client address. Unverified
+    names, API keys or tokens are not used, since a client could rotate them to
+    get a fresh share of the slots.
+    """
+    if user is not None:
+        return "user:" + user
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "anonymous"
+
+
+def _lane(headers, path, user):
+    """The route's lane; authenticated callers may pick another one with X-Priority"""
+    if user is not None:
+        priority = headers.get(PRIORITY_HEADER.encode("latin-1"), b"").decode("latin-1").strip().lower()
+        if priority in LANES:
+            return priority
+    return "batch" if path.startswith(BATCH_PATH_PREFIXES) else "interactive"
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware recording who is calling and in which lane, for the
+    admission controller. Calls default to the interactive lane, REST API
+    paths to the batch lane; an X-Priority: interactive|batch header overrides
+    that for callers with valid Basic auth credentials.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        user = _authenticated_user(headers)
+        token = request_client.set((_client_id(user, scope), _lane(headers, scope.get("path", ""), user)))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_client.reset(token)
+
+
+def retry_after_headers(retry_after):
+    return {"Retry-After": str(retry_after)}
+
+
+def install(app):
+    """Add the admission middleware and the 429 handler for Overloaded to a FastAPI app"""
+    from fastapi.responses import JSONResponse
+
+    async def overloaded(request, exc):
+        return JSONResponse(
+            status_code=429,
+            content={"detail": str(exc), "retryAfter": exc.retry_after},
+            headers=retry_after_headers(exc.retry_after)
+        )
+
+    app.add_middleware(AdmissionMiddleware)
+    app.add_exception_handler(Overloaded, overloaded)
@@ -0,0 +1,105 @@
+"""
+In-process stand-in for the GA4 Data API used by the benchmarks.
+
+install() swaps BetaAnalyticsDataClient in the server modules for
+FakeAnalyticsDataClient, which answers run_report with real RunReportResponse
+messages of a configurable size after a configurable delay, so the servers'
+own overhead (parsing, formatting, serialization, locking) is what gets
+measured.
+"""
+import random
+import threading
+import time
+from datetime import timedelta
+
+from google.analytics.data_v1beta.types import (
+    DimensionHeader, DimensionValue, MetricHeader, MetricValue, Row, RunReportResponse
+)
+
+from ga4_dates import resolve_date
+
+
+class FakeAnalyticsDataClient:
+    """Drop-in replacement for BetaAnalyticsDataClient.run_report"""
+
+    # Shared by every instance, since the servers create a client per request
+    rows = 100
+    latency = 0.05
+    jitter = 0.0
+    calls = 0
+    _responses = {}
+    _lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    @classmethod
+    def configure(cls, rows=None, latency=None, jitter=None):
+        """Set response size (rows) and upstream delay (seconds, +/- jitter)"""
+        if rows is not None:
+            cls.rows = rows
+        if latency is not None:
+            cls.latency = latency
+        if jitter is not None:
+            cls.jitter = jitter
+        with cls._lock:
+            cls._responses.clear()
+            cls.calls = 0
+
+    def run_report(self, request, **kwargs):
+        with FakeAnalyticsDataClient._lock:
+            FakeAnalyticsDataClient.calls += 1
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        return self._response(request)
+
+    @classmethod
+    def _response(cls, request):
+        """Build (once per query shape and page) a response page out of cls.rows rows"""
+        dimensions = tuple(d.name for d in request.dimensions)
+        metrics = tuple(m.name for m in request.metrics)
+        date_range = request.date_ranges[0]
+        offset = request.offset
+        limit = request.limit or 10000
+        key = (dimensions, metrics, date_range.start_date, date_range.end_date, offset, limit)
+        with cls._lock:
+            response = cls._responses.get(key)
+        if response is not None:
+            return response
+
+        start = resolve_date(date_range.start_date)
+        days = (resolve_date(date_range.end_date) - start).days + 1
+        rows = []
+        for i in range(offset, min(offset + limit, cls.rows)):
+            day = start + timedelta(days=i % days)
+            values = {
+                "date": day.strftime("%Y%m%d"),
+                "dateHour": day.strftime("%Y%m%d") + f"{i % 24:02d}",
+                "dateHourMinute": day.strftime("%Y%m%d") + f"{i % 24:02d}{i % 60:02d}",
+            }
+            rows.append(Row(
+                dimension_values=[DimensionValue(value=values.get(d, f"{d}-{i // days}")) for d in dimensions],
+                metric_values=[MetricValue(value=str(i + j)) for j in range(len(metrics))]
+            ))
+        response = RunReportResponse(
+            dimension_headers=[DimensionHeader(name=d) for d in dimensions],
+            metric_headers=[MetricHeader(name=m) for m in metrics],
+            rows=rows,
+            row_count=cls.rows
+        )
+        with cls._lock:
+            cls._responses[key] = response
+        return response
+
+
+def install(*modules):
+    """Patch the GA4 client (and credentials) in the given server modules, emptying the client pool"""
+    for module in modules:
+        if hasattr(module, "BetaAnalyticsDataClient"):
+            module.BetaAnalyticsDataClient = FakeAnalyticsDataClient
+        if hasattr(module, "get_credentials"):
+            module.get_credentials = lambda: None
+        if hasattr(module, "client_pool"):
+            module.client_pool.clear()
+    return FakeAnalyticsDataClient
@@ -0,0 +1,183 @@
+"""
+Load scenarios for the HTTP front ends against the fake GA4 backend.
+
+Requests go through httpx's ASGI transport, so no ports, credentials or
+network are involved and results are comparable between runs.
+
+    python benchmarks/load.py                       # every scenario
+    python benchmarks/load.py -s mcp -n 500 -c 32   # one scenario
+    python benchmarks/load.py --json results.json   # save for later comparison
+    python benchmarks/load.py --baseline results.json --tolerance 0.2
+
+With --baseline the exit status is 1 when any scenario's p99 latency or RPS
+is more than `tolerance` worse than the baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# Server modules read their configuration at import time
+os.environ.setdefault("GA4_PROPERTY_ID", "123456789")
+os.environ.setdefault("API_USERNAME", "bench")
+os.environ.setdefault("API_PASSWORD", "bench")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+QUERY = {
+    "dimensions": ["date", "country"],
+    "metrics": ["totalUsers", "sessions"],
+    "date_range_start": "28daysAgo",
+    "date_range_end": "yesterday"
+}
+
+
+def _tool_call(request_id):
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "tools/call",
+        "params": {"name": "get_ga4_data", "arguments": QUERY}
+    }
+
+
+def build_scenarios():
+    """Scenario name -> (ASGI app, path, body factory)"""
+    import ga4_http_server
+    import ga4_mcp_server
+    import mcp_http_bridge
+    import mcp_http_streamable
+    from fake_ga4 import install
+
+    install(ga4_mcp_server, ga4_http_server)
+    return {
+        "mcp": (mcp_http_bridge.app, "/mcp", _tool_call),
+        "stream": (mcp_http_streamable.app, "/stream", _tool_call),
+        "api-data": (mcp_http_bridge.app, "/api/data", lambda i: QUERY),
+        "data": (ga4_http_server.app, "/data", lambda i: QUERY),
+    }
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def run_scenario(app, path, make_body, requests, concurrency):
+    """Send `requests` POSTs with `concurrency` workers; return latency/RPS stats"""
+    auth = (os.environ["API_USERNAME"], os.environ["API_PASSWORD"])
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", auth=auth, timeout=None) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                started = time.perf_counter()
+                response = await client.post(path, json=make_body(i))
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200 or '"error"' in response.text[:200]:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions of results against a baseline"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {previous['p99_ms']}ms -> {current['p99_ms']}ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the GA4 HTTP front ends against a fake GA4 backend")
+    parser.add_argument("-s", "--scenario", action="append",
+                        choices=["mcp", "stream", "api-data", "data"], help="Scenario to run (repeatable; default all)")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--rows", type=int, default=500, help="Rows per fake GA4 response")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake GA4 latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- latency jitter in seconds")
+    parser.add_argument("--cache", action="store_true",
+                        help="Keep the report cache enabled (by default every request reaches the backend)")
+    parser.add_argument("--json", metavar="PATH", help="Write results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare against results saved with --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default 0.2)")
+    args = parser.parse_args()
+
+    if not args.cache:
+        os.environ["GA4_CACHE_TTL"] = "0"
+    scenarios = build_scenarios()
+
+    from fake_ga4 import FakeAnalyticsDataClient
+    FakeAnalyticsDataClient.configure(rows=args.rows, latency=args.latency, jitter=args.jitter)
+
+    results = {}
+    print(f"{'scenario':<10} {'reqs':>6} {'conc':>5} {'errors':>6} {'rps':>8} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>8}")
+    for name in args.scenario or list(scenarios):
+        app, path, make_body = scenarios[name]
+        stats = asyncio.run(run_scenario(app, path, make_body, args.requests, args.concurrency))
+        results[name] = stats
+        print(f"{name:<10} {stats['requests']:>6} {stats['concurrency']:>5} {stats['errors']:>6} "
+              f"{stats['rps']:>8} {stats['p50_ms']:>9} {stats['p99_ms']:>9} {stats['peak_rss_mb']!s:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
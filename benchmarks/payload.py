@@ -0,0 +1,131 @@
+"""
+Payload reduction from get_ga4_data's post-processing options.
+
+Builds typical reports with long-tailed (Zipf-like) metric values, applies
+group_by / top_n / max_rows the way the tool does and compares the size of
+the MCP text content (indented JSON) and an estimate of its token count.
+
+    python benchmarks/payload.py
+    python benchmarks/payload.py --days 90 --json payload.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+os.environ.setdefault("GA4_PROPERTY_ID", "123456789")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ga4_mcp_server import ADDITIVE_METRICS, ROLLUP_ADDITIVE_METRICS  # noqa: E402
+from report_postprocess import postprocess_rows  # noqa: E402
+
+# Rough characters per token for JSON-heavy text
+CHARS_PER_TOKEN = 4
+
+
+def _values(name, count):
+    return [f"{name}-{i}" for i in range(count)]
+
+
+def build_report(dimensions, cardinalities, metrics, days, seed=0):
+    """Every combination of dimension values, with Zipf-like user counts per value rank"""
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=days)
+    combos = [[]]
+    for name in dimensions:
+        if name == "date":
+            values = [(start + timedelta(days=d)).strftime("%Y%m%d") for d in range(days)]
+        else:
+            values = _values(name, cardinalities[name])
+        combos = [combo + [(name, value, rank)] for combo in combos for rank, value in enumerate(values)]
+    rows = []
+    for combo in combos:
+        weight = 1.0
+        for name, _, rank in combo:
+            if name != "date":
+                weight /= rank + 1
+        users = max(1, int(5000 * weight * rng.uniform(0.7, 1.3)))
+        row = {name: value for name, value, _ in combo}
+        for m in metrics:
+            if m in ("totalUsers", "newUsers"):
+                row[m] = str(users)
+            elif m == "sessions":
+                row[m] = str(int(users * rng.uniform(1.1, 1.6)))
+            elif m in ("screenPageViews", "eventCount"):
+                row[m] = str(int(users * rng.uniform(2, 5)))
+            else:
+                row[m] = str(round(rng.uniform(0.2, 0.8), 6))
+        rows.append(row)
+    return rows
+
+
+def scenarios():
+    """Name -> (dimensions, cardinalities, metrics, post-processing options)"""
+    return {
+        "country-trend/group-by-country": (
+            ["date", "country"], {"country": 60}, ["sessions", "screenPageViews"],
+            {"group_by": ["country"]}),
+        "country-trend/top-10": (
+            ["date", "country"], {"country": 60}, ["sessions", "screenPageViews"],
+            {"group_by": ["country"], "top_n": 10}),
+        "landing-pages/top-25": (
+            ["landingPage"], {"landingPage": 5000}, ["sessions", "screenPageViews", "bounceRate"],
+            {"top_n": 25}),
+        "device-channel-trend/max-rows-100": (
+            ["date", "deviceCategory", "sessionDefaultChannelGroup"],
+            {"deviceCategory": 3, "sessionDefaultChannelGroup": 12}, ["totalUsers", "sessions"],
+            {"max_rows": 100}),
+        "device-channel-trend/daily-mean-by-channel": (
+            ["date", "deviceCategory", "sessionDefaultChannelGroup"],
+            {"deviceCategory": 3, "sessionDefaultChannelGroup": 12}, ["screenPageViews", "eventCount"],
+            {"group_by": ["sessionDefaultChannelGroup"], "aggregate": "mean"}),
+    }
+
+
+def _size(rows):
+    # Same encoding as the MCP text content
+    return len(json.dumps(rows, indent=2))
+
+
+def run(days):
+    results = {}
+    for name, (dimensions, cardinalities, metrics, options) in scenarios().items():
+        rows = build_report(dimensions, cardinalities, metrics, days)
+        processed = postprocess_rows(rows, dimensions, metrics, ADDITIVE_METRICS,
+                                     rollup_additive=ROLLUP_ADDITIVE_METRICS, **options)
+        before, after = _size(rows), _size(processed)
+        results[name] = {
+            "rows_before": len(rows),
+            "rows_after": len(processed),
+            "bytes_before": before,
+            "bytes_after": after,
+            "tokens_before": before // CHARS_PER_TOKEN,
+            "tokens_after": after // CHARS_PER_TOKEN,
+            "reduction": round(1 - after / before, 4),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--days", type=int, default=28, help="days in the date range (default 28)")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.days)
+    print(f"{'scenario':<44} {'rows':>13} {'bytes':>19} {'~tokens':>15} {'saved':>7}")
+    for name, r in results.items():
+        print(f"{name:<44} {r['rows_before']:>6} -> {r['rows_after']:<4} "
+              f"{r['bytes_before']:>9} -> {r['bytes_after']:<7} "
+              f"{r['tokens_before']:>7} -> {r['tokens_after']:<5} {r['reduction']:>6.1%}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
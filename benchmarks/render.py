@@ -0,0 +1,69 @@
+"""
+Size of MCP result text per render format (MCP_RESULT_FORMAT).
+
+Renders representative reports as indented JSON (the default), TSV and
+markdown and compares characters, an estimate of tokens and render time.
+
+    python benchmarks/render.py
+    python benchmarks/render.py --precision 1 --max-chars 20000 --json render.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from payload import CHARS_PER_TOKEN, build_report
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from result_render import FORMATS, render_result  # noqa: E402
+
+REPORTS = {
+    "daily-overview": (
+        ["date"], {}, ["totalUsers", "newUsers", "bounceRate", "screenPageViewsPerSession",
+                       "averageSessionDuration"]),
+    "country-trend": (["date", "country"], {"country": 60}, ["sessions", "screenPageViews"]),
+    "landing-pages": (["landingPage"], {"landingPage": 2000}, ["sessions", "screenPageViews", "bounceRate"]),
+    "device-channel-trend": (
+        ["date", "deviceCategory", "sessionDefaultChannelGroup"],
+        {"deviceCategory": 3, "sessionDefaultChannelGroup": 12}, ["totalUsers", "sessions", "engagementRate"]),
+}
+
+
+def run(days, precision, max_chars):
+    results = {}
+    for name, (dimensions, cardinalities, metrics) in REPORTS.items():
+        rows = build_report(dimensions, cardinalities, metrics, days)
+        results[name] = {"rows": len(rows)}
+        for fmt in FORMATS:
+            started = time.perf_counter()
+            text = render_result(rows, fmt, precision, max_chars, metrics)
+            results[name][fmt] = {
+                "chars": len(text),
+                "tokens": len(text) // CHARS_PER_TOKEN,
+                "ms": round((time.perf_counter() - started) * 1000, 2),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--days", type=int, default=28, help="days in the date range (default 28)")
+    parser.add_argument("--precision", type=int, default=2, help="decimal places for tsv/markdown (default 2)")
+    parser.add_argument("--max-chars", type=int, default=0, help="character budget (default 0, none)")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.days, args.precision, args.max_chars)
+    print(f"{'report':<22} {'rows':>6} " + " ".join(f"{fmt + ' chars':>16} {'vs json':>8}" for fmt in FORMATS))
+    for name, r in results.items():
+        base = r["json"]["chars"]
+        print(f"{name:<22} {r['rows']:>6} " + " ".join(
+            f"{r[fmt]['chars']:>16} {r[fmt]['chars'] / base:>8.1%}" for fmt in FORMATS))
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Cold-start time of the ga4-mcp-server entry point.
+
+Imports ga4_mcp_server in fresh interpreters (what a desktop MCP client pays
+on every launch), reports the median and slowest import time and checks that
+the GA4 client library and OpenTelemetry stay off the startup path.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py -n 10 --budget 1.5   # exit 1 when over budget
+    python benchmarks/startup.py --profile            # slowest modules (-X importtime)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules that must only be imported on first use
+DEFERRED = ("google.analytics.data_v1beta", "grpc", "google.oauth2.service_account", "opentelemetry.sdk.trace")
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import ga4_mcp_server
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {DEFERRED!r} if m in sys.modules]}}))
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("GA4_PROPERTY_ID", "123456789")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    return env
+
+
+def measure(runs):
+    """Import times (seconds) over `runs` fresh interpreters, and deferred modules that got loaded"""
+    times, loaded = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], env=_env(), cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        loaded.update(result["loaded"])
+    return times, sorted(loaded)
+
+
+def profile(limit=15):
+    """Slowest modules imported directly by ga4_mcp_server, according to python -X importtime"""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import ga4_mcp_server"], env=_env(),
+                         cwd=ROOT, capture_output=True, text=True).stderr
+    # Children are printed before their parent, one indentation level deeper
+    children = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative) / 1e6, name.strip()))
+        elif depth == 0:
+            if name.strip() == "ga4_mcp_server":
+                return sorted(children, reverse=True)[:limit]
+            children = []
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("-n", "--runs", type=int, default=5, help="fresh interpreters to time (default 5)")
+    parser.add_argument("--budget", type=float, help="fail when the median import time exceeds this (seconds)")
+    parser.add_argument("--profile", action="store_true", help="also list the slowest top-level imports")
+    args = parser.parse_args()
+
+    times, loaded = measure(args.runs)
+    median = statistics.median(times)
+    print(f"import ga4_mcp_server: median {median:.3f}s, max {max(times):.3f}s over {len(times)} runs")
+    if args.profile:
+        for seconds, name in profile():
+            print(f"  {seconds:7.3f}s  {name}")
+
+    failed = False
+    if loaded:
+        print(f"FAIL: imported at startup instead of on first use: {', '.join(loaded)}")
+        failed = True
+    if args.budget is not None and median > args.budget:
+        print(f"FAIL: median import time {median:.3f}s exceeds the {args.budget:.3f}s budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from ga4_logging import get_logger
+from server_metrics import CIRCUIT_STATE, CIRCUIT_TRANSITIONS
+
+logger = get_logger("circuit")
+
+# Consecutive upstream failures that open the circuit (0 disables the breaker)
+GA4_CIRCUIT_FAILURES = int(os.getenv("GA4_CIRCUIT_FAILURES", "5"))
+# Seconds the circuit stays open before probe calls are let through
+GA4_CIRCUIT_RESET = float(os.getenv("GA4_CIRCUIT_RESET", "30"))
+# Probe calls allowed at once while half-open
+GA4_CIRCUIT_PROBES = int(os.getenv("GA4_CIRCUIT_PROBES", "1"))
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+# Gauge value per state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# HTTP-style status codes of google.api_core errors that mean the upstream, not the request, failed
+UPSTREAM_FAILURE_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"GA4 is failing, circuit open; not calling it for another {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(error):
+    """
+    True for errors that say GA4 is unhealthy (unavailable, timeouts, quota,
+    server errors, broken connections); False for errors caused by the request
+    itself, such as an invalid dimension name, which must not trip the breaker.
+    """
+    code = getattr(error, "code", None)
+    # Errors without an HTTP-style code (raw gRPC, connection, timeout errors) count as failures
+    return code in UPSTREAM_FAILURE_CODES if isinstance(code, int) else True
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an upstream service.
+
+    Closed: calls go through; `failure_threshold` consecutive upstream failures
+    open the circuit. Open: before_call() raises CircuitOpenError without
+    touching the upstream, for `reset_timeout` seconds. Half-open: up to
+    `probes` calls are let through; a success closes the circuit, a failure
+    opens it again. `clock` returns monotonic seconds (injectable for tests).
+    Thread-safe.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout, probes=1, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probes = max(probes, 1)
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.changed_at = time.time()
+        self.last_error = None
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(STATE_VALUES[CLOSED], (name,))
+
+    def _transition(self, state):
+        previous, self.state = self.state, state
+        self.changed_at = time.time()
+        CIRCUIT_STATE.set(STATE_VALUES[state], (self.name,))
+        CIRCUIT_TRANSITIONS.inc(labels=(self.name, state))
+        log = logger.warning if state == OPEN else logger.info
+        log("Circuit %s: %s -> %s", self.name, previous, state,
+            extra={"fields": {"failures": self.failures, "last_error": self.last_error}})
+
+    def before_call(self):
+        """
+        Admit one upstream call, or raise CircuitOpenError.
+
+        Returns:
+            True when the call is a half-open probe (pass it back to the record_* methods).
+        """
+        if self.failure_threshold <= 0:
+            return False
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self.reset_timeout - self.clock()
+                if remaining > 0:
+                    raise CircuitOpenError(remaining)
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.probes:
+                    raise CircuitOpenError(self.reset_timeout)
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def record_success(self, probe=False):
+        with self._lock:
+            if probe:
+                self._probes_in_flight -= 1
+            self.failures = 0
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED)
+
+    def record_failure(self, error, probe=False):
+        """Count a failed call; errors caused by the request itself count as successes"""
+        if not is_upstream_failure(error):
+            self.record_success(probe)
+            return
+        with self._lock:
+            if probe:
+                self._probes_in_flight -= 1
+            self.failures += 1
+            self.last_error = str(error)[:200]
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = self.clock()
+                self._transition(OPEN)
+
+    def snapshot(self):
+        """State for health endpoints"""
+        with self._lock:
+            snapshot = {
+                "state": self.state,
+                "consecutiveFailures": self.failures,
+                "since": datetime.fromtimestamp(self.changed_at).isoformat(),
+                "lastError": self.last_error
+            }
+            if self.state == OPEN:
+                snapshot["retryAfter"] = max(round(self.opened_at + self.reset_timeout - self.clock(), 1), 0)
+            return snapshot
@@ -0,0 +1,122 @@
+import re
+from datetime import date, timedelta
+
+# Units a long date range can be split into
+SHARD_UNITS = ("week", "month")
+# Dimensions that put every row inside a single day; their values start with YYYYMMDD
+DATE_DIMENSIONS = frozenset(["date", "dateHour", "dateHourMinute"])
+
+_DAYS_AGO_RE = re.compile(r"^(\d+)daysAgo$")
+# GA4 accepts at most 4 date ranges per report
+MAX_DATE_RANGES = 4
+_RANGE_NAME_RE = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+
+
+def resolve_date(value, today=None):
+    """Resolve a GA4 date string (YYYY-MM-DD, 'today', 'yesterday', 'NdaysAgo') to a date"""
+    today = today or date.today()
+    value = str(value).strip()
+    if value == "today":
+        return today
+    if value == "yesterday":
+        return today - timedelta(days=1)
+    match = _DAYS_AGO_RE.match(value)
+    if match:
+        return today - timedelta(days=int(match.group(1)))
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Unsupported date '{value}'. Use YYYY-MM-DD, 'today', 'yesterday' or 'NdaysAgo'.")
+
+
+def resolve_date_range(start, end, today=None):
+    """Resolve a GA4 start/end pair to dates, rejecting inverted ranges"""
+    start_date = resolve_date(start, today)
+    end_date = resolve_date(end, today)
+    if start_date > end_date:
+        raise ValueError(f"date_range_start ({start}) is after date_range_end ({end})")
+    return start_date, end_date
+
+
+def parse_date_ranges(ranges, today=None):
+    """
+    Validate the named date ranges of a comparison report.
+
+    Args:
+        ranges: List of 2 to 4 {"start_date", "end_date", "name"} dicts (name optional);
+                the first is the period the others are compared with.
+
+    Returns:
+        List of (start, end, name) tuples with dates resolved to YYYY-MM-DD.
+    """
+    if not isinstance(ranges, list) or not 2 <= len(ranges) <= MAX_DATE_RANGES:
+        raise ValueError(f"date_ranges must be a list of 2 to {MAX_DATE_RANGES} date ranges.")
+    if len(ranges) == 2:
+        default_names = ["current", "previous"]
+    else:
+        default_names = ["current"] + [f"period_{i}" for i in range(1, len(ranges))]
+    parsed = []
+    for i, date_range in enumerate(ranges):
+        if not isinstance(date_range, dict) or "start_date" not in date_range or "end_date" not in date_range:
+            raise ValueError("Each date range needs a start_date and an end_date.")
+        start, end = resolve_date_range(date_range["start_date"], date_range["end_date"], today)
+        name = str(date_range.get("name") or default_names[i])
+        if not _RANGE_NAME_RE.match(name) or name.startswith(("date_range_", "RESERVED_")):
+            raise ValueError(f"Invalid date range name '{name}': use letters, digits and underscores, "
+                             f"not starting with 'date_range_' or 'RESERVED_'.")
+        parsed.append((start.isoformat(), end.isoformat(), name))
+    names = [name for _, _, name in parsed]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Date range names must be unique, got {names}.")
+    return parsed
+
+
+def settled_on(day, settling_days):
+    """First date on which a day's data no longer changes: `settling_days` full days after it ended"""
+    return day + timedelta(days=settling_days + 1)
+
+
+def classify_date_range(start_date, end_date, settling_days, today=None):
+    """
+    How settled the data of a resolved date range is.
+
+    Returns:
+        'intraday' when the range includes today, 'recent' when it reaches into
+        the last `settling_days` days (GA4 may still revise them), otherwise
+        'historical' (the data no longer changes).
+    """
+    today = today or date.today()
+    if end_date >= today:
+        return "intraday"
+    if today < settled_on(end_date, settling_days):
+        return "recent"
+    return "historical"
+
+
+def split_date_range(start, end, unit, today=None):
+    """
+    Split a date range into consecutive week or month shards.
+
+    Weeks start on Monday and months on the 1st; the first and last shard are
+    clipped to the requested range.
+
+    Returns:
+        List of (start, end) tuples of YYYY-MM-DD strings in chronological order.
+    """
+    if unit not in SHARD_UNITS:
+        raise ValueError(f"shard_by must be one of {list(SHARD_UNITS)}, got '{unit}'")
+    start_date, end_date = resolve_date_range(start, end, today)
+
+    shards = []
+    shard_start = start_date
+    while shard_start <= end_date:
+        if unit == "week":
+            next_start = shard_start + timedelta(days=7 - shard_start.weekday())
+        elif shard_start.month == 12:
+            next_start = date(shard_start.year + 1, 1, 1)
+        else:
+            next_start = date(shard_start.year, shard_start.month + 1, 1)
+        shard_end = min(next_start - timedelta(days=1), end_date)
+        shards.append((shard_start.isoformat(), shard_end.isoformat()))
+        shard_start = next_start
+    return shards
@@ -1,6 +1,7 @@
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Union, Dict, Any
 import uvicorn
@@ -8,20 +9,27 @@ import os
 import sys
 import secrets
 from datetime import datetime
+from contextlib import asynccontextmanager
 
 # Import the GA4 functions from the MCP server
-from ga4_mcp_server import (
-    load_dimensions, load_metrics, GA4_PROPERTY_ID,
-    credentials, BetaAnalyticsDataClient, DateRange, Dimension, 
-    Metric, RunReportRequest, Filter, FilterExpression, 
-    FilterExpressionList
-)
-import json
+from ga4_mcp_server import load_dimensions, load_metrics, start_token_refresh, ga4_breaker, GA4_PROPERTY_ID
+from ga4_dates import parse_date_ranges
+from mcp_dispatch import registry
+from report_postprocess import compare_columns
+import server_metrics
+import admission
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Fetch the GA4 access token in the background before the first request"""
+    start_token_refresh()
+    yield
 
 app = FastAPI(
     title="GA4 Analytics API for n8n",
     description="HTTP API wrapper for Google Analytics 4 data access",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Basic auth setup
@@ -60,6 +68,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(server_metrics.InFlightMiddleware)
+admission.install(app)
 
 # Pydantic models for request/response
 class GA4DataRequest(BaseModel):
@@ -79,10 +89,34 @@ class GA4DataRequest(BaseModel):
         default="yesterday",
         description="End date (YYYY-MM-DD or relative like 'yesterday')"
     )
+    date_ranges: Optional[List[Dict[str, Any]]] = Field(
+        default=None,
+        description="2-4 named date ranges ({start_date, end_date, name}) to compare; replaces date_range_start/end"
+    )
     dimension_filter: Optional[Dict[str, Any]] = Field(
         default=None,
         description="GA4 FilterExpression as JSON object"
     )
+    group_by: Optional[List[str]] = Field(
+        default=None,
+        description="Subset of the dimensions to group rows by (metrics that can be summed across the dropped ones only)"
+    )
+    aggregate: str = Field(
+        default="sum",
+        description="How group_by combines metrics: 'sum' or 'mean'"
+    )
+    top_n: Optional[int] = Field(
+        default=None,
+        description="Keep the top n rows by sort_by and fold the rest into an '(other)' row"
+    )
+    sort_by: Optional[str] = Field(
+        default=None,
+        description="Metric ranking rows for top_n and max_rows (default: first metric)"
+    )
+    max_rows: Optional[int] = Field(
+        default=None,
+        description="Row budget; keeps the most significant rows plus an '(other)' row"
+    )
 
 class CategoryResponse(BaseModel):
     count: int
@@ -95,9 +129,16 @@ async def root():
         "status": "online",
         "service": "GA4 Analytics API",
         "property_id": GA4_PROPERTY_ID,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "upstream": ga4_breaker.snapshot()
     }
 
+# /metrics already lists GA4 metric categories here, so Prometheus scrapes /prometheus
+@app.get("/prometheus", tags=["Health"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus metrics: GA4 RPC latency, row counts, in-flight requests, cache stats"""
+    return PlainTextResponse(server_metrics.REGISTRY.render(), media_type=server_metrics.CONTENT_TYPE)
+
 @app.get("/dimensions", tags=["Metadata"])
 async def list_dimensions(username: str = Depends(verify_credentials)):
     """List all available dimension categories"""
@@ -187,62 +228,49 @@ async def get_ga4_data(request: GA4DataRequest, username: str = Depends(verify_c
         if not parsed_metrics:
             raise HTTPException(status_code=400, detail="Metrics list cannot be empty")
         
-        # Build filter expression if provided
-        filter_expression = None
-        if request.dimension_filter:
-            filter_expression = build_filter_expression(request.dimension_filter)
-            if filter_expression is None:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Invalid dimension_filter structure or invalid dimension name"
-                )
-        
-        # Make GA4 API call
-        if credentials:
-            client = BetaAnalyticsDataClient(credentials=credentials)
-        else:
-            client = BetaAnalyticsDataClient()
-        
-        dimension_objects = [Dimension(name=d) for d in parsed_dimensions]
-        metric_objects = [Metric(name=m) for m in parsed_metrics]
-        
-        api_request = RunReportRequest(
-            property=f"properties/{GA4_PROPERTY_ID}",
-            dimensions=dimension_objects,
-            metrics=metric_objects,
-            date_ranges=[DateRange(
-                start_date=request.date_range_start,
-                end_date=request.date_range_end
-            )],
-            dimension_filter=filter_expression
-        )
-        
-        response = client.run_report(api_request)
-        
-        # Format response
-        result = []
-        for row in response.rows:
-            data_row = {}
-            for i, dimension_header in enumerate(response.dimension_headers):
-                if i < len(row.dimension_values):
-                    data_row[dimension_header.name] = row.dimension_values[i].value
-            for i, metric_header in enumerate(response.metric_headers):
-                if i < len(row.metric_values):
-                    data_row[metric_header.name] = row.metric_values[i].value
-            result.append(data_row)
-        
-        return {
-            "data": result,
-            "rowCount": len(result),
+        # Runs through the shared dispatch core: pooled clients, result cache, metrics
+        result = await registry.call("get_ga4_data", {
             "dimensions": parsed_dimensions,
             "metrics": parsed_metrics,
+            "date_range_start": request.date_range_start,
+            "date_range_end": request.date_range_end,
+            "date_ranges": request.date_ranges,
+            "dimension_filter": request.dimension_filter,
+            "group_by": request.group_by,
+            "aggregate": request.aggregate,
+            "top_n": request.top_n,
+            "sort_by": request.sort_by,
+            "max_rows": request.max_rows
+        }, "rest")
+        if isinstance(result, dict) and "error" in result:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Error fetching GA4 data: {result['error']}"
+            )
+        rows = result["data"] if isinstance(result, dict) else result
+        if request.date_ranges:
+            # Comparison rows carry per-range values, deltas and percent changes of every metric
+            range_names = [name for _, _, name in parse_date_ranges(request.date_ranges)]
+            parsed_metrics = compare_columns(parsed_metrics, range_names)
+        
+        response = {
+            "data": rows,
+            "rowCount": len(rows),
+            "dimensions": request.group_by or parsed_dimensions,
+            "metrics": parsed_metrics,
             "dateRange": {
                 "start": request.date_range_start,
                 "end": request.date_range_end
             }
         }
+        if request.date_ranges:
+            response["dateRanges"] = request.date_ranges
+        if isinstance(result, dict) and result.get("stale"):
+            # GA4 failed and the last good result was served from the cache
+            response.update(stale=True, cachedAt=result["cachedAt"], staleReason=result["staleReason"])
+        return response
         
-    except HTTPException:
+    except (HTTPException, admission.Overloaded):
         raise
     except Exception as e:
         raise HTTPException(
@@ -250,88 +278,6 @@ async def get_ga4_data(request: GA4DataRequest, username: str = Depends(verify_c
             detail=f"Error fetching GA4 data: {str(e)}"
         )
 
-def build_filter_expression(filter_dict: Dict[str, Any]) -> Optional[FilterExpression]:
-    """Build GA4 FilterExpression from dictionary"""
-    try:
-        # Load valid dimensions
-        valid_dimensions = set()
-        dims_json = load_dimensions()
-        for cat in dims_json.values():
-            valid_dimensions.update(cat.keys())
-        
-        return _build_filter_expr_recursive(filter_dict, valid_dimensions)
-    except Exception as e:
-        print(f"Error building filter expression: {e}", file=sys.stderr)
-        return None
-
-def _build_filter_expr_recursive(expr: Dict[str, Any], valid_dimensions: set) -> Optional[FilterExpression]:
-    """Recursive helper to build FilterExpression"""
-    if 'andGroup' in expr:
-        expressions = []
-        for e in expr['andGroup']['expressions']:
-            built_expr = _build_filter_expr_recursive(e, valid_dimensions)
-            if built_expr is None:
-                return None
-            expressions.append(built_expr)
-        return FilterExpression(and_group=FilterExpressionList(expressions=expressions))
-    
-    if 'orGroup' in expr:
-        expressions = []
-        for e in expr['orGroup']['expressions']:
-            built_expr = _build_filter_expr_recursive(e, valid_dimensions)
-            if built_expr is None:
-                return None
-            expressions.append(built_expr)
-        return FilterExpression(or_group=FilterExpressionList(expressions=expressions))
-    
-    if 'notExpression' in expr:
-        built_expr = _build_filter_expr_recursive(expr['notExpression'], valid_dimensions)
-        if built_expr is None:
-            return None
-        return FilterExpression(not_expression=built_expr)
-    
-    if 'filter' in expr:
-        f = expr['filter']
-        field = f.get('fieldName')
-        if not field or field not in valid_dimensions:
-            return None
-        
-        if 'stringFilter' in f:
-            sf = f['stringFilter']
-            match_type_map = {
-                'EXACT': Filter.StringFilter.MatchType.EXACT,
-                'BEGINS_WITH': Filter.StringFilter.MatchType.BEGINS_WITH,
-                'ENDS_WITH': Filter.StringFilter.MatchType.ENDS_WITH,
-                'CONTAINS': Filter.StringFilter.MatchType.CONTAINS,
-                'FULL_REGEXP': Filter.StringFilter.MatchType.FULL_REGEXP,
-                'PARTIAL_REGEXP': Filter.StringFilter.MatchType.PARTIAL_REGEXP
-            }
-            match_type = match_type_map.get(
-                sf.get('matchType', 'EXACT'),
-                Filter.StringFilter.MatchType.EXACT
-            )
-            
-            return FilterExpression(filter=Filter(
-                field_name=field,
-                string_filter=Filter.StringFilter(
-                    value=sf.get('value', ''),
-                    match_type=match_type,
-                    case_sensitive=sf.get('caseSensitive', False)
-                )
-            ))
-        
-        if 'inListFilter' in f:
-            ilf = f['inListFilter']
-            return FilterExpression(filter=Filter(
-                field_name=field,
-                in_list_filter=Filter.InListFilter(
-                    values=ilf.get('values', []),
-                    case_sensitive=ilf.get('caseSensitive', False)
-                )
-            ))
-    
-    return None
-
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
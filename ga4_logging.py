@@ -0,0 +1,138 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# Minimum level emitted by the "ga4" loggers
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line, for the container log driver) or "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Share of DEBUG records kept (per-request headers/bodies are logged at DEBUG)
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+# Records buffered for the writer thread; further records are dropped, never blocking callers
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Keys whose values are never written to the logs (matched case-insensitively, by substring)
+REDACTED_KEYS = ("authorization", "cookie", "password", "private_key", "secret", "token", "api-key", "api_key")
+REDACTED = "[REDACTED]"
+
+
+def redact(value):
+    """Return a copy of value with sensitive keys masked, recursing into dicts and lists"""
+    if isinstance(value, dict):
+        return {
+            k: REDACTED if any(s in str(k).lower() for s in REDACTED_KEYS) else redact(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a random share of DEBUG records; INFO and above always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks the caller.
+
+    Only the message interpolation happens on the calling thread; redaction,
+    formatting and the actual write run on the listener thread. When the queue
+    is full the record is dropped and counted.
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; structured fields come from extra={"fields": {...}}"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(redact(fields))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format with redacted structured fields appended"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + json.dumps(redact(fields), default=str)
+        return line
+
+
+_listener = None
+
+
+def configure_logging():
+    """Route the "ga4" logger hierarchy through the non-blocking queue (idempotent)"""
+    global _listener
+
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_DEBUG_SAMPLE_RATE))
+
+    logger = logging.getLogger("ga4")
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    # Drain buffered records on exit, including sys.exit() during startup checks
+    atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    """Logger under the "ga4" hierarchy (get_logger("http") returns "ga4.http")"""
+    configure_logging()
+    return logging.getLogger(f"ga4.{name}")
@@ -1,13 +1,72 @@
 from fastmcp import FastMCP
-from google.analytics.data_v1beta import BetaAnalyticsDataClient
-from google.analytics.data_v1beta.types import (
-    DateRange, Dimension, Metric, RunReportRequest, Filter, FilterExpression, FilterExpressionList
-)
-from google.oauth2 import service_account
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import asyncio
+import contextvars
+import itertools
 import os
 import sys
 import json
 import tempfile
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from ga4_logging import get_logger
+from ga4_dates import (
+    DATE_DIMENSIONS, SHARD_UNITS, classify_date_range, parse_date_ranges, resolve_date, resolve_date_range,
+    split_date_range
+)
+from report_cache import FRESH, STALE, ReportCache
+from report_batcher import report_batcher
+from report_planner import derive_rows
+from report_postprocess import postprocess_rows
+from report_store import ReportStore
+from server_metrics import (
+    CACHE_DERIVED, REPORT_ROWS, RUN_REPORT_ERRORS, RUN_REPORT_LATENCY,
+    register_cache_collector, register_token_collector
+)
+from circuit_breaker import GA4_CIRCUIT_FAILURES, GA4_CIRCUIT_PROBES, GA4_CIRCUIT_RESET, CircuitBreaker
+from hedging import hedge_allowed, hedge_policy
+from token_refresh import TokenRefresher
+from tracing import set_attributes, start_span
+
+if TYPE_CHECKING:
+    from google.analytics.data_v1beta import BetaAnalyticsDataClient
+    from google.analytics.data_v1beta.types import (
+        DateRange, Dimension, Metric, RunReportRequest, Filter, FilterExpression, FilterExpressionList
+    )
+    from google.oauth2 import service_account
+
+# The GA4 client library (gRPC, protobuf message types) is a large part of start-up
+# time, so it is imported by _import_ga4() on the first report or credentials call
+_GA4_TYPES = ("DateRange", "Dimension", "Metric", "RunReportRequest", "Filter", "FilterExpression",
+              "FilterExpressionList")
+_GA4_NAMES = ("BetaAnalyticsDataClient", "service_account") + _GA4_TYPES
+_ga4_imported = False
+
+def _import_ga4():
+    """Import the GA4 client library into this module (names already set, e.g. by tests, are kept)"""
+    global _ga4_imported
+    if _ga4_imported:
+        return
+    from google.analytics.data_v1beta import BetaAnalyticsDataClient, types
+    from google.oauth2 import service_account
+    module_globals = globals()
+    module_globals.setdefault("BetaAnalyticsDataClient", BetaAnalyticsDataClient)
+    module_globals.setdefault("service_account", service_account)
+    for name in _GA4_TYPES:
+        module_globals.setdefault(name, getattr(types, name))
+    _ga4_imported = True
+
+def __getattr__(name):
+    # Lazy GA4 names accessed from other modules (ga4_mcp_server.BetaAnalyticsDataClient)
+    if name in _GA4_NAMES:
+        _import_ga4()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+logger = get_logger("server")
 
 # Configuration from environment variables
 GA4_PROPERTY_ID = os.getenv("GA4_PROPERTY_ID")
@@ -19,33 +78,79 @@ GA4_PRIVATE_KEY = os.getenv("GA4_PRIVATE_KEY")
 GA4_CLIENT_EMAIL = os.getenv("GA4_CLIENT_EMAIL")
 GA4_CLIENT_ID = os.getenv("GA4_CLIENT_ID")
 
+# Number of GA4 Data API clients (each with its own gRPC channel) shared by all requests
+GA4_CLIENT_POOL_SIZE = int(os.getenv("GA4_CLIENT_POOL_SIZE", "4"))
+
+# Rows requested per GA4 page, and the most rows fetched for one date range; by default
+# one page, raise GA4_MAX_ROWS to follow further pages (larger tool results)
+GA4_PAGE_SIZE = int(os.getenv("GA4_PAGE_SIZE", "10000"))
+GA4_MAX_ROWS = int(os.getenv("GA4_MAX_ROWS", "10000"))
+
+# Maximum number of date shards fetched in parallel for a single report
+GA4_SHARD_CONCURRENCY = int(os.getenv("GA4_SHARD_CONCURRENCY", "4"))
+
+# Local store for incremental (materialized) reports
+GA4_STORE_PATH = os.getenv("GA4_STORE_PATH", os.path.join(tempfile.gettempdir(), "ga4_report_store.sqlite3"))
+# Days GA4 may keep revising after they end; stored days younger than this are re-fetched
+GA4_SETTLING_DAYS = int(os.getenv("GA4_SETTLING_DAYS", "3"))
+
+# In-memory result cache for get_ga4_data (TTL in seconds, 0 disables caching); this TTL applies
+# to ranges reaching into the last GA4_SETTLING_DAYS days, which GA4 may still revise
+GA4_CACHE_TTL = int(os.getenv("GA4_CACHE_TTL", "300"))
+# TTL for ranges that ended before the settling window (their data no longer changes)
+GA4_CACHE_TTL_HISTORICAL = int(os.getenv("GA4_CACHE_TTL_HISTORICAL", "2592000"))
+# TTL for ranges that include today, which GA4 updates throughout the day
+GA4_CACHE_TTL_INTRADAY = int(os.getenv("GA4_CACHE_TTL_INTRADAY", "30"))
+GA4_CACHE_MAX_ENTRIES = int(os.getenv("GA4_CACHE_MAX_ENTRIES", "256"))
+# Seconds an expired entry is still served while one background refresh runs
+GA4_CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("GA4_CACHE_STALE_WHILE_REVALIDATE", "600"))
+# Seconds the last good entry is served (marked stale) when GA4 errors or is out of quota
+GA4_CACHE_STALE_IF_ERROR = int(os.getenv("GA4_CACHE_STALE_IF_ERROR", "86400"))
+
 # Validate GA4_PROPERTY_ID
 if not GA4_PROPERTY_ID:
-    print("ERROR: GA4_PROPERTY_ID environment variable not set", file=sys.stderr)
-    print("Please set it to your GA4 property ID (e.g., 123456789)", file=sys.stderr)
+    logger.error("GA4_PROPERTY_ID environment variable not set. "
+                 "Please set it to your GA4 property ID (e.g., 123456789)")
     sys.exit(1)
 
 # Initialize credentials as None - will be created when needed
 credentials = None
+# Background access token refresher for `credentials`
+token_refresher = None
+_credentials_lock = threading.Lock()
 
 def get_credentials():
-    """Get or create Google Analytics credentials"""
-    global credentials
+    """Get or create Google Analytics credentials, starting their background token refresh"""
+    global credentials, token_refresher
     
     if credentials is not None:
         return credentials
     
+    with _credentials_lock:
+        if credentials is None:
+            created = _create_credentials()
+            token_refresher = TokenRefresher(created)
+            token_refresher.start()
+            credentials = created
+    return credentials
+
+def start_token_refresh():
+    """Create the credentials and fetch the first access token in the background, before any request"""
+    def prefetch():
+        try:
+            get_credentials()
+        except Exception as e:
+            logger.warning("Could not create GA4 credentials at startup: %s", e)
+    threading.Thread(target=prefetch, name="ga4-credentials", daemon=True).start()
+
+def _create_credentials():
+    """Build service account credentials from the GA4_* environment variables"""
     if not all([GA4_PROJECT_ID, GA4_PRIVATE_KEY_ID, GA4_PRIVATE_KEY, GA4_CLIENT_EMAIL, GA4_CLIENT_ID]):
-        print("ERROR: No valid credentials found", file=sys.stderr)
-        print("Please provide all of these environment variables:", file=sys.stderr)
-        print("   - GA4_PROJECT_ID", file=sys.stderr)
-        print("   - GA4_PRIVATE_KEY_ID", file=sys.stderr)
-        print("   - GA4_PRIVATE_KEY", file=sys.stderr)
-        print("   - GA4_CLIENT_EMAIL", file=sys.stderr)
-        print("   - GA4_CLIENT_ID", file=sys.stderr)
+        logger.error("No valid credentials found. Please provide all of these environment variables: "
+                     "GA4_PROJECT_ID, GA4_PRIVATE_KEY_ID, GA4_PRIVATE_KEY, GA4_CLIENT_EMAIL, GA4_CLIENT_ID")
         raise ValueError("Missing required environment variables")
     
-    print("Creating credentials from environment variables", file=sys.stderr)
+    logger.info("Creating credentials from environment variables")
     
     # Process the private key - handle different formats
     private_key = GA4_PRIVATE_KEY
@@ -74,18 +179,69 @@ def get_credentials():
         "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{GA4_CLIENT_EMAIL.replace('@', '%40')}"
     }
     
+    _import_ga4()
     try:
         # Create credentials object
-        credentials = service_account.Credentials.from_service_account_info(
+        return service_account.Credentials.from_service_account_info(
             credentials_info,
             scopes=["https://www.googleapis.com/auth/analytics.readonly"]
         )
-        return credentials
     except Exception as e:
-        print(f"ERROR: Failed to create credentials: {e}", file=sys.stderr)
-        print("Please check your GA4_PRIVATE_KEY format", file=sys.stderr)
+        logger.error("Failed to create credentials: %s. Please check your GA4_PRIVATE_KEY format", e)
         raise
 
+# Client pool is filled on first use and shared by every transport
+client_pool = []
+_client_pool_lock = threading.Lock()
+_client_pool_counter = itertools.count()
+
+def get_client():
+    """Get a GA4 Data API client from the shared pool (round-robin)"""
+    with _client_pool_lock:
+        if not client_pool:
+            _import_ga4()
+            creds = get_credentials()
+            client_pool.extend(
+                BetaAnalyticsDataClient(credentials=creds) for _ in range(max(GA4_CLIENT_POOL_SIZE, 1))
+            )
+        return client_pool[next(_client_pool_counter) % len(client_pool)]
+
+def other_client(client):
+    """Another pooled client than `client` (a separate gRPC channel), or None with a pool of one"""
+    with _client_pool_lock:
+        if len(client_pool) < 2 or client not in client_pool:
+            return None
+        return client_pool[(client_pool.index(client) + 1) % len(client_pool)]
+
+# Initialize report store as None - will be created when needed
+report_store = None
+
+def get_report_store():
+    """Get or create the local materialized report store"""
+    global report_store
+
+    if report_store is None:
+        report_store = ReportStore(GA4_STORE_PATH)
+    return report_store
+
+# Result cache shared by every transport and the warm-query scheduler
+report_cache = ReportCache(
+    GA4_CACHE_TTL,
+    GA4_CACHE_MAX_ENTRIES,
+    stale_while_revalidate=GA4_CACHE_STALE_WHILE_REVALIDATE,
+    stale_if_error=GA4_CACHE_STALE_IF_ERROR
+)
+register_cache_collector(report_cache)
+register_token_collector(lambda: token_refresher)
+# Stops calling GA4 while it keeps failing; shared by every pooled client
+ga4_breaker = CircuitBreaker("ga4", GA4_CIRCUIT_FAILURES, GA4_CIRCUIT_RESET, GA4_CIRCUIT_PROBES)
+# Background refreshes of stale cache entries
+revalidation_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ga4-revalidate")
+
+# Set by streaming transports to a callable(pages, rows, total_rows) that receives
+# progress increments while a report is fetched (shard threads inherit it)
+report_progress = contextvars.ContextVar("report_progress", default=None)
+
 # Initialize FastMCP
 mcp = FastMCP("Google Analytics 4")
 
@@ -388,6 +544,33 @@ GA4_METRICS = {
     }
 }
 
+# Metrics that can be summed across date shards. User-scoped counts (totalUsers,
+# activeUsers, purchasers, ...) and ratios/averages are deliberately excluded:
+# the same user shows up in several shards, so per-shard values cannot be added.
+ADDITIVE_METRICS = frozenset([
+    "newUsers", "sessions", "engagedSessions", "screenPageViews", "eventCount",
+    "eventValue", "conversions", "userEngagementDuration", "totalRevenue",
+    "purchaseRevenue", "grossPurchaseRevenue", "itemRevenue", "grossItemRevenue",
+    "transactions", "ecommercePurchases", "checkouts", "refunds", "refundAmount",
+    "shippingAmount", "taxAmount", "itemViews", "itemsAddedToCart", "itemsCheckedOut",
+    "itemPurchaseQuantity", "itemListViews", "itemListClicks", "itemsClickedInList",
+    "itemsViewedInList", "itemPromotionViews", "itemPromotionClicks",
+    "itemsClickedInPromotion", "itemsViewedInPromotion", "totalAdRevenue", "adRevenue",
+    "adImpressions", "publisherAdRevenue", "publisherAdImpressions", "publisherAdClicks",
+    "organicGoogleSearchClicks", "organicGoogleSearchImpressions"
+])
+
+# Additive metrics that count or sum events, so they can also be summed across
+# non-date dimensions (country, pagePath, ...). Session counts are not among them:
+# one session spans several pages or events and would be counted once per row.
+ROLLUP_ADDITIVE_METRICS = frozenset([
+    "eventCount", "eventValue", "screenPageViews", "conversions", "userEngagementDuration",
+    "totalRevenue", "purchaseRevenue", "grossPurchaseRevenue", "transactions",
+    "ecommercePurchases", "checkouts", "refunds", "refundAmount", "shippingAmount",
+    "taxAmount", "totalAdRevenue", "adRevenue", "adImpressions", "publisherAdRevenue",
+    "publisherAdImpressions", "publisherAdClicks"
+])
+
 # Load functions now use embedded data
 def load_dimensions():
     """Load available dimensions from embedded data"""
@@ -398,7 +581,7 @@ def load_metrics():
     return GA4_METRICS
 
 @mcp.tool()
-def list_dimension_categories():
+async def list_dimension_categories():
     """
     List all available GA4 dimension categories with descriptions.
     
@@ -415,7 +598,7 @@ def list_dimension_categories():
     return result
 
 @mcp.tool()
-def list_metric_categories():
+async def list_metric_categories():
     """
     List all available GA4 metric categories with descriptions.
     
@@ -432,7 +615,7 @@ def list_metric_categories():
     return result
 
 @mcp.tool()
-def get_dimensions_by_category(category):
+async def get_dimensions_by_category(category):
     """
     Get all dimensions in a specific category with their descriptions.
     
@@ -450,7 +633,7 @@ def get_dimensions_by_category(category):
         return {"error": f"Category '{category}' not found. Available categories: {available_categories}"}
 
 @mcp.tool()
-def get_metrics_by_category(category):
+async def get_metrics_by_category(category):
     """
     Get all metrics in a specific category with their descriptions.
     
@@ -467,51 +650,340 @@ def get_metrics_by_category(category):
         available_categories = list(metrics.keys())
         return {"error": f"Category '{category}' not found. Available categories: {available_categories}"}
 
-@mcp.tool()
-def get_ga4_data(
-    dimensions=["date"],
-    metrics=["totalUsers", "newUsers", "bounceRate", "screenPageViewsPerSession", "averageSessionDuration"],
-    date_range_start="7daysAgo",
-    date_range_end="yesterday",
-    dimension_filter=None
-):
+def _format_rows(response):
+    """Convert a RunReportResponse into a list of row dictionaries"""
+    result = []
+    for row in response.rows:
+        data_row = {}
+        for i, dimension_header in enumerate(response.dimension_headers):
+            if i < len(row.dimension_values):
+                data_row[dimension_header.name] = row.dimension_values[i].value
+            else:
+                data_row[dimension_header.name] = None
+        for i, metric_header in enumerate(response.metric_headers):
+            if i < len(row.metric_values):
+                data_row[metric_header.name] = row.metric_values[i].value
+            else:
+                data_row[metric_header.name] = None
+        result.append(data_row)
+    return result
+
+def _run_report(client, dimensions, metrics, date_range_start, date_range_end, filter_expression=None,
+                date_ranges=None):
     """
-    Retrieve GA4 metrics data broken down by the specified dimensions.
-    
-    Args:
-        dimensions: List of GA4 dimensions (e.g., ["date", "city"]) or a string 
-                    representation (e.g., "[\"date\", \"city\"]" or "date,city").
-        metrics: List of GA4 metrics (e.g., ["totalUsers", "newUsers"]) or a string
-                 representation (e.g., "[\"totalUsers\"]" or "totalUsers,newUsers").
-        date_range_start: Start date in YYYY-MM-DD format or relative date like '7daysAgo'.
-        date_range_end: End date in YYYY-MM-DD format or relative date like 'yesterday'.
-        dimension_filter: (Optional) JSON string or dict representing a GA4 FilterExpression. See GA4 API docs for structure.
-        
+    Run a GA4 report for one date range and return the formatted rows.
+
+    With `date_ranges` (named (start, end, name) tuples) all of them are
+    requested at once instead, and every row carries its range name in a
+    dateRange column. Concurrent calls that differ only in their metrics are
+    merged into one report with the union of the metrics (see report_batcher).
+    """
+    ranges = tuple(date_ranges or [(date_range_start, date_range_end, "")])
+    filter_key = type(filter_expression).serialize(filter_expression) if filter_expression else None
+    key = (tuple(dimensions), ranges, filter_key)
+    return report_batcher.run(key, metrics, lambda batch_metrics, progress: _fetch_report(
+        client, dimensions, batch_metrics, ranges, filter_expression, progress
+    ), report_progress.get())
+
+def _fetch_report(client, dimensions, metrics, date_ranges, filter_expression=None, progress=None):
+    """
+    Run a GA4 report for (start, end, name) date ranges, following pages, and
+    return the formatted rows; progress(pages, rows, total) is called per page.
+    """
+    rows = []
+    offset = 0
+    while True:
+        request = RunReportRequest(
+            property=f"properties/{GA4_PROPERTY_ID}",
+            dimensions=[Dimension(name=d) for d in dimensions],
+            metrics=[Metric(name=m) for m in metrics],
+            date_ranges=[DateRange(start_date=start, end_date=end, name=name) for start, end, name in date_ranges],
+            dimension_filter=filter_expression if filter_expression else None,
+            limit=GA4_PAGE_SIZE,
+            offset=offset
+        )
+        with start_span("ga4.run_report", {
+            "ga4.date_range": ",".join(f"{start}..{end}" for start, end, _ in date_ranges),
+            "ga4.offset": offset
+        }) as span:
+            # Fails fast with CircuitOpenError while GA4 is down; callers fall back to stale cache
+            probe = ga4_breaker.before_call()
+            started = time.perf_counter()
+            try:
+                response = hedge_policy.call(lambda c: c.run_report(request), client,
+                                             lambda: other_client(client))
+            except Exception as e:
+                RUN_REPORT_ERRORS.inc()
+                ga4_breaker.record_failure(e, probe)
+                raise
+            finally:
+                RUN_REPORT_LATENCY.observe(time.perf_counter() - started)
+            ga4_breaker.record_success(probe)
+            REPORT_ROWS.observe(len(response.rows))
+            set_attributes(span, {"ga4.row_count": len(response.rows)})
+        with start_span("ga4.format_rows", {"ga4.row_count": len(response.rows)}):
+            rows.extend(_format_rows(response))
+
+        if progress is not None:
+            # row_count is the total for the whole range, so only count it on the first page
+            progress(1, len(response.rows), response.row_count if offset == 0 else 0)
+        offset += len(response.rows)
+        if not response.rows or offset >= min(response.row_count, GA4_MAX_ROWS):
+            return rows
+
+class _RowTally:
+    """
+    report_progress callable that counts fetched rows against GA4's row totals,
+    so a report cut off at GA4_MAX_ROWS can be told apart from a complete one;
+    increments are passed on to the caller's progress callable, if any.
+    """
+
+    def __init__(self, progress=None):
+        self.progress = progress
+        self.rows = 0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, pages, rows, total):
+        with self._lock:
+            self.rows += rows
+            self.total += total
+        if self.progress is not None:
+            self.progress(pages, rows, total)
+
+    @property
+    def truncated(self):
+        return self.rows < self.total
+
+def _sum_metric_values(values):
+    """Sum GA4 metric value strings, keeping integers as integers"""
+    numbers = [float(v) for v in values if v not in (None, "")]
+    total = sum(numbers)
+    if all(n.is_integer() for n in numbers):
+        return str(int(total))
+    return str(total)
+
+def _merge_additive_rows(row_lists, dimensions, metrics):
+    """Merge rows from several date shards by dimension values, summing additive metrics"""
+    merged = {}
+    for rows in row_lists:
+        for row in rows:
+            key = tuple(row.get(d) for d in dimensions)
+            merged.setdefault(key, []).append(row)
+    result = []
+    for key, rows in merged.items():
+        data_row = dict(zip(dimensions, key))
+        for m in metrics:
+            data_row[m] = _sum_metric_values([r.get(m) for r in rows])
+        result.append(data_row)
+    return result
+
+def parse_names(names):
+    """
+    Parse a list of dimension or metric names; MCP clients may also pass them
+    as a JSON array string or a comma-separated string ("date,city").
+    """
+    parsed = names
+    if isinstance(names, str):
+        try:
+            parsed = json.loads(names)
+            if not isinstance(parsed, list):
+                parsed = [str(parsed)]
+        except json.JSONDecodeError:
+            parsed = [n.strip() for n in names.split(',')]
+    return [str(n).strip() for n in parsed if str(n).strip()]
+
+def _parse_date_ranges(date_ranges):
+    """Parse get_ga4_data's date_ranges (a list or its JSON string) into (start, end, name) tuples"""
+    if isinstance(date_ranges, str):
+        date_ranges = json.loads(date_ranges)
+    return parse_date_ranges(date_ranges)
+
+def _report_spec(dimensions, metrics, date_range_start, date_range_end, filter_dict):
+    """Normalized description of a report, used as the result cache key"""
+    # Relative dates are resolved so '7daysAgo' cached before midnight is not served after it
+    try:
+        start, end = resolve_date_range(date_range_start, date_range_end)
+        date_range = [start.isoformat(), end.isoformat()]
+    except ValueError:
+        date_range = [date_range_start, date_range_end]
+    return {
+        "property": GA4_PROPERTY_ID,
+        "dimensions": dimensions,
+        "metrics": metrics,
+        "date_range": date_range,
+        "dimension_filter": filter_dict
+    }
+
+CACHE_TTLS = {
+    "historical": GA4_CACHE_TTL_HISTORICAL,
+    "recent": GA4_CACHE_TTL,
+    "intraday": GA4_CACHE_TTL_INTRADAY
+}
+
+def _cache_policy(date_range_start, date_range_end):
+    """Freshness class, cache TTL and resolved (start, end) of a report's date range"""
+    try:
+        start, end = resolve_date_range(date_range_start, date_range_end)
+    except ValueError:
+        return None, GA4_CACHE_TTL, None
+    freshness = classify_date_range(start, end, GA4_SETTLING_DAYS)
+    return freshness, CACHE_TTLS[freshness], (start.isoformat(), end.isoformat())
+
+def report_cache_ttl(date_range_start="7daysAgo", date_range_end="yesterday", date_ranges=None):
+    """Seconds a get_ga4_data result stays fresh in the cache (date_ranges go by their span)"""
+    if date_ranges:
+        try:
+            parsed_ranges = _parse_date_ranges(date_ranges)
+        except ValueError:
+            return GA4_CACHE_TTL
+        date_range_start = min(start for start, _, _ in parsed_ranges)
+        date_range_end = max(end for _, end, _ in parsed_ranges)
+    return _cache_policy(date_range_start, date_range_end)[1]
+
+def invalidate_cache(date_range_start=None, date_range_end=None):
+    """
+    Drop cached results (and stored incremental days) covering a date range,
+    e.g. after GA4 reprocessed data; without dates everything is dropped.
+
     Returns:
-        List of dictionaries containing the requested data, or an error dictionary.
+        Counts of dropped cache entries and stored days.
     """
+    start = resolve_date(date_range_start).isoformat() if date_range_start else None
+    end = resolve_date(date_range_end).isoformat() if date_range_end else None
+    if start and end and start > end:
+        raise ValueError(f"date_range_start ({date_range_start}) is after date_range_end ({date_range_end})")
+    cache_entries = report_cache.invalidate(start, end)
+    stored_days = get_report_store().invalidate(start, end)
+    logger.info("Cache invalidated", extra={"fields": {
+        "start": start, "end": end, "cache_entries": cache_entries, "stored_days": stored_days
+    }})
+    return {"cacheEntries": cache_entries, "storedDays": stored_days}
+
+def _derive_from_cache(spec):
+    """Compute a report locally from a fresh cached report that subsumes it, or return None"""
+    with start_span("ga4.derive_from_cache") as span:
+        for cached_spec, rows in report_cache.fresh_items():
+            if not isinstance(rows, list):
+                continue
+            derived = derive_rows(spec, cached_spec, rows, ADDITIVE_METRICS, ROLLUP_ADDITIVE_METRICS)
+            if derived is not None:
+                CACHE_DERIVED.inc()
+                set_attributes(span, {"ga4.row_count": len(derived)})
+                logger.debug("Report derived from cache", extra={"fields": {
+                    "dimensions": spec["dimensions"], "from_dimensions": cached_spec["dimensions"]
+                }})
+                return derived
+    return None
+
+def _describe_ga4_error(e):
+    """Log a GA4 failure and return the error message reported to the caller"""
+    error_message = f"Error fetching GA4 data: {str(e)}"
     try:
-        # Handle cases where dimensions might be passed as a string from the MCP client
-        parsed_dimensions = dimensions
-        if isinstance(dimensions, str):
-            try:
-                parsed_dimensions = json.loads(dimensions)
-                if not isinstance(parsed_dimensions, list):
-                    parsed_dimensions = [str(parsed_dimensions)]
-            except json.JSONDecodeError:
-                parsed_dimensions = [d.strip() for d in dimensions.split(',')]
-        parsed_dimensions = [str(d).strip() for d in parsed_dimensions if str(d).strip()]
-
-        # Handle cases where metrics might be passed as a string
-        parsed_metrics = metrics
-        if isinstance(metrics, str):
-            try:
-                parsed_metrics = json.loads(metrics)
-                if not isinstance(parsed_metrics, list):
-                    parsed_metrics = [str(parsed_metrics)]
-            except json.JSONDecodeError:
-                parsed_metrics = [m.strip() for m in metrics.split(',')]
-        parsed_metrics = [str(m).strip() for m in parsed_metrics if str(m).strip()]
+        # google.api_core errors expose details as a list, raw grpc errors as a method
+        details = getattr(e, "details", None)
+        if callable(details):
+            details = details()
+        if details:
+            error_message += f" Details: {details}"
+    except Exception:
+        pass
+    logger.error(error_message)
+    return error_message
+
+def _stale_or_error(cache_key, error_message):
+    """Serve the last good cached result, marked stale, or report the error"""
+    cached, stored_at = report_cache.get_if_error(cache_key)
+    if cached is None:
+        return {"error": error_message}
+    return {
+        "data": cached,
+        "stale": True,
+        "cachedAt": datetime.fromtimestamp(stored_at).isoformat(),
+        "staleReason": error_message
+    }
+
+def _revalidate(cache_key, report_args):
+    """Refresh a stale cache entry in the background"""
+    try:
+        run_ga4_report(**report_args, refresh=True)
+    finally:
+        report_cache.end_revalidation(cache_key)
+
+def _refresh_materialized(fetch_ranges, dimensions, metrics, date_range_start, date_range_end, filter_dict):
+    """
+    Serve a report from the local store, fetching only missing or still-settling days.
+
+    Rows are always fetched with a `date` dimension so they can be stored per day;
+    when the caller did not ask for a date dimension the stored days are summed back
+    together, which is why that case is limited to additive metrics.
+    """
+    start, end = resolve_date_range(date_range_start, date_range_end)
+    fetch_dimensions = dimensions if "date" in dimensions else dimensions + ["date"]
+    spec = {
+        "property": GA4_PROPERTY_ID,
+        "dimensions": fetch_dimensions,
+        "metrics": metrics,
+        "dimension_filter": filter_dict
+    }
+    store = get_report_store()
+    spec_key = store.spec_key(spec)
+
+    missing = store.plan_refresh(spec_key, start, end, GA4_SETTLING_DAYS)
+    if missing:
+        fetched_rows = fetch_ranges([(s.isoformat(), e.isoformat()) for s, e in missing], fetch_dimensions)
+        day_rows = {}
+        for range_start, range_end in missing:
+            day = range_start
+            while day <= range_end:
+                day_rows[day] = []
+                day += timedelta(days=1)
+        for row in fetched_rows:
+            day = datetime.strptime(row["date"], "%Y%m%d").date()
+            day_rows.setdefault(day, []).append(row)
+        store.save(spec_key, spec, day_rows)
+
+    rows = store.load(spec_key, start, end)
+    if "date" in dimensions:
+        return rows
+    if any(d in DATE_DIMENSIONS for d in dimensions):
+        return [{k: v for k, v in row.items() if k != "date"} for row in rows]
+    return _merge_additive_rows([rows], dimensions, metrics)
+
+def run_ga4_report(
+    dimensions,
+    metrics,
+    date_range_start,
+    date_range_end,
+    dimension_filter=None,
+    shard_by=None,
+    incremental=False,
+    refresh=False,
+    date_ranges=None
+):
+    """
+    Parse, validate and run a get_ga4_data request.
+
+    Results are served from the shared result cache unless `refresh` is set, in
+    which case the report is fetched and the cache entry replaced (fresh
+    historical entries are kept: their data no longer changes). How long an
+    entry stays fresh depends on how settled its dates are (see _cache_policy).
+    Expired entries are served while one background refresh runs, and the last
+    good entry is served with a staleness marker when GA4 fails.
+    """
+    report_args = {
+        "dimensions": dimensions,
+        "metrics": metrics,
+        "date_range_start": date_range_start,
+        "date_range_end": date_range_end,
+        "dimension_filter": dimension_filter,
+        "shard_by": shard_by,
+        "incremental": incremental,
+        "date_ranges": date_ranges
+    }
+    try:
+        parsed_dimensions = parse_names(dimensions)
+        parsed_metrics = parse_names(metrics)
 
         # Proceed if we have valid dimensions and metrics after parsing
         if not parsed_dimensions:
@@ -519,10 +991,39 @@ def get_ga4_data(
         if not parsed_metrics:
             return {"error": "Metrics list cannot be empty after parsing."}
 
+        # Validate date handling up front so invalid requests fail before any API call
+        has_date_dimension = any(d in DATE_DIMENSIONS for d in parsed_dimensions)
+        non_additive = [m for m in parsed_metrics if m not in ADDITIVE_METRICS]
+        if shard_by and shard_by not in SHARD_UNITS:
+            return {"error": f"shard_by must be one of {list(SHARD_UNITS)}."}
+        if shard_by and not has_date_dimension and non_additive:
+            return {"error": f"Cannot shard non-additive metrics {non_additive} without a date dimension "
+                             f"({', '.join(sorted(DATE_DIMENSIONS))}): per-shard values cannot be combined."}
+        if incremental and not has_date_dimension and non_additive:
+            return {"error": f"Cannot materialize non-additive metrics {non_additive} without a date dimension "
+                             f"({', '.join(sorted(DATE_DIMENSIONS))}): per-day values cannot be combined."}
+        if shard_by or incremental:
+            try:
+                resolve_date_range(date_range_start, date_range_end)
+            except ValueError as e:
+                return {"error": str(e)}
+        parsed_ranges = None
+        if date_ranges:
+            if shard_by or incremental:
+                return {"error": "date_ranges cannot be combined with shard_by or incremental."}
+            try:
+                parsed_ranges = _parse_date_ranges(date_ranges)
+            except ValueError as e:
+                return {"error": str(e)}
+            # Cache key, TTL and invalidation go by the span of all ranges
+            date_range_start = min(start for start, _, _ in parsed_ranges)
+            date_range_end = max(end for _, end, _ in parsed_ranges)
+
         # Validate dimension_filter and build FilterExpression if provided
         filter_expression = None
+        filter_dict = None
         if dimension_filter:
-            print(f"DEBUG: Processing dimension_filter: {dimension_filter}", file=sys.stderr)
+            logger.debug("Processing dimension_filter", extra={"fields": {"dimension_filter": dimension_filter}})
             
             # Load valid dimensions from embedded data
             valid_dimensions = set()
@@ -572,10 +1073,10 @@ def get_ga4_data(
                         f = expr['filter']
                         field = f.get('fieldName')
                         if not field:
-                            print(f"DEBUG: Missing fieldName in filter: {f}", file=sys.stderr)
+                            logger.debug("Missing fieldName in filter", extra={"fields": {"filter": f}})
                             return None
                         if field not in valid_dimensions:
-                            print(f"DEBUG: Invalid dimension '{field}'. Valid: {sorted(list(valid_dimensions))[:10]}...", file=sys.stderr)
+                            logger.debug("Invalid dimension '%s' in filter", field)
                             return None
                         
                         if 'stringFilter' in f:
@@ -610,58 +1111,209 @@ def get_ga4_data(
                                 )
                             ))
                     
-                    print(f"DEBUG: Unrecognized filter structure: {expr}", file=sys.stderr)
+                    logger.debug("Unrecognized filter structure", extra={"fields": {"filter": expr}})
                     return None
                     
                 except Exception as e:
-                    print(f"DEBUG: Exception in build_filter_expr: {e}", file=sys.stderr)
+                    logger.debug("Exception in build_filter_expr: %s", e)
                     return None
             
-            filter_expression = build_filter_expr(filter_dict)
+            _import_ga4()
+            with start_span("ga4.build_filter"):
+                filter_expression = build_filter_expr(filter_dict)
             if filter_expression is None:
                 return {"error": "Invalid or unsupported dimension_filter structure, or invalid dimension name."}
 
+        spec = _report_spec(parsed_dimensions, parsed_metrics, date_range_start, date_range_end, filter_dict)
+        if parsed_ranges:
+            spec["date_ranges"] = [list(r) for r in parsed_ranges]
+        cache_key = report_cache.make_key(spec)
+        freshness, cache_ttl, cache_range = _cache_policy(date_range_start, date_range_end)
+        if not refresh or freshness == "historical":
+            cached, state = report_cache.lookup(cache_key)
+            if state == FRESH:
+                return cached
+            if state == STALE and not refresh:
+                if report_cache.begin_revalidation(cache_key):
+                    revalidation_executor.submit(_revalidate, cache_key, report_args)
+                return cached
+            if not refresh:
+                derived = _derive_from_cache(spec)
+                if derived is not None:
+                    return derived
+
         # GA4 API Call
         try:
-            creds = get_credentials()
-            client = BetaAnalyticsDataClient(credentials=creds)
+            with start_span("ga4.get_client"):
+                client = get_client()
         except Exception as e:
-            return {"error": f"Failed to initialize GA4 client: {str(e)}"}
-        dimension_objects = [Dimension(name=d) for d in parsed_dimensions]
-        metric_objects = [Metric(name=m) for m in parsed_metrics]
-        request = RunReportRequest(
-            property=f"properties/{GA4_PROPERTY_ID}",
-            dimensions=dimension_objects,
-            metrics=metric_objects,
-            date_ranges=[DateRange(start_date=date_range_start, end_date=date_range_end)],
-            dimension_filter=filter_expression if filter_expression else None
-        )
-        response = client.run_report(request)
-        result = []
-        for row_idx, row in enumerate(response.rows):
-            data_row = {}
-            for i, dimension_header in enumerate(response.dimension_headers):
-                if i < len(row.dimension_values):
-                    data_row[dimension_header.name] = row.dimension_values[i].value
-                else:
-                    data_row[dimension_header.name] = None
-            for i, metric_header in enumerate(response.metric_headers):
-                if i < len(row.metric_values):
-                    data_row[metric_header.name] = row.metric_values[i].value
-                else:
-                    data_row[metric_header.name] = None
-            result.append(data_row)
+            return _stale_or_error(cache_key, f"Failed to initialize GA4 client: {str(e)}")
+
+        def fetch_ranges(ranges, fetch_dimensions):
+            if shard_by:
+                ranges = [shard for s, e in ranges for shard in split_date_range(s, e, shard_by)]
+            if len(ranges) == 1:
+                return _run_report(client, fetch_dimensions, parsed_metrics,
+                                   ranges[0][0], ranges[0][1], filter_expression)
+
+            def fetch(date_range):
+                return _run_report(client, fetch_dimensions, parsed_metrics,
+                                   date_range[0], date_range[1], filter_expression)
+
+            # Each shard runs in a copy of the caller's context so its spans stay children
+            # of the current trace; executor.map keeps shard order, so the concatenated
+            # rows stay chronological
+            contexts = [contextvars.copy_context() for _ in ranges]
+            with ThreadPoolExecutor(max_workers=min(GA4_SHARD_CONCURRENCY, len(ranges))) as executor:
+                shard_results = list(executor.map(lambda ctx, r: ctx.run(fetch, r), contexts, ranges))
+
+            if any(d in DATE_DIMENSIONS for d in fetch_dimensions):
+                return [row for rows in shard_results for row in rows]
+            return _merge_additive_rows(shard_results, fetch_dimensions, parsed_metrics)
+
+        tally = _RowTally(report_progress.get())
+        progress_reset = report_progress.set(tally)
+        try:
+            if incremental:
+                result = _refresh_materialized(fetch_ranges, parsed_dimensions, parsed_metrics,
+                                               date_range_start, date_range_end, filter_dict)
+            elif parsed_ranges:
+                # One request for all ranges; rows carry their range name in a dateRange column
+                result = _run_report(client, parsed_dimensions, parsed_metrics, date_range_start, date_range_end,
+                                     filter_expression, date_ranges=parsed_ranges)
+            else:
+                result = fetch_ranges([(date_range_start, date_range_end)], parsed_dimensions)
+        except Exception as e:
+            return _stale_or_error(cache_key, _describe_ga4_error(e))
+        finally:
+            report_progress.reset(progress_reset)
+        if tally.truncated:
+            # Rows past GA4_MAX_ROWS are missing, so other reports must not be derived from these
+            spec = {**spec, "truncated": True}
+        report_cache.set(cache_key, result, cache_ttl, cache_range, spec)
         return result
     except Exception as e:
-        error_message = f"Error fetching GA4 data: {str(e)}"
-        print(error_message, file=sys.stderr)
-        if hasattr(e, 'details'):
-            error_message += f" Details: {e.details()}"
-        return {"error": error_message}
+        return {"error": _describe_ga4_error(e)}
+
+def _postprocess(result, dimensions, metrics, date_ranges=None, **options):
+    """Apply get_ga4_data's date range comparison and group_by / top_n / max_rows options to a report result"""
+    rows = result.get("data") if isinstance(result, dict) else result
+    if not isinstance(rows, list):
+        return result
+    try:
+        range_names = [name for _, _, name in _parse_date_ranges(date_ranges)] if date_ranges else None
+        with start_span("ga4.postprocess", {"ga4.row_count": len(rows)}):
+            processed = postprocess_rows(rows, parse_names(dimensions), parse_names(metrics), ADDITIVE_METRICS,
+                                         group_by=parse_names(options.pop("group_by") or []),
+                                         range_names=range_names, rollup_additive=ROLLUP_ADDITIVE_METRICS,
+                                         **options)
+    except ValueError as e:
+        return {"error": str(e)}
+    if isinstance(result, dict):
+        return {**result, "data": processed}
+    return processed
+
+@mcp.tool()
+async def get_ga4_data(
+    dimensions=["date"],
+    metrics=["totalUsers", "newUsers", "bounceRate", "screenPageViewsPerSession", "averageSessionDuration"],
+    date_range_start="7daysAgo",
+    date_range_end="yesterday",
+    date_ranges=None,
+    dimension_filter=None,
+    shard_by=None,
+    incremental=False,
+    group_by=None,
+    aggregate="sum",
+    top_n=None,
+    sort_by=None,
+    max_rows=None
+):
+    """
+    Retrieve GA4 metrics data broken down by the specified dimensions.
+    
+    Args:
+        dimensions: List of GA4 dimensions (e.g., ["date", "city"]) or a string 
+                    representation (e.g., "[\"date\", \"city\"]" or "date,city").
+        metrics: List of GA4 metrics (e.g., ["totalUsers", "newUsers"]) or a string
+                 representation (e.g., "[\"totalUsers\"]" or "totalUsers,newUsers").
+        date_range_start: Start date in YYYY-MM-DD format or relative date like '7daysAgo'.
+        date_range_end: End date in YYYY-MM-DD format or relative date like 'yesterday'.
+        date_ranges: (Optional) 2 to 4 named date ranges to compare in one request, replacing
+                     date_range_start/end, e.g. [{"start_date": "7daysAgo", "end_date": "yesterday",
+                     "name": "this_week"}, {"start_date": "14daysAgo", "end_date": "8daysAgo",
+                     "name": "last_week"}] (names default to current / previous). Each row then
+                     holds every metric for the first range plus, per other range, <metric>_<name>,
+                     <metric>_delta_<name> and <metric>_pct_change_<name>.
+        dimension_filter: (Optional) JSON string or dict representing a GA4 FilterExpression. See GA4 API docs for structure.
+        shard_by: (Optional) 'week' or 'month'. Splits long date ranges into shards that are fetched
+                  in parallel and concatenated in date order. Without a date dimension only additive
+                  metrics (e.g. sessions, eventCount) can be sharded; their shard values are summed.
+        incremental: (Optional) Serve the report from the local materialized store, fetching only
+                     days that are missing or still settling (last GA4_SETTLING_DAYS days).
+                     Without a date dimension only additive metrics are supported.
+        group_by: (Optional) Subset of the dimensions to group the rows by; the other dimensions are
+                  dropped and the metrics combined. Date dimensions can be grouped away for additive
+                  metrics such as sessions; other dimensions only for event counts and values such
+                  as eventCount, screenPageViews or revenue. Users, rates and averages cannot be
+                  grouped away.
+        aggregate: (Optional) 'sum' (default) or 'mean', how group_by combines additive metrics.
+        top_n: (Optional) Return only the n rows with the largest sort_by value plus one "(other)"
+               row totalling the rest (metrics that cannot be summed that way are null).
+        sort_by: (Optional) Metric used by top_n and max_rows to rank rows (default: first metric);
+                 with date_ranges also a comparison column such as sessions_delta_previous.
+        max_rows: (Optional) Row budget. Larger results keep their most significant rows in their
+                  original order, folding the rest into one "(other)" row.
+        
+    Returns:
+        List of dictionaries containing the requested data, or an error dictionary.
+        If GA4 fails while an earlier result is cached, that result is returned as
+        {"data": [...], "stale": true, "cachedAt": ..., "staleReason": ...}.
+    """
+    # Reports block on gRPC, so they run in a worker thread: concurrent calls on the
+    # stdio server overlap instead of queueing behind each other on the event loop
+    return await asyncio.to_thread(
+        _get_ga4_data,
+        dimensions=dimensions,
+        metrics=metrics,
+        date_range_start=date_range_start,
+        date_range_end=date_range_end,
+        date_ranges=date_ranges,
+        dimension_filter=dimension_filter,
+        shard_by=shard_by,
+        incremental=incremental,
+        group_by=group_by,
+        aggregate=aggregate,
+        top_n=top_n,
+        sort_by=sort_by,
+        max_rows=max_rows
+    )
+
+def _get_ga4_data(dimensions, metrics, date_range_start, date_range_end, date_ranges, dimension_filter, shard_by,
+                  incremental, group_by, aggregate, top_n, sort_by, max_rows):
+    """Synchronous body of get_ga4_data"""
+    result = run_ga4_report(
+        dimensions=dimensions,
+        metrics=metrics,
+        date_range_start=date_range_start,
+        date_range_end=date_range_end,
+        dimension_filter=dimension_filter,
+        shard_by=shard_by,
+        incremental=incremental,
+        date_ranges=date_ranges
+    )
+    if date_ranges or group_by or top_n is not None or max_rows is not None:
+        # Applied after the cache, which always holds the full report
+        result = _postprocess(result, dimensions, metrics, date_ranges=date_ranges, group_by=group_by,
+                              aggregate=aggregate, top_n=top_n, sort_by=sort_by, max_rows=max_rows)
+    return result
 
 def main():
     """Main entry point for the MCP server"""
-    print("Starting GA4 MCP server...", file=sys.stderr)
+    logger.info("Starting GA4 MCP server...")
+    start_token_refresh()
+    # Every stdio call comes from an interactive client
+    hedge_allowed.set(True)
     mcp.run(transport="stdio")
 
 # Start the server when run directly
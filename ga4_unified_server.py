@@ -0,0 +1,87 @@
+from fastapi import FastAPI, APIRouter
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.routing import APIRoute
+from datetime import datetime
+from contextlib import asynccontextmanager
+import uvicorn
+import os
+
+import ga4_http_server
+import mcp_http_bridge
+import mcp_http_streamable
+from ga4_mcp_server import ga4_breaker, start_token_refresh
+from warm_queries import start_warming
+import server_metrics
+import admission
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background jobs (warm-query scheduler, access token refresh) with the app"""
+    start_token_refresh()
+    start_warming()
+    yield
+
+app = FastAPI(
+    title="GA4 Analytics Server",
+    description="Every GA4 transport in one process: MCP streamable (/stream), MCP JSON-RPC (/mcp), "
+                "bridge REST API (/api) and the n8n HTTP API (/rest)",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.add_middleware(server_metrics.InFlightMiddleware)
+admission.install(app)
+
+def _routes(source, include=lambda path: True):
+    """Router with the API routes of another front end whose path matches `include`"""
+    router = APIRouter()
+    router.routes.extend(
+        route for route in source.routes
+        if isinstance(route, APIRoute) and include(route.path)
+    )
+    return router
+
+@app.get("/", tags=["Health"])
+async def root():
+    """Health check endpoint"""
+    return {
+        "status": "online",
+        "service": "GA4 Analytics Server",
+        "timestamp": datetime.now().isoformat(),
+        "upstream": ga4_breaker.snapshot(),
+        "endpoints": {
+            "stream": "/stream",
+            "mcp": "/mcp",
+            "rest": "/api",
+            "n8n": "/rest",
+            "metrics": "/metrics"
+        }
+    }
+
+# MCP transports, /warm and /metrics from the streamable server (they share one dispatch core)
+app.include_router(_routes(mcp_http_streamable.app, lambda path: path != "/"))
+# Bridge REST API
+app.include_router(_routes(mcp_http_bridge.app, lambda path: path.startswith("/api/")))
+# n8n HTTP API; prefixed because its /metrics lists GA4 metric categories
+app.include_router(
+    _routes(ga4_http_server.app, lambda path: path not in ("/", "/prometheus")),
+    prefix="/rest"
+)
+
+if __name__ == "__main__":
+    port = int(os.getenv("PORT", 8000))
+    host = os.getenv("HOST", "0.0.0.0")
+
+    print(f"Starting GA4 Analytics Server on {host}:{port}")
+    print(f"MCP endpoints: http://{host}:{port}/stream and http://{host}:{port}/mcp")
+    print(f"REST endpoints: http://{host}:{port}/api and http://{host}:{port}/rest")
+    print(f"API docs: http://{host}:{port}/docs")
+
+    uvicorn.run(app, host=host, port=port)
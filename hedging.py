@@ -0,0 +1,149 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from server_metrics import HEDGED_CALLS
+
+# Latency percentile of recent run_report calls after which a hedge is sent (0 disables hedging)
+GA4_HEDGE_PERCENTILE = float(os.getenv("GA4_HEDGE_PERCENTILE", "0"))
+# Hedges allowed as a percentage of run_report calls, so hedging costs at most this much extra quota
+GA4_HEDGE_BUDGET = float(os.getenv("GA4_HEDGE_BUDGET", "5"))
+# Calls observed before the percentile is trusted; no hedging until then
+GA4_HEDGE_MIN_SAMPLES = int(os.getenv("GA4_HEDGE_MIN_SAMPLES", "50"))
+# Never hedge earlier than this many seconds into a call
+GA4_HEDGE_MIN_DELAY = float(os.getenv("GA4_HEDGE_MIN_DELAY", "0.1"))
+
+# Whether calls in the current context may be hedged; set for interactive tool calls only,
+# so batch traffic, cache warming and background revalidation never spend the budget
+hedge_allowed = contextvars.ContextVar("hedge_allowed", default=False)
+
+
+class LatencyWindow:
+    """Latencies of the last `size` calls, with a cached percentile"""
+
+    def __init__(self, size=1000):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._cached = {}
+
+    def __len__(self):
+        return len(self._samples)
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            # Recompute percentiles every 20 samples rather than on every call
+            if len(self._samples) % 20 == 0:
+                self._cached.clear()
+
+    def percentile(self, p):
+        with self._lock:
+            value = self._cached.get(p)
+            if value is None and self._samples:
+                ordered = sorted(self._samples)
+                value = self._cached[p] = ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+            return value
+
+
+class HedgePolicy:
+    """
+    Hedged requests: when a call has not returned after the observed
+    `percentile` latency, the same call is sent once more on another client
+    and whichever succeeds first is returned.
+
+    Hedges are paid for from a token bucket that every call tops up by
+    `budget` percent of a token, so hedges stay below `budget` percent of
+    calls even while the upstream is slow for everyone. The losing call is
+    cancelled if it has not started yet; a blocking RPC already in flight
+    cannot be aborted, so it finishes in the background and is discarded.
+    """
+
+    def __init__(self, percentile, budget, min_samples, min_delay, max_tokens=10):
+        self.percentile = percentile
+        self.budget = budget / 100
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_tokens = max_tokens
+        self.latency = LatencyWindow()
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="ga4-hedge")
+
+    @property
+    def enabled(self):
+        return self.percentile > 0 and self.budget > 0
+
+    def delay(self):
+        """Seconds after which a call is hedged, or None while too few calls were observed"""
+        if len(self.latency) < self.min_samples:
+            return None
+        return max(self.latency.percentile(self.percentile), self.min_delay)
+
+    def _earn(self):
+        with self._lock:
+            self._tokens = min(self._tokens + self.budget, self.max_tokens)
+
+    def _spend(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _submit(self, fn, client):
+        def timed():
+            started = time.perf_counter()
+            result = fn(client)
+            self.latency.observe(time.perf_counter() - started)
+            return result
+        # Copy the caller's context so spans opened by `fn` stay in the caller's trace
+        return self._executor.submit(contextvars.copy_context().run, timed)
+
+    def call(self, fn, client, alternate):
+        """
+        Return fn(client), hedged with fn(alternate()) when it is slow.
+
+        `alternate` is called only when a hedge is sent and returns another
+        client (or None when there is none). Calls outside an interactive
+        context, or before enough latencies were observed, run directly.
+        """
+        if not self.enabled:
+            return fn(client)
+        self._earn()
+        delay = self.delay()
+        if not hedge_allowed.get() or delay is None:
+            started = time.perf_counter()
+            result = fn(client)
+            self.latency.observe(time.perf_counter() - started)
+            return result
+
+        primary = self._submit(fn, client)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        other = alternate()
+        if other is None or other is client:
+            return primary.result()
+        if not self._spend():
+            HEDGED_CALLS.inc(labels=("no_budget",))
+            return primary.result()
+
+        hedge = self._submit(fn, other)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    HEDGED_CALLS.inc(labels=("won" if future is hedge else "lost",))
+                    return future.result()
+        # Both failed: report the original call's error
+        HEDGED_CALLS.inc(labels=("failed",))
+        return primary.result()
+
+
+hedge_policy = HedgePolicy(GA4_HEDGE_PERCENTILE, GA4_HEDGE_BUDGET, GA4_HEDGE_MIN_SAMPLES, GA4_HEDGE_MIN_DELAY)
@@ -0,0 +1,467 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+
+import server_metrics
+from admission import Overloaded, admission, lane, request_client
+from ga4_mcp_server import mcp, parse_names, report_progress
+from hedging import hedge_allowed
+from result_render import render_result
+from tracing import set_attributes, start_span
+
+PROTOCOL_VERSION = "2024-11-05"
+SERVER_INFO = {"name": "ga4-analytics", "version": "1.0.0"}
+
+# Maximum number of requests in one JSON-RPC batch
+MCP_MAX_BATCH_SIZE = int(os.getenv("MCP_MAX_BATCH_SIZE", "20"))
+
+# JSON-RPC error codes
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+# Implementation-defined server error: the call was not admitted (HTTP 429), data.retryAfter in seconds
+OVERLOADED = -32000
+
+# Methods whose result never changes while the process runs; served pre-encoded with an ETag
+STATIC_METHODS = ("initialize", "tools/list")
+
+# JSON Schema for tool parameters. The tools are untyped Python functions, so
+# FastMCP only knows parameter names and defaults; types and descriptions live here.
+PARAMETER_SCHEMAS = {
+    "category": {
+        "type": "string",
+        "description": "Category name (e.g., 'time', 'geography', 'ecommerce', 'user_metrics')"
+    },
+    "dimensions": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "List of GA4 dimensions"
+    },
+    "metrics": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "List of GA4 metrics"
+    },
+    "date_range_start": {
+        "type": "string",
+        "description": "Start date (YYYY-MM-DD or relative)"
+    },
+    "date_range_end": {
+        "type": "string",
+        "description": "End date (YYYY-MM-DD or relative)"
+    },
+    "dimension_filter": {
+        "type": "object",
+        "description": "Optional GA4 FilterExpression"
+    },
+    "shard_by": {
+        "type": "string",
+        "enum": ["week", "month"],
+        "description": "Optional: split long date ranges into week or month shards fetched in parallel"
+    },
+    "incremental": {
+        "type": "boolean",
+        "description": "Optional: serve from the local report store, fetching only missing or still-settling days"
+    },
+    "date_ranges": {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "start_date": {"type": "string"},
+                "end_date": {"type": "string"},
+                "name": {"type": "string"}
+            },
+            "required": ["start_date", "end_date"]
+        },
+        "description": "Optional: 2-4 named date ranges compared in one request (replaces date_range_start/end); "
+                       "rows get per-range values, deltas and percent changes against the first range"
+    },
+    "group_by": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "Optional: subset of the dimensions to group rows by, combining metrics that can be summed across the dropped ones"
+    },
+    "aggregate": {
+        "type": "string",
+        "enum": ["sum", "mean"],
+        "description": "Optional: how group_by combines metrics"
+    },
+    "top_n": {
+        "type": "integer",
+        "minimum": 1,
+        "description": "Optional: keep the top n rows by sort_by, folding the rest into an '(other)' row"
+    },
+    "sort_by": {
+        "type": "string",
+        "description": "Optional: metric ranking rows for top_n and max_rows (default: first metric)"
+    },
+    "max_rows": {
+        "type": "integer",
+        "minimum": 1,
+        "description": "Optional: row budget; keeps the most significant rows plus an '(other)' row"
+    }
+}
+
+
+class JsonRpcError(Exception):
+    """Error returned to the client as a JSON-RPC error object"""
+
+    def __init__(self, code, message, data=None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+
+class Tool:
+    """A registered tool: the function to call and its tools/list entry"""
+
+    def __init__(self, name, fn, description, input_schema):
+        self.name = name
+        self.fn = fn
+        self.description = description
+        self.input_schema = input_schema
+
+    def manifest(self):
+        return {"name": self.name, "description": self.description, "inputSchema": self.input_schema}
+
+
+class ToolRegistry:
+    """
+    Table of callable tools built from a FastMCP server's tool definitions.
+
+    Every HTTP transport dispatches through here, so a new @mcp.tool() is
+    exposed everywhere without touching the front ends, and tool latency,
+    tracing and thread offloading are handled in one place.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self._tools = None
+        self._manifest = None
+
+    @staticmethod
+    def _build(tool):
+        properties = {}
+        for name, prop in tool.parameters.get("properties", {}).items():
+            schema = dict(PARAMETER_SCHEMAS.get(name, {}))
+            if prop.get("default") is not None:
+                schema["default"] = prop["default"]
+            properties[name] = schema
+        description = (tool.description or "").strip().split("\n")[0].rstrip(".")
+        input_schema = {
+            "type": "object",
+            "properties": properties,
+            "required": tool.parameters.get("required", [])
+        }
+        return Tool(tool.name, tool.fn, description, input_schema)
+
+    async def tools(self):
+        """Registered tools by name"""
+        if self._tools is None:
+            self._tools = {name: self._build(tool) for name, tool in (await self.server.get_tools()).items()}
+        return self._tools
+
+    async def list_tools(self):
+        """tools/list entries"""
+        if self._manifest is None:
+            self._manifest = [tool.manifest() for tool in (await self.tools()).values()]
+        return self._manifest
+
+    async def call(self, name, arguments=None, transport="mcp"):
+        """
+        Run a tool and return its raw result; synchronous tools run in a worker thread.
+
+        Calls wait for a slot from the admission controller (per-client limits,
+        fair queuing between clients and lanes) and raise Overloaded when it
+        rejects them. Unknown arguments are ignored; missing required ones raise
+        JsonRpcError(INVALID_PARAMS), unknown tools JsonRpcError(METHOD_NOT_FOUND).
+        """
+        tool = (await self.tools()).get(name)
+        if tool is None:
+            raise JsonRpcError(METHOD_NOT_FOUND, f"Unknown tool: {name}")
+        arguments = arguments or {}
+        missing = [p for p in tool.input_schema["required"] if arguments.get(p) is None]
+        if missing:
+            raise JsonRpcError(INVALID_PARAMS, f"Missing required arguments for {name}: {missing}")
+        kwargs = {k: v for k, v in arguments.items() if k in tool.input_schema["properties"]}
+
+        client, lane_name = request_client.get()
+        # Only interactive calls may hedge slow GA4 requests (see hedging.py)
+        hedge_token = hedge_allowed.set(lane_name == "interactive")
+        try:
+            with start_span("mcp.tool_call", {"mcp.tool": name, "mcp.transport": transport}) as tool_span:
+                async with admission.slot(client, lane_name):
+                    started = time.perf_counter()
+                    if inspect.iscoroutinefunction(tool.fn):
+                        # Async tools offload their own blocking work
+                        result = await tool.fn(**kwargs)
+                    else:
+                        # to_thread copies the current context, so spans opened by the tool nest under this one
+                        result = await asyncio.to_thread(tool.fn, **kwargs)
+                server_metrics.TOOL_LATENCY.observe(time.perf_counter() - started, (name,))
+                set_attributes(tool_span, {"ga4.row_count": len(result) if isinstance(result, list) else None})
+        finally:
+            hedge_allowed.reset(hedge_token)
+        return result
+
+
+registry = ToolRegistry(mcp)
+
+
+class ProgressReporter:
+    """
+    Accumulates report_progress increments from worker threads into MCP
+    notifications/progress messages for one request's progressToken.
+    """
+
+    def __init__(self, token, notify):
+        self.token = token
+        self.notify = notify
+        self.pages = 0
+        self.rows = 0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, pages, rows, total):
+        with self._lock:
+            self.pages += pages
+            self.rows += rows
+            self.total += total
+            params = {
+                "progressToken": self.token,
+                "progress": self.rows,
+                "total": max(self.total, self.rows),
+                "message": f"{self.pages} page(s) fetched, {self.rows} of ~{self.total} rows"
+            }
+        self.notify({"jsonrpc": "2.0", "method": "notifications/progress", "params": params})
+
+
+def progress_token(message):
+    """The _meta.progressToken of a request, or None"""
+    if not isinstance(message, dict):
+        return None
+    params = message.get("params")
+    meta = params.get("_meta") if isinstance(params, dict) else None
+    return meta.get("progressToken") if isinstance(meta, dict) else None
+
+
+def tool_content(result, transport, metrics=()):
+    """
+    Wrap a tool result as MCP text content (see result_render), recording
+    serialization metrics; `metrics` are the report's metric names, whose
+    columns are rounded.
+    """
+    with start_span("mcp.serialize_result") as serialize_span:
+        text, size = server_metrics.serialize(result, transport, lambda r: render_result(r, metrics=metrics))
+        set_attributes(serialize_span, {"mcp.payload_bytes": size})
+    return {"content": [{"type": "text", "text": text}]}
+
+
+_static_results = {}
+
+
+async def static_result(method):
+    """
+    Pre-encoded result of an initialize or tools/list call.
+
+    Returns:
+        (result bytes, ETag) built once per process, or None for other methods.
+    """
+    if method not in STATIC_METHODS:
+        return None
+    cached = _static_results.get(method)
+    if cached is None:
+        result = await METHODS[method]({}, None)
+        body = json.dumps(result, separators=(",", ":")).encode("utf-8")
+        cached = _static_results[method] = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+    return cached
+
+
+def etag_matches(if_none_match, etag):
+    """True when an If-None-Match header value covers etag"""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+async def handle_static(message, if_none_match=None):
+    """
+    Answer initialize/tools/list from the pre-encoded manifest.
+
+    Returns:
+        None when the message is not a static method, otherwise (body, etag)
+        where body is the encoded JSON-RPC response, or None when the client's
+        If-None-Match already matches (reply 304).
+    """
+    if not isinstance(message, dict) or message.get("id") is None:
+        return None
+    cached = await static_result(message.get("method"))
+    if cached is None:
+        return None
+    result, etag = cached
+    if etag_matches(if_none_match, etag):
+        return None, etag
+    request_id = json.dumps(message["id"]).encode("utf-8")
+    return b'{"jsonrpc":"2.0","result":' + result + b',"id":' + request_id + b'}', etag
+
+
+def retry_after(response):
+    """Retry-After seconds when a JSON-RPC response is an admission rejection, else None"""
+    error = response.get("error") if isinstance(response, dict) else None
+    if not error or error.get("code") != OVERLOADED:
+        return None
+    return error["data"]["retryAfter"]
+
+
+def error_response(request_id, code, message, data=None):
+    """JSON-RPC error response"""
+    error = {"code": code, "message": message}
+    if data is not None:
+        error["data"] = data
+    return {"jsonrpc": "2.0", "error": error, "id": request_id}
+
+
+async def _initialize(params, transport):
+    return {"protocolVersion": PROTOCOL_VERSION, "capabilities": {"tools": {}}, "serverInfo": SERVER_INFO}
+
+
+async def _ping(params, transport):
+    return {}
+
+
+async def _tools_list(params, transport):
+    return {"tools": await registry.list_tools()}
+
+
+async def _tools_call(params, transport):
+    if not params.get("name"):
+        raise JsonRpcError(INVALID_PARAMS, "tools/call requires a tool name")
+    arguments = params.get("arguments")
+    result = await registry.call(params["name"], arguments, transport)
+    metrics = parse_names(arguments.get("metrics") or []) if isinstance(arguments, dict) else []
+    return tool_content(result, transport, metrics)
+
+
+async def _resources_list(params, transport):
+    return {"resources": []}
+
+
+async def _prompts_list(params, transport):
+    return {"prompts": []}
+
+
+# JSON-RPC method -> async handler(params, transport)
+METHODS = {
+    "initialize": _initialize,
+    "ping": _ping,
+    "tools/list": _tools_list,
+    "tools/call": _tools_call,
+    "resources/list": _resources_list,
+    "prompts/list": _prompts_list,
+}
+
+
+async def handle_message(message, transport="mcp", notify=None):
+    """
+    Handle one JSON-RPC request object.
+
+    When `notify` is given and the request carries _meta.progressToken, it is
+    called (from any thread) with notifications/progress messages while the
+    tool runs.
+
+    Returns:
+        The response dictionary, or None for notifications (which get no response).
+    """
+    request_id = message.get("id") if isinstance(message, dict) else None
+    token = progress_token(message) if notify is not None else None
+    reset = report_progress.set(ProgressReporter(token, notify)) if token is not None else None
+    try:
+        if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+            raise JsonRpcError(INVALID_REQUEST, "Invalid Request")
+        method = message["method"]
+        handler = METHODS.get(method)
+        if handler is None:
+            if method.startswith("notifications/"):
+                return None
+            raise JsonRpcError(METHOD_NOT_FOUND, f"Method not found: {method}")
+        result = await handler(message.get("params") or {}, transport)
+        return {"jsonrpc": "2.0", "result": result, "id": request_id}
+    except JsonRpcError as e:
+        return error_response(request_id, e.code, e.message, e.data)
+    except Overloaded as e:
+        return error_response(request_id, OVERLOADED, str(e), {"retryAfter": e.retry_after})
+    except Exception as e:
+        return error_response(request_id, INTERNAL_ERROR, "Internal error", str(e))
+    finally:
+        if reset is not None:
+            report_progress.reset(reset)
+
+
+def batch_error(messages):
+    """Error response for an empty or oversized batch, or None when the batch is acceptable"""
+    if not messages:
+        return error_response(None, INVALID_REQUEST, "Invalid Request: empty batch")
+    if len(messages) > MCP_MAX_BATCH_SIZE:
+        return error_response(None, INVALID_REQUEST,
+                              f"Invalid Request: batch of {len(messages)} exceeds MCP_MAX_BATCH_SIZE={MCP_MAX_BATCH_SIZE}")
+    return None
+
+
+async def handle_batch(messages, transport="mcp"):
+    """
+    Handle a JSON-RPC batch, running its requests concurrently.
+
+    Returns:
+        Responses in request order (notifications omitted), or a single error
+        response for an empty or oversized batch.
+    """
+    error = batch_error(messages)
+    if error is not None:
+        return error
+    # Batches queue in the batch lane so they cannot crowd out interactive calls
+    with lane("batch"):
+        responses = await asyncio.gather(*(handle_message(m, transport) for m in messages))
+    return [r for r in responses if r is not None]
+
+
+async def iter_responses(messages, transport="mcp", notify=None):
+    """
+    Run requests concurrently and yield each response as it completes, fastest
+    first, preceded by notifications/progress messages for requests that carry
+    a _meta.progressToken. When `notify` is given, the notifications are passed
+    to it (from any thread) instead of being yielded.
+    """
+    error = batch_error(messages)
+    if error is not None:
+        yield error
+        return
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def enqueue(notification):
+        loop.call_soon_threadsafe(queue.put_nowait, (False, notification))
+
+    async def run(message):
+        queue.put_nowait((True, await handle_message(message, transport, notify or enqueue)))
+
+    with lane("batch" if len(messages) > 1 else request_client.get()[1]):
+        tasks = [asyncio.ensure_future(run(m)) for m in messages]
+    pending = len(tasks)
+    try:
+        while pending:
+            is_response, item = await queue.get()
+            pending -= is_response
+            if item is not None:
+                yield item
+    finally:
+        # Client went away mid-stream: drop the calls nobody will read
+        for task in tasks:
+            task.cancel()
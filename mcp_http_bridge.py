@@ -1,29 +1,36 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Union, Dict, Any
 import uvicorn
+import asyncio
 import os
 import sys
 import secrets
-import json
-import asyncio
 from datetime import datetime
+from contextlib import asynccontextmanager
 
-# Import MCP functions
-from ga4_mcp_server import (
-    list_dimension_categories,
-    list_metric_categories,
-    get_dimensions_by_category,
-    get_metrics_by_category,
-    get_ga4_data
-)
+import admission
+from admission import retry_after_headers
+from mcp_dispatch import handle_batch, handle_message, handle_static, registry, retry_after
+from ga4_mcp_server import ga4_breaker, invalidate_cache, start_token_refresh
+from warm_queries import warm_registry, start_warming
+import server_metrics
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background jobs (warm-query scheduler, access token refresh) with the app"""
+    start_token_refresh()
+    start_warming()
+    yield
 
 app = FastAPI(
     title="GA4 MCP Bridge for n8n",
     description="MCP-compatible HTTP bridge for Google Analytics 4",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Basic auth setup
@@ -59,26 +66,22 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(server_metrics.InFlightMiddleware)
+admission.install(app)
 
 # MCP Protocol Models
 class MCPRequest(BaseModel):
     jsonrpc: str = "2.0"
     method: str
     params: Optional[Dict[str, Any]] = None
-    id: Optional[int] = None
-
-class MCPError(BaseModel):
-    code: int
-    message: str
-    data: Optional[Any] = None
-
-class MCPResponse(BaseModel):
-    jsonrpc: str = "2.0"
-    result: Optional[Any] = None
-    error: Optional[MCPError] = None
-    id: Optional[int] = None
+    id: Optional[Union[int, str]] = None
 
 # MCP endpoints
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus metrics: tool and GA4 RPC latency, row counts, payload sizes, cache stats"""
+    return PlainTextResponse(server_metrics.REGISTRY.render(), media_type=server_metrics.CONTENT_TYPE)
+
 @app.get("/", tags=["Health"])
 async def root():
     """Health check endpoint"""
@@ -86,7 +89,8 @@ async def root():
         "status": "online",
         "service": "GA4 MCP Bridge",
         "protocol": "MCP over HTTP",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "upstream": ga4_breaker.snapshot()
     }
 
 @app.get("/mcp", tags=["MCP"])
@@ -111,8 +115,10 @@ async def mcp_info(username: str = Depends(verify_credentials)):
 
 @app.post("/mcp", tags=["MCP"])
 async def mcp_endpoint(
-    request: MCPRequest,
-    username: str = Depends(verify_credentials)
+    # Batch members are checked one by one, so each invalid member gets its own -32600 error
+    request: Union[MCPRequest, List[Any]],
+    username: str = Depends(verify_credentials),
+    if_none_match: Optional[str] = Header(default=None)
 ):
     """
     MCP Protocol endpoint - handles all MCP requests
@@ -125,193 +131,42 @@ async def mcp_endpoint(
         "id": 1
     }
     ```
+
+    A JSON-RPC batch (array of requests) is also accepted; its requests run
+    concurrently and the responses are returned as an array.
     """
-    try:
-        # Handle different MCP methods
-        if request.method == "initialize":
-            return MCPResponse(
-                jsonrpc="2.0",
-                result={
-                    "protocolVersion": "2024-11-05",
-                    "capabilities": {
-                        "tools": {}
-                    },
-                    "serverInfo": {
-                        "name": "ga4-analytics",
-                        "version": "1.0.0"
-                    }
-                },
-                id=request.id
-            )
-        
-        elif request.method == "tools/list":
-            return MCPResponse(
-                jsonrpc="2.0",
-                result={
-                    "tools": [
-                        {
-                            "name": "list_dimension_categories",
-                            "description": "List all available GA4 dimension categories with descriptions",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {}
-                            }
-                        },
-                        {
-                            "name": "list_metric_categories",
-                            "description": "List all available GA4 metric categories with descriptions",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {}
-                            }
-                        },
-                        {
-                            "name": "get_dimensions_by_category",
-                            "description": "Get all dimensions in a specific category with their descriptions",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "category": {
-                                        "type": "string",
-                                        "description": "Category name (e.g., 'time', 'geography', 'ecommerce')"
-                                    }
-                                },
-                                "required": ["category"]
-                            }
-                        },
-                        {
-                            "name": "get_metrics_by_category",
-                            "description": "Get all metrics in a specific category with their descriptions",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "category": {
-                                        "type": "string",
-                                        "description": "Category name (e.g., 'user_metrics', 'ecommerce_metrics')"
-                                    }
-                                },
-                                "required": ["category"]
-                            }
-                        },
-                        {
-                            "name": "get_ga4_data",
-                            "description": "Retrieve GA4 metrics data broken down by the specified dimensions",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "dimensions": {
-                                        "type": "array",
-                                        "items": {"type": "string"},
-                                        "default": ["date"],
-                                        "description": "List of GA4 dimensions"
-                                    },
-                                    "metrics": {
-                                        "type": "array",
-                                        "items": {"type": "string"},
-                                        "default": ["totalUsers", "newUsers"],
-                                        "description": "List of GA4 metrics"
-                                    },
-                                    "date_range_start": {
-                                        "type": "string",
-                                        "default": "7daysAgo",
-                                        "description": "Start date (YYYY-MM-DD or relative)"
-                                    },
-                                    "date_range_end": {
-                                        "type": "string",
-                                        "default": "yesterday",
-                                        "description": "End date (YYYY-MM-DD or relative)"
-                                    },
-                                    "dimension_filter": {
-                                        "type": "object",
-                                        "description": "Optional GA4 FilterExpression"
-                                    }
-                                }
-                            }
-                        }
-                    ]
-                },
-                id=request.id
-            )
-        
-        elif request.method == "tools/call":
-            tool_name = request.params.get("name")
-            arguments = request.params.get("arguments", {})
-            
-            # Call the appropriate tool
-            if tool_name == "list_dimension_categories":
-                result = list_dimension_categories.fn()
-            elif tool_name == "list_metric_categories":
-                result = list_metric_categories.fn()
-            elif tool_name == "get_dimensions_by_category":
-                result = get_dimensions_by_category.fn(
-                    category=arguments.get("category")
-                )
-            elif tool_name == "get_metrics_by_category":
-                result = get_metrics_by_category.fn(
-                    category=arguments.get("category")
-                )
-            elif tool_name == "get_ga4_data":
-                result = get_ga4_data.fn(
-                    dimensions=arguments.get("dimensions", ["date"]),
-                    metrics=arguments.get("metrics", ["totalUsers", "newUsers"]),
-                    date_range_start=arguments.get("date_range_start", "7daysAgo"),
-                    date_range_end=arguments.get("date_range_end", "yesterday"),
-                    dimension_filter=arguments.get("dimension_filter")
-                )
-            else:
-                return MCPResponse(
-                    jsonrpc="2.0",
-                    error=MCPError(
-                        code=-32601,
-                        message=f"Unknown tool: {tool_name}"
-                    ),
-                    id=request.id
-                )
-            
-            return MCPResponse(
-                jsonrpc="2.0",
-                result={
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": json.dumps(result, indent=2)
-                        }
-                    ]
-                },
-                id=request.id
-            )
-        
-        else:
-            return MCPResponse(
-                jsonrpc="2.0",
-                error=MCPError(
-                    code=-32601,
-                    message=f"Method not found: {request.method}"
-                ),
-                id=request.id
-            )
-    
-    except Exception as e:
-        return MCPResponse(
-            jsonrpc="2.0",
-            error=MCPError(
-                code=-32603,
-                message="Internal error",
-                data=str(e)
-            ),
-            id=request.id
-        )
+    if isinstance(request, list):
+        responses = await handle_batch(request, "mcp")
+        return responses if responses else Response(status_code=202)
+
+    message = request.model_dump()
+    static = await handle_static(message, if_none_match)
+    if static is not None:
+        # initialize and tools/list never change: pre-encoded, and 304 for repeat clients
+        body, etag = static
+        if body is None:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/json", headers={"ETag": etag})
+
+    response = await handle_message(message, "mcp")
+    if response is None:
+        # Notifications get no JSON-RPC response
+        return Response(status_code=202)
+    wait = retry_after(response)
+    if wait is not None:
+        return JSONResponse(response, status_code=429, headers=retry_after_headers(wait))
+    return response
 
 # Legacy REST endpoints for backward compatibility
 @app.get("/api/dimensions", tags=["REST API"])
 async def list_dimensions_rest(username: str = Depends(verify_credentials)):
     """REST endpoint for listing dimensions"""
-    return list_dimension_categories.fn()
+    return await registry.call("list_dimension_categories", transport="rest")
 
 @app.get("/api/metrics", tags=["REST API"])
 async def list_metrics_rest(username: str = Depends(verify_credentials)):
     """REST endpoint for listing metrics"""
-    return list_metric_categories.fn()
+    return await registry.call("list_metric_categories", transport="rest")
 
 @app.get("/api/dimensions/{category}", tags=["REST API"])
 async def get_dimensions_by_category_rest(
@@ -319,7 +174,7 @@ async def get_dimensions_by_category_rest(
     username: str = Depends(verify_credentials)
 ):
     """REST endpoint for getting dimensions by category"""
-    return get_dimensions_by_category.fn(category)
+    return await registry.call("get_dimensions_by_category", {"category": category}, "rest")
 
 @app.get("/api/metrics/{category}", tags=["REST API"])
 async def get_metrics_by_category_rest(
@@ -327,7 +182,7 @@ async def get_metrics_by_category_rest(
     username: str = Depends(verify_credentials)
 ):
     """REST endpoint for getting metrics by category"""
-    return get_metrics_by_category.fn(category)
+    return await registry.call("get_metrics_by_category", {"category": category}, "rest")
 
 class GA4DataRequest(BaseModel):
     dimensions: List[str] = Field(default=["date"])
@@ -335,6 +190,14 @@ class GA4DataRequest(BaseModel):
     date_range_start: str = Field(default="7daysAgo")
     date_range_end: str = Field(default="yesterday")
     dimension_filter: Optional[Dict[str, Any]] = None
+    shard_by: Optional[str] = None
+    incremental: bool = False
+    date_ranges: Optional[List[Dict[str, Any]]] = None
+    group_by: Optional[List[str]] = None
+    aggregate: str = "sum"
+    top_n: Optional[int] = None
+    sort_by: Optional[str] = None
+    max_rows: Optional[int] = None
 
 @app.post("/api/data", tags=["REST API"])
 async def get_ga4_data_rest(
@@ -342,13 +205,52 @@ async def get_ga4_data_rest(
     username: str = Depends(verify_credentials)
 ):
     """REST endpoint for getting GA4 data"""
-    return get_ga4_data.fn(
-        dimensions=request.dimensions,
-        metrics=request.metrics,
-        date_range_start=request.date_range_start,
-        date_range_end=request.date_range_end,
-        dimension_filter=request.dimension_filter
-    )
+    return await registry.call("get_ga4_data", request.model_dump(), "rest")
+
+class WarmQueryRequest(BaseModel):
+    query: Dict[str, Any] = Field(description="get_ga4_data arguments to keep warm")
+    name: Optional[str] = None
+    interval: Optional[int] = Field(default=None, description="Refresh interval in seconds")
+
+@app.get("/warm", tags=["Cache"])
+async def list_warm_queries(username: str = Depends(verify_credentials)):
+    """List queries kept warm in the result cache"""
+    return {"queries": warm_registry.list()}
+
+@app.post("/warm", tags=["Cache"])
+async def register_warm_query(
+    request: WarmQueryRequest,
+    username: str = Depends(verify_credentials)
+):
+    """Register a get_ga4_data query to be refreshed into the result cache ahead of time"""
+    try:
+        name = warm_registry.register(request.query, name=request.name, interval=request.interval)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"name": name, "status": "registered"}
+
+@app.delete("/warm/{name}", tags=["Cache"])
+async def unregister_warm_query(name: str, username: str = Depends(verify_credentials)):
+    """Stop keeping a query warm"""
+    if not warm_registry.unregister(name):
+        raise HTTPException(status_code=404, detail=f"Warm query '{name}' not found")
+    return {"name": name, "status": "removed"}
+
+class CacheInvalidateRequest(BaseModel):
+    date_range_start: Optional[str] = Field(default=None, description="First day to invalidate (open when omitted)")
+    date_range_end: Optional[str] = Field(default=None, description="Last day to invalidate (open when omitted)")
+
+@app.post("/cache/invalidate", tags=["Cache"])
+async def invalidate_cached_reports(
+    request: CacheInvalidateRequest,
+    username: str = Depends(verify_credentials)
+):
+    """Drop cached results and stored incremental days covering a date range (everything without dates)"""
+    try:
+        dropped = await asyncio.to_thread(invalidate_cache, request.date_range_start, request.date_range_end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "invalidated", **dropped}
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
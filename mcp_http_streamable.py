@@ -1,30 +1,42 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+from fastapi import FastAPI, HTTPException, Depends, Header, status, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any, AsyncGenerator
+from typing import List, Optional, Union, Dict, Any, AsyncGenerator
 import uvicorn
+import asyncio
 import os
 import sys
 import secrets
 import json
-import asyncio
 from datetime import datetime
+from contextlib import asynccontextmanager
 
-# Import MCP functions
-from ga4_mcp_server import (
-    list_dimension_categories,
-    list_metric_categories,
-    get_dimensions_by_category,
-    get_metrics_by_category,
-    get_ga4_data
-)
+import admission
+from admission import retry_after_headers
+from mcp_dispatch import handle_batch, handle_message, handle_static, iter_responses, progress_token, retry_after
+from mcp_sessions import SESSION_HEADER, sessions, sse_stream
+from ga4_mcp_server import ga4_breaker, invalidate_cache, start_token_refresh
+from warm_queries import warm_registry, start_warming
+import server_metrics
+from tracing import set_attributes, start_span
+from ga4_logging import get_logger
+
+logger = get_logger("stream")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background jobs (warm-query scheduler, access token refresh) with the app"""
+    start_token_refresh()
+    start_warming()
+    yield
 
 app = FastAPI(
     title="GA4 MCP Streamable Server",
     description="MCP-compatible HTTP Streamable server for Google Analytics 4",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Basic auth setup
@@ -36,10 +48,8 @@ API_PASSWORD = os.getenv("API_PASSWORD", "changeme")
 
 def verify_credentials(credentials: HTTPBasicCredentials = Depends(security)):
     """Verify basic auth credentials"""
-    import logging
-    logger = logging.getLogger("uvicorn")
     # TEMPORARILY DISABLED FOR TESTING
-    logger.info(f"Auth DISABLED for testing")
+    logger.debug("Auth DISABLED for testing")
     return "test_user"
     
     # logger.info(f"Auth attempt - Username: {credentials.username}, Expected: {API_USERNAME}")
@@ -68,6 +78,27 @@ def verify_credentials(credentials: HTTPBasicCredentials = Depends(security)):
     # logger.info(f"Auth success - User: {credentials.username}")
     # return credentials.username
 
+def require_credentials(credentials: HTTPBasicCredentials = Depends(security)):
+    """
+    Verify basic auth credentials, even while verify_credentials is disabled:
+    the cache endpoints spend GA4 quota (warm queries) or flush the caches
+    """
+    is_correct_username = secrets.compare_digest(
+        credentials.username.encode("utf8"),
+        API_USERNAME.encode("utf8")
+    )
+    is_correct_password = secrets.compare_digest(
+        credentials.password.encode("utf8"),
+        API_PASSWORD.encode("utf8")
+    )
+    if not (is_correct_username and is_correct_password):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return credentials.username
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -76,223 +107,65 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(server_metrics.InFlightMiddleware)
+admission.install(app)
 
 # MCP Protocol Models
 class MCPRequest(BaseModel):
     jsonrpc: str = "2.0"
     method: str
     params: Optional[Dict[str, Any]] = None
-    id: Optional[int] = None
+    id: Optional[Union[int, str]] = None
 
-async def stream_mcp_response(request: MCPRequest) -> AsyncGenerator[bytes, None]:
-    """Generate streaming MCP responses"""
-    try:
-        response = None
-        
-        # Handle different MCP methods
-        if request.method == "initialize":
-            response = {
-                "jsonrpc": "2.0",
-                "result": {
-                    "protocolVersion": "1.0.0",
-                    "capabilities": {
-                        "tools": {},
-                        "resources": {},
-                        "prompts": {}
-                    },
-                    "serverInfo": {
-                        "name": "ga4-analytics",
-                        "version": "1.0.0"
-                    }
-                },
-                "id": request.id
-            }
-        
-        elif request.method == "tools/list":
-            response = {
-                "jsonrpc": "2.0",
-                "result": {
-                    "tools": [
-                        {
-                            "name": "list_dimension_categories",
-                            "description": "List all available GA4 dimension categories with descriptions",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {},
-                                "required": []
-                            }
-                        },
-                        {
-                            "name": "list_metric_categories",
-                            "description": "List all available GA4 metric categories with descriptions",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {},
-                                "required": []
-                            }
-                        },
-                        {
-                            "name": "get_dimensions_by_category",
-                            "description": "Get all dimensions in a specific category with their descriptions",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "category": {
-                                        "type": "string",
-                                        "description": "Category name (e.g., 'time', 'geography', 'ecommerce')"
-                                    }
-                                },
-                                "required": ["category"]
-                            }
-                        },
-                        {
-                            "name": "get_metrics_by_category",
-                            "description": "Get all metrics in a specific category with their descriptions",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "category": {
-                                        "type": "string",
-                                        "description": "Category name (e.g., 'user_metrics', 'ecommerce_metrics')"
-                                    }
-                                },
-                                "required": ["category"]
-                            }
-                        },
-                        {
-                            "name": "get_ga4_data",
-                            "description": "Retrieve GA4 metrics data broken down by the specified dimensions",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "dimensions": {
-                                        "type": "array",
-                                        "items": {"type": "string"},
-                                        "default": ["date"],
-                                        "description": "List of GA4 dimensions"
-                                    },
-                                    "metrics": {
-                                        "type": "array",
-                                        "items": {"type": "string"},
-                                        "default": ["totalUsers", "newUsers"],
-                                        "description": "List of GA4 metrics"
-                                    },
-                                    "date_range_start": {
-                                        "type": "string",
-                                        "default": "7daysAgo",
-                                        "description": "Start date (YYYY-MM-DD or relative)"
-                                    },
-                                    "date_range_end": {
-                                        "type": "string",
-                                        "default": "yesterday",
-                                        "description": "End date (YYYY-MM-DD or relative)"
-                                    },
-                                    "dimension_filter": {
-                                        "type": "object",
-                                        "description": "Optional GA4 FilterExpression"
-                                    }
-                                },
-                                "required": []
-                            }
-                        }
-                    ]
-                },
-                "id": request.id
-            }
-        
-        elif request.method == "tools/call":
-            tool_name = request.params.get("name")
-            arguments = request.params.get("arguments", {})
-            
-            # Call the appropriate tool
-            tool_result = None
-            if tool_name == "list_dimension_categories":
-                tool_result = list_dimension_categories.fn()
-            elif tool_name == "list_metric_categories":
-                tool_result = list_metric_categories.fn()
-            elif tool_name == "get_dimensions_by_category":
-                tool_result = get_dimensions_by_category.fn(
-                    category=arguments.get("category")
-                )
-            elif tool_name == "get_metrics_by_category":
-                tool_result = get_metrics_by_category.fn(
-                    category=arguments.get("category")
-                )
-            elif tool_name == "get_ga4_data":
-                tool_result = get_ga4_data.fn(
-                    dimensions=arguments.get("dimensions", ["date"]),
-                    metrics=arguments.get("metrics", ["totalUsers", "newUsers"]),
-                    date_range_start=arguments.get("date_range_start", "7daysAgo"),
-                    date_range_end=arguments.get("date_range_end", "yesterday"),
-                    dimension_filter=arguments.get("dimension_filter")
-                )
-            else:
-                response = {
-                    "jsonrpc": "2.0",
-                    "error": {
-                        "code": -32601,
-                        "message": f"Unknown tool: {tool_name}"
-                    },
-                    "id": request.id
-                }
-            
-            if tool_result is not None:
-                response = {
-                    "jsonrpc": "2.0",
-                    "result": {
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": json.dumps(tool_result, indent=2)
-                            }
-                        ]
-                    },
-                    "id": request.id
-                }
-        
-        elif request.method == "resources/list":
-            response = {
-                "jsonrpc": "2.0",
-                "result": {
-                    "resources": []
-                },
-                "id": request.id
-            }
-        
-        elif request.method == "prompts/list":
-            response = {
-                "jsonrpc": "2.0",
-                "result": {
-                    "prompts": []
-                },
-                "id": request.id
-            }
-        
-        else:
-            response = {
-                "jsonrpc": "2.0",
-                "error": {
-                    "code": -32601,
-                    "message": f"Method not found: {request.method}"
-                },
-                "id": request.id
-            }
-        
-        # Stream the response
-        if response:
-            yield json.dumps(response).encode('utf-8') + b'\n'
-    
-    except Exception as e:
-        error_response = {
-            "jsonrpc": "2.0",
-            "error": {
-                "code": -32603,
-                "message": "Internal error",
-                "data": str(e)
-            },
-            "id": request.id
-        }
-        yield json.dumps(error_response).encode('utf-8') + b'\n'
+def get_session(request: Request):
+    """Session named by the Mcp-Session-Id header: None without the header, 404 when unknown or expired"""
+    session_id = request.headers.get(SESSION_HEADER)
+    if not session_id:
+        return None
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Session not found or expired; send initialize without Mcp-Session-Id to start a new one"
+        )
+    return session
+
+def stream_headers(session=None):
+    """Response headers for /stream, carrying the session id when there is one"""
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    }
+    if session is not None:
+        headers[SESSION_HEADER] = session.id
+    return headers
+
+async def mcp_response(request: MCPRequest, session=None):
+    """Handle one MCP request; a session's progress notifications go to its GET stream"""
+    with start_span("mcp.stream_response", {"rpc.method": request.method}):
+        notify = session.publish if session is not None else None
+        return await handle_message(request.model_dump(), "stream", notify)
+
+def wants_sse(request: Request):
+    """True when the client accepts SSE but not NDJSON (spec MCP Streamable HTTP clients)"""
+    accept = request.headers.get("accept", "")
+    return "text/event-stream" in accept and "application/x-ndjson" not in accept
+
+async def stream_messages(messages: List[Any], sse: bool = False, session=None) -> AsyncGenerator[bytes, None]:
+    """
+    Stream progress notifications and responses as they happen, one NDJSON line
+    (or SSE event) each; responses come in completion order, so match them by id.
+    Within a session the notifications go to the session's GET stream instead.
+    """
+    notify = session.publish if session is not None else None
+    async for message in iter_responses(messages, "stream", notify):
+        data = json.dumps(message)
+        yield f"event: message\ndata: {data}\n\n".encode('utf-8') if sse else data.encode('utf-8') + b'\n'
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus metrics: tool and GA4 RPC latency, row counts, payload sizes, cache stats"""
+    return PlainTextResponse(server_metrics.REGISTRY.render(), media_type=server_metrics.CONTENT_TYPE)
 
 @app.get("/", tags=["Health"])
 async def root():
@@ -303,6 +176,7 @@ async def root():
         "protocol": "MCP over HTTP Streamable",
         "version": "1.0.0",
         "timestamp": datetime.now().isoformat(),
+        "upstream": ga4_breaker.snapshot(),
         "endpoints": {
             "stream": "/stream",
             "mcp": "/mcp",
@@ -312,11 +186,25 @@ async def root():
     }
 
 @app.get("/stream", tags=["MCP"])
-async def mcp_stream_info():
+async def mcp_stream_info(request: Request):
     """
-    Stream endpoint info - returns streaming capabilities
+    Stream endpoint info - returns streaming capabilities.
+
+    With `Accept: text/event-stream` and an Mcp-Session-Id header, opens the
+    session's SSE stream of server messages instead; send Last-Event-ID to
+    resume after a disconnect.
     """
-    print(f"GET /stream - User: test_user (auth disabled)", file=sys.stderr)
+    logger.debug("GET /stream", extra={"fields": {"user": "test_user", "auth": "disabled"}})
+    if "text/event-stream" in request.headers.get("accept", ""):
+        session = get_session(request)
+        if session is None:
+            raise HTTPException(status_code=400, detail="GET /stream as SSE requires an Mcp-Session-Id header")
+        last_event_id = request.headers.get("last-event-id")
+        return StreamingResponse(
+            sse_stream(session, int(last_event_id) if last_event_id and last_event_id.isdigit() else None),
+            media_type="text/event-stream",
+            headers=stream_headers(session)
+        )
     response = {
         "type": "mcp-streamable",
         "version": "1.0.0",
@@ -330,41 +218,78 @@ async def mcp_stream_info():
             "tools": True,
             "resources": False,
             "prompts": False,
-            "streaming": True
+            "streaming": True,
+            "sessions": True
         }
     }
-    print(f"GET /stream response: {json.dumps(response)[:100]}...", file=sys.stderr)
     return response
 
+@app.delete("/stream", tags=["MCP"])
+async def mcp_stream_close(request: Request):
+    """Terminate the session named by the Mcp-Session-Id header"""
+    session_id = request.headers.get(SESSION_HEADER)
+    if not session_id:
+        raise HTTPException(status_code=400, detail="Mcp-Session-Id header required")
+    if not sessions.close(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return Response(status_code=204)
+
 @app.post("/stream", tags=["MCP"])
 async def mcp_stream_endpoint(
     request: Request
 ):
     """
     HTTP Streamable MCP endpoint - handles all MCP requests with streaming responses
+
+    `initialize` starts a session and returns its id in the Mcp-Session-Id
+    header; sending that header on later requests keeps per-session state.
+    Requests without the header are handled statelessly.
     """
-    print(f"POST /stream - User: test_user (auth disabled)", file=sys.stderr)
-    print(f"Headers: {dict(request.headers)}", file=sys.stderr)
+    logger.debug("POST /stream", extra={"fields": {"user": "test_user", "headers": dict(request.headers)}})
+    session = get_session(request)
     
     try:
         # Parse the request body
-        body = await request.json()
-        print(f"Request body: {json.dumps(body)}", file=sys.stderr)
+        with start_span("http.parse_json"):
+            body = await request.json()
+        logger.debug("POST /stream body", extra={"fields": {"body": body}})
+        
+        if isinstance(body, list) or (progress_token(body) is not None and session is None):
+            # JSON-RPC batch, or a sessionless call asking for progress: requests run concurrently
+            # and responses (and, without a session, progress notifications) are streamed as they happen
+            sse = wants_sse(request)
+            return StreamingResponse(
+                stream_messages(body if isinstance(body, list) else [body], sse, session),
+                media_type="text/event-stream" if sse else "application/x-ndjson",
+                headers=stream_headers(session)
+            )
         
         mcp_request = MCPRequest(**body)
-        print(f"MCP method: {mcp_request.method}, id: {mcp_request.id}", file=sys.stderr)
+        logger.debug("MCP request", extra={"fields": {"method": mcp_request.method, "id": mcp_request.id}})
+        # initialize and tools/list never change: pre-encoded, and 304 for repeat clients
+        static = await handle_static(mcp_request.model_dump(), request.headers.get("if-none-match"))
+        if static is not None and static[0] is None:
+            # Not modified; a conditional initialize starts no session, as a 304 cannot carry its result
+            return Response(status_code=304, headers={"ETag": static[1], **stream_headers(session)})
+        if mcp_request.method == "initialize":
+            session = sessions.create(mcp_request.params)
+        if static is not None:
+            payload, etag = static
+            headers = {"ETag": etag, **stream_headers(session)}
+            return Response(payload + b'\n', media_type="application/x-ndjson", headers=headers)
         
-        # Return streaming response
-        return StreamingResponse(
-            stream_mcp_response(mcp_request),
-            media_type="application/x-ndjson",
-            headers={
-                "Cache-Control": "no-cache",
-                "X-Accel-Buffering": "no"
-            }
-        )
+        # Answered once the call completes so an admission rejection can still be a 429
+        response = await mcp_response(mcp_request, session)
+        headers = stream_headers(session)
+        if response is None:
+            return Response(status_code=202, headers=headers)
+        wait = retry_after(response)
+        if wait is not None:
+            headers.update(retry_after_headers(wait))
+        return Response(json.dumps(response).encode('utf-8') + b'\n', status_code=429 if wait else 200,
+                        media_type="application/x-ndjson", headers=headers)
     except Exception as e:
-        print(f"ERROR in POST /stream: {str(e)}", file=sys.stderr)
+        logger.warning("Invalid POST /stream request: %s", e)
         raise HTTPException(
             status_code=400,
             detail=f"Invalid request: {str(e)}"
@@ -373,18 +298,34 @@ async def mcp_stream_endpoint(
 # Legacy endpoints for compatibility
 @app.post("/mcp", tags=["MCP"])
 async def mcp_endpoint(
-    request: MCPRequest,
-    username: str = Depends(verify_credentials)
+    # Batch members are checked one by one, so each invalid member gets its own -32600 error
+    request: Union[MCPRequest, List[Any]],
+    username: str = Depends(verify_credentials),
+    if_none_match: Optional[str] = Header(default=None)
 ):
     """
-    Standard MCP endpoint (non-streaming)
+    Standard MCP endpoint (non-streaming); also accepts JSON-RPC batches
     """
-    # Convert streaming response to standard response
-    response_data = b""
-    async for chunk in stream_mcp_response(request):
-        response_data += chunk
-    
-    return json.loads(response_data.decode('utf-8'))
+    if isinstance(request, list):
+        responses = await handle_batch(request, "mcp")
+        return responses if responses else Response(status_code=202)
+
+    message = request.model_dump()
+    static = await handle_static(message, if_none_match)
+    if static is not None:
+        body, etag = static
+        if body is None:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/json", headers={"ETag": etag})
+
+    response = await handle_message(message, "mcp")
+    if response is None:
+        # Notifications get no JSON-RPC response
+        return Response(status_code=202)
+    wait = retry_after(response)
+    if wait is not None:
+        return JSONResponse(response, status_code=429, headers=retry_after_headers(wait))
+    return response
 
 @app.get("/mcp", tags=["MCP"])
 async def mcp_info(username: str = Depends(verify_credentials)):
@@ -409,6 +350,51 @@ async def mcp_info(username: str = Depends(verify_credentials)):
         "authentication": "Basic"
     }
 
+class WarmQueryRequest(BaseModel):
+    query: Dict[str, Any] = Field(description="get_ga4_data arguments to keep warm")
+    name: Optional[str] = None
+    interval: Optional[int] = Field(default=None, description="Refresh interval in seconds")
+
+@app.get("/warm", tags=["Cache"])
+async def list_warm_queries(username: str = Depends(require_credentials)):
+    """List queries kept warm in the result cache"""
+    return {"queries": warm_registry.list()}
+
+@app.post("/warm", tags=["Cache"])
+async def register_warm_query(
+    request: WarmQueryRequest,
+    username: str = Depends(require_credentials)
+):
+    """Register a get_ga4_data query to be refreshed into the result cache ahead of time"""
+    try:
+        name = warm_registry.register(request.query, name=request.name, interval=request.interval)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"name": name, "status": "registered"}
+
+@app.delete("/warm/{name}", tags=["Cache"])
+async def unregister_warm_query(name: str, username: str = Depends(require_credentials)):
+    """Stop keeping a query warm"""
+    if not warm_registry.unregister(name):
+        raise HTTPException(status_code=404, detail=f"Warm query '{name}' not found")
+    return {"name": name, "status": "removed"}
+
+class CacheInvalidateRequest(BaseModel):
+    date_range_start: Optional[str] = Field(default=None, description="First day to invalidate (open when omitted)")
+    date_range_end: Optional[str] = Field(default=None, description="Last day to invalidate (open when omitted)")
+
+@app.post("/cache/invalidate", tags=["Cache"])
+async def invalidate_cached_reports(
+    request: CacheInvalidateRequest,
+    username: str = Depends(require_credentials)
+):
+    """Drop cached results and stored incremental days covering a date range (everything without dates)"""
+    try:
+        dropped = await asyncio.to_thread(invalidate_cache, request.date_range_start, request.date_range_end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "invalidated", **dropped}
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
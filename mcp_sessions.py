@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+# Seconds of inactivity after which a session expires
+MCP_SESSION_TTL = int(os.getenv("MCP_SESSION_TTL", "1800"))
+# Maximum number of live sessions; the least recently used one is dropped beyond this
+MCP_SESSION_MAX = int(os.getenv("MCP_SESSION_MAX", "1000"))
+# Server messages kept per session so a reconnecting SSE client can resume (Last-Event-ID)
+MCP_SESSION_EVENT_BUFFER = int(os.getenv("MCP_SESSION_EVENT_BUFFER", "100"))
+# Seconds between SSE keep-alive comments on an idle GET stream
+MCP_SSE_KEEPALIVE = float(os.getenv("MCP_SSE_KEEPALIVE", "15"))
+
+SESSION_HEADER = "Mcp-Session-Id"
+
+# Pushed to subscribers when a session is closed
+_CLOSED = object()
+
+
+class Session:
+    """
+    State for one MCP client between initialize and DELETE (or expiry).
+
+    Holds what the client negotiated in initialize and a numbered log of
+    server-to-client messages (progress and other notifications) for the GET
+    SSE stream. publish() may be called from any thread.
+    """
+
+    def __init__(self, session_id, params):
+        self.id = session_id
+        self.protocol_version = params.get("protocolVersion")
+        self.client_info = params.get("clientInfo") or {}
+        self.client_capabilities = params.get("capabilities") or {}
+        self.created_at = self.last_seen = time.time()
+        self.events = deque(maxlen=MCP_SESSION_EVENT_BUFFER)
+        self._subscribers = set()
+        self._next_event_id = 1
+        self._lock = threading.Lock()
+
+    def publish(self, message):
+        """Append a server message to the event log and push it to open SSE streams; returns its event id"""
+        with self._lock:
+            event = (self._next_event_id, message)
+            self._next_event_id += 1
+            self.events.append(event)
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        return event[0]
+
+    def subscribe(self):
+        """Queue receiving every event published from now on (call from the event loop)"""
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = {s for s in self._subscribers if s[1] is not queue}
+
+    def replay(self, last_event_id):
+        """Buffered events after last_event_id (all buffered events when None)"""
+        with self._lock:
+            return [e for e in self.events if last_event_id is None or e[0] > last_event_id]
+
+    def close(self):
+        """End every open SSE stream of this session"""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, set()
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, _CLOSED)
+
+
+class SessionManager:
+    """Live sessions by id, expiring after `ttl` idle seconds and capped at `max_sessions`"""
+
+    def __init__(self, ttl, max_sessions):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, params=None):
+        """Start a session for an initialize request"""
+        session = Session(uuid.uuid4().hex, params or {})
+        with self._lock:
+            self._sessions[session.id] = session
+            evicted = []
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._sessions.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        return session
+
+    def get(self, session_id):
+        """Live session for session_id (refreshing its idle timer), or None"""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if now - session.last_seen >= self.ttl:
+                del self._sessions[session_id]
+                expired = session
+                session = None
+            else:
+                session.last_seen = now
+                self._sessions.move_to_end(session_id)
+                expired = None
+        if expired is not None:
+            expired.close()
+        return session
+
+    def close(self, session_id):
+        """Terminate a session; False if it did not exist"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+sessions = SessionManager(MCP_SESSION_TTL, MCP_SESSION_MAX)
+
+
+def format_sse(event_id, message):
+    """Encode one server message as an SSE event"""
+    return f"id: {event_id}\nevent: message\ndata: {json.dumps(message)}\n\n".encode("utf-8")
+
+
+async def sse_stream(session, last_event_id=None):
+    """
+    SSE byte stream of a session's server messages.
+
+    Replays buffered events after last_event_id first, then follows new ones,
+    with keep-alive comments while idle; ends when the session is closed.
+    """
+    queue = session.subscribe()
+    try:
+        last_sent = last_event_id or 0
+        for event_id, message in session.replay(last_event_id):
+            yield format_sse(event_id, message)
+            last_sent = event_id
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), MCP_SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if event is _CLOSED:
+                return
+            event_id, message = event
+            # Events published while replaying are already sent
+            if event_id > last_sent:
+                yield format_sse(event_id, message)
+                last_sent = event_id
+    finally:
+        session.unsubscribe(queue)
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+
+from report_postprocess import is_empty_row
+from server_metrics import MERGED_REPORTS
+
+# Seconds a report call waits for concurrent calls it can merge with (0, the default, disables
+# merging; every uncached report then starts at once)
+GA4_BATCH_WINDOW = float(os.getenv("GA4_BATCH_WINDOW", "0"))
+# Most metrics in one merged report (GA4 accepts at most 10 metrics per request)
+GA4_BATCH_MAX_METRICS = int(os.getenv("GA4_BATCH_MAX_METRICS", "10"))
+
+
+class _Batch:
+    __slots__ = ("metrics", "callers", "progress", "done", "rows", "error")
+
+    def __init__(self, metrics):
+        self.metrics = list(metrics)
+        self.callers = 1
+        self.progress = []
+        self.done = threading.Event()
+        self.rows = None
+        self.error = None
+
+    def report_progress(self, pages, rows, total):
+        """Forward the merged report's progress to every caller that asked for it"""
+        for progress in self.progress:
+            progress(pages, rows, total)
+
+
+def _project(rows, metrics, fetched_metrics):
+    """Rows of a widened report reduced to `metrics`, as GA4 would have returned them"""
+    if fetched_metrics == metrics:
+        return rows
+    extra = set(fetched_metrics) - set(metrics)
+    projected = []
+    for row in rows:
+        if is_empty_row(row, metrics):
+            continue
+        data_row = {k: v for k, v in row.items() if k not in extra and k not in metrics}
+        data_row.update((m, row.get(m)) for m in metrics)
+        projected.append(data_row)
+    return projected
+
+
+class ReportBatcher:
+    """
+    Merges concurrent report calls that differ only in their metrics.
+
+    The first call for a key (dimensions, date range, filter) opens a batch and
+    waits `window` seconds; calls with the same key arriving meanwhile add
+    their metrics to it as long as the union stays within `max_metrics`. The
+    first call then fetches the union once and every caller gets the rows
+    reduced to its own metrics, and the progress of the shared fetch.
+    Thread-safe.
+    """
+
+    def __init__(self, window, max_metrics):
+        self.window = window
+        self.max_metrics = max_metrics
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, metrics, fetch, progress=None):
+        """
+        Return fetch(metrics, progress), possibly from one fetch of a wider metric list.
+
+        Args:
+            key: Hashable description of everything but the metrics.
+            metrics: The caller's metric names.
+            fetch: Callable(metric_names, progress) returning formatted rows and
+                   reporting to progress(pages, rows, total) unless it is None.
+            progress: The caller's progress callable, or None.
+        """
+        metrics = list(metrics)
+        if self.window <= 0 or len(metrics) > self.max_metrics:
+            return fetch(metrics, progress)
+
+        with self._lock:
+            batch = self._open.get(key)
+            union = None
+            if batch is not None:
+                union = batch.metrics + [m for m in metrics if m not in batch.metrics]
+            if union is not None and len(union) <= self.max_metrics:
+                batch.metrics = union
+                batch.callers += 1
+                leader = False
+            else:
+                batch = self._open[key] = _Batch(metrics)
+                leader = True
+            if progress is not None:
+                batch.progress.append(progress)
+
+        if not leader:
+            batch.done.wait()
+            MERGED_REPORTS.inc()
+        else:
+            time.sleep(self.window)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+            try:
+                # Nobody joins once the batch is closed, so every caller's progress is registered
+                batch.rows = fetch(batch.metrics, batch.report_progress if batch.progress else None)
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+
+        if batch.error is not None:
+            raise batch.error
+        return _project(batch.rows, metrics, batch.metrics)
+
+
+report_batcher = ReportBatcher(GA4_BATCH_WINDOW, GA4_BATCH_MAX_METRICS)
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Lookup states
+FRESH = "fresh"
+STALE = "stale"
+
+
+class ReportCache:
+    """
+    Thread-safe in-memory LRU cache of GA4 report results.
+
+    Keys are built from the normalized report spec, so the same query issued
+    through MCP, REST or the warm-query scheduler shares one entry.
+
+    Entries are fresh for `ttl` seconds, or for the TTL they were stored with.
+    After that they may still be served for `stale_while_revalidate` seconds
+    while a single background refresh runs, and for `stale_if_error` seconds
+    when fetching a new result fails. Entries stored with the date range they
+    cover can be invalidated by range.
+    """
+
+    def __init__(self, ttl, max_entries, stale_while_revalidate=0, stale_if_error=0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._revalidating = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(spec):
+        """Stable cache key for a report spec dictionary"""
+        canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def lookup(self, key):
+        """
+        Look up a cached value.
+
+        Returns:
+            (value, FRESH) within the TTL, (value, STALE) within the
+            stale-while-revalidate window, otherwise (None, None).
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value, ttl = entry[:3]
+                age = now - stored_at
+                if age < ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, FRESH
+                if age < ttl + self.stale_while_revalidate:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    return value, STALE
+            self.misses += 1
+            return None, None
+
+    def get(self, key):
+        """Return the fresh cached value for key, or None"""
+        value, state = self.lookup(key)
+        return value if state == FRESH else None
+
+    def get_if_error(self, key):
+        """
+        Return (value, stored_at) for the last good result when a refresh failed,
+        as long as it is within the stale-if-error window; otherwise (None, None).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] >= entry[2] + self.stale_if_error:
+                return None, None
+            return entry[1], entry[0]
+
+    def set(self, key, value, ttl=None, date_range=None, spec=None):
+        """
+        Store value under key.
+
+        Args:
+            ttl: Seconds the entry stays fresh (default: the cache TTL; 0 skips storing)
+            date_range: (start, end) YYYY-MM-DD strings the value covers, for invalidate()
+            spec: The report spec the key was built from, for fresh_items()
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if self.ttl <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), value, ttl, date_range, spec)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def fresh_items(self):
+        """(spec, value) of the fresh entries stored with a spec, most recently used first"""
+        now = time.time()
+        with self._lock:
+            return [
+                (spec, value) for stored_at, value, ttl, _, spec in reversed(self._entries.values())
+                if spec is not None and now - stored_at < ttl
+            ]
+
+    def begin_revalidation(self, key):
+        """Claim the background refresh for key; False if one is already running"""
+        with self._lock:
+            if key in self._revalidating:
+                return False
+            self._revalidating.add(key)
+            return True
+
+    def end_revalidation(self, key):
+        """Release the background refresh claim for key"""
+        with self._lock:
+            self._revalidating.discard(key)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, start=None, end=None):
+        """
+        Drop the entries covering any day from start to end (YYYY-MM-DD strings,
+        either side open), or every entry when neither is given. Entries stored
+        without a date range are dropped too, since they may cover those days.
+
+        Returns:
+            Number of entries dropped.
+        """
+        with self._lock:
+            if start is None and end is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            keys = [
+                key for key, (_, _, _, date_range, _) in self._entries.items()
+                if date_range is None
+                or ((start is None or date_range[1] >= start) and (end is None or date_range[0] <= end))
+            ]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "entries": len(self._entries)
+            }
@@ -0,0 +1,164 @@
+import re
+
+from ga4_dates import DATE_DIMENSIONS
+from report_postprocess import group_rows, is_empty_row, summable_metrics
+
+
+def _conjuncts(expr):
+    """The AND-ed parts of a dimension_filter (nested andGroups are flattened)"""
+    if not expr:
+        return []
+    if "andGroup" in expr:
+        return [part for e in expr["andGroup"].get("expressions", []) for part in _conjuncts(e)]
+    return [expr]
+
+
+def _fields(expr):
+    """Dimension names a filter expression reads"""
+    if "andGroup" in expr or "orGroup" in expr:
+        group = expr.get("andGroup") or expr.get("orGroup")
+        return {field for e in group.get("expressions", []) for field in _fields(e)}
+    if "notExpression" in expr:
+        return _fields(expr["notExpression"])
+    return {expr.get("filter", {}).get("fieldName")}
+
+
+def _string_match(value, string_filter):
+    expected = string_filter.get("value", "")
+    case_sensitive = string_filter.get("caseSensitive", False)
+    match_type = string_filter.get("matchType", "EXACT")
+    if match_type in ("FULL_REGEXP", "PARTIAL_REGEXP"):
+        pattern = re.compile(expected, 0 if case_sensitive else re.IGNORECASE)
+        match = pattern.fullmatch if match_type == "FULL_REGEXP" else pattern.search
+        return match(value) is not None
+    if not case_sensitive:
+        value, expected = value.lower(), expected.lower()
+    if match_type == "BEGINS_WITH":
+        return value.startswith(expected)
+    if match_type == "ENDS_WITH":
+        return value.endswith(expected)
+    if match_type == "CONTAINS":
+        return expected in value
+    return value == expected
+
+
+def matches(expr, row):
+    """Evaluate a dimension_filter expression against a formatted row, like GA4 would"""
+    if "andGroup" in expr:
+        return all(matches(e, row) for e in expr["andGroup"].get("expressions", []))
+    if "orGroup" in expr:
+        return any(matches(e, row) for e in expr["orGroup"].get("expressions", []))
+    if "notExpression" in expr:
+        return not matches(expr["notExpression"], row)
+    f = expr["filter"]
+    value = row.get(f["fieldName"]) or ""
+    if "stringFilter" in f:
+        return _string_match(value, f["stringFilter"])
+    if "inListFilter" in f:
+        in_list = f["inListFilter"]
+        values = in_list.get("values", [])
+        if in_list.get("caseSensitive", False):
+            return value in values
+        return value.lower() in {v.lower() for v in values}
+    raise ValueError(f"Cannot evaluate filter {f} locally")
+
+
+def _evaluable(expr):
+    """True when matches() supports every part of the expression"""
+    if "andGroup" in expr or "orGroup" in expr:
+        group = expr.get("andGroup") or expr.get("orGroup")
+        return all(_evaluable(e) for e in group.get("expressions", []))
+    if "notExpression" in expr:
+        return _evaluable(expr["notExpression"])
+    f = expr.get("filter", {})
+    if "stringFilter" in f and f["stringFilter"].get("matchType") in ("FULL_REGEXP", "PARTIAL_REGEXP"):
+        try:
+            re.compile(f["stringFilter"].get("value", ""))
+        except re.error:
+            return False
+    return bool(f.get("fieldName")) and ("stringFilter" in f or "inListFilter" in f)
+
+
+def _residual_filter(requested, cached):
+    """
+    The filter parts a cached report still has to apply to answer `requested`:
+    None when the cached filter is not implied by the requested one.
+    """
+    requested_parts = _conjuncts(requested)
+    cached_parts = _conjuncts(cached)
+    if any(part not in requested_parts for part in cached_parts):
+        return None
+    return [part for part in requested_parts if part not in cached_parts]
+
+
+def _in_range(value, start, end):
+    # Date dimension values start with YYYYMMDD (date, dateHour, dateHourMinute)
+    return start <= value[:8] <= end
+
+
+def derive_rows(spec, cached_spec, rows, additive, rollup_additive):
+    """
+    Answer a report from the rows of a cached, finer-grained report, or return
+    None when the cached report cannot answer it.
+
+    The cached report answers when it covers the requested property and
+    metrics, its dimensions include the requested ones, its date range covers
+    the requested one (a narrower range needs a date dimension to filter on)
+    and its filter is implied by the requested one (the remaining filter
+    parts must only read cached dimensions, so they can be evaluated here).
+    Dimensions may only be dropped when every metric can be summed over them:
+    metrics in `additive` across date dimensions, metrics in `rollup_additive`
+    across any other dimension except item-scoped ones, which repeat an
+    event's values once per item.
+
+    Args:
+        spec, cached_spec: Report specs (property, dimensions, metrics,
+                           date_range as resolved YYYY-MM-DD strings, dimension_filter;
+                           truncated when the cached report misses rows).
+        rows: Formatted rows of the cached report.
+    """
+    if cached_spec.get("truncated"):
+        # The cached report was cut off at GA4_MAX_ROWS; its rows are incomplete
+        return None
+    if spec.get("date_ranges") or cached_spec.get("date_ranges"):
+        # Multi-range reports carry a dateRange column per row; not derived
+        return None
+    dimensions, metrics = spec["dimensions"], spec["metrics"]
+    cached_dimensions = cached_spec["dimensions"]
+    if cached_spec["property"] != spec["property"] or not set(metrics) <= set(cached_spec["metrics"]):
+        return None
+    if not set(dimensions) <= set(cached_dimensions):
+        return None
+
+    residual = _residual_filter(spec["dimension_filter"], cached_spec["dimension_filter"])
+    if residual is None or not all(_evaluable(e) and _fields(e) <= set(cached_dimensions) for e in residual):
+        return None
+
+    (start, end), (cached_start, cached_end) = spec["date_range"], cached_spec["date_range"]
+    if not cached_start <= start <= end <= cached_end:
+        return None
+    date_dimension = None
+    if (start, end) != (cached_start, cached_end):
+        date_dimension = next((d for d in cached_dimensions if d in DATE_DIMENSIONS), None)
+        if date_dimension is None:
+            return None
+
+    dropped = [d for d in cached_dimensions if d not in dimensions]
+    if dropped:
+        summable = summable_metrics(dropped, additive, rollup_additive)
+        if any(m not in summable for m in metrics):
+            return None
+
+    if date_dimension or residual:
+        start, end = start.replace("-", ""), end.replace("-", "")
+        rows = [
+            row for row in rows
+            if (date_dimension is None or _in_range(row.get(date_dimension) or "", start, end))
+            and all(matches(e, row) for e in residual)
+        ]
+    if dropped:
+        rows = group_rows(rows, cached_dimensions, metrics, dimensions, summable)
+    else:
+        rows = [{**{d: row.get(d) for d in dimensions}, **{m: row.get(m) for m in metrics}} for row in rows]
+    # Rows that only had values for metrics that were not requested are dropped, as GA4 would
+    return [row for row in rows if not is_empty_row(row, metrics)]
@@ -0,0 +1,244 @@
+from collections import OrderedDict
+
+from ga4_dates import DATE_DIMENSIONS
+
+AGGREGATES = ("sum", "mean")
+
+# Dimension value of the bucket that collects rows cut by top_n / max_rows
+OTHER = "(other)"
+# Dimension GA4 adds to multi-range reports, holding the date range name
+RANGE_DIMENSION = "dateRange"
+
+
+def _number(value):
+    if value in (None, ""):
+        return None
+    return float(value)
+
+
+def _format_number(value):
+    """Format like GA4 does: integers without a decimal point"""
+    if value is None:
+        return None
+    if float(value).is_integer():
+        return str(int(value))
+    return str(round(value, 6))
+
+
+def is_empty_row(row, metrics):
+    """True when all of `metrics` are zero or missing in row; GA4 leaves such rows out of reports"""
+    for m in metrics:
+        try:
+            if float(row.get(m)) != 0:
+                return False
+        except (TypeError, ValueError):
+            if row.get(m) not in (None, ""):
+                return False
+    return True
+
+
+def _combine(values, aggregate):
+    numbers = [n for n in (_number(v) for v in values) if n is not None]
+    if not numbers:
+        return None
+    total = sum(numbers)
+    return _format_number(total / len(numbers) if aggregate == "mean" else total)
+
+
+def _collapse(rows, dimensions, metrics, additive, aggregate, dimension_values=None):
+    """One row combining `rows`; non-additive metrics cannot be combined and become None"""
+    row = dict(dimension_values) if dimension_values else {d: OTHER for d in dimensions}
+    for m in metrics:
+        row[m] = _combine([r.get(m) for r in rows], aggregate) if m in additive else None
+    return row
+
+
+def summable_metrics(dropped, additive, rollup_additive):
+    """
+    Metrics whose values may be summed over the `dropped` dimensions: `additive`
+    ones across date dimensions, `rollup_additive` ones across any other
+    dimension except item-scoped ones, which repeat an event's values once per item.
+    """
+    if all(d in DATE_DIMENSIONS for d in dropped):
+        return additive
+    if any(d.startswith("item") for d in dropped):
+        return frozenset()
+    return rollup_additive
+
+
+def group_rows(rows, dimensions, metrics, group_by, additive, aggregate="sum"):
+    """
+    Group rows by a subset of their dimensions, combining metrics with sum or mean.
+    `additive` are the metrics that may be summed over the dropped dimensions
+    (see summable_metrics).
+    """
+    dropped = [d for d in dimensions if d not in group_by]
+    non_additive = [m for m in metrics if m not in additive]
+    if dropped and non_additive:
+        raise ValueError(
+            f"Cannot group away {dropped} with metrics {non_additive}: their values cannot "
+            f"be summed across those dimensions. Query GA4 with dimensions={list(group_by)} instead."
+        )
+    groups = OrderedDict()
+    for row in rows:
+        groups.setdefault(tuple(row.get(d) for d in group_by), []).append(row)
+    return [
+        _collapse(group, group_by, metrics, additive, aggregate, zip(group_by, key))
+        for key, group in groups.items()
+    ]
+
+
+def compare_columns(metrics, range_names):
+    """
+    Metric columns of a pivoted comparison report: each metric for the first
+    range, then per other range its value, delta and percent change.
+    """
+    columns = []
+    for m in metrics:
+        columns.append(m)
+        for name in range_names[1:]:
+            columns.extend([f"{m}_{name}", f"{m}_delta_{name}", f"{m}_pct_change_{name}"])
+    return columns
+
+
+def _pct_change(value, other):
+    return _format_number(round((value - other) / abs(other) * 100, 2)) if other else None
+
+
+def _fill_pct_changes(row, metrics, range_names):
+    """Recompute a collapsed comparison row's percent changes from its summed values"""
+    for m in metrics:
+        value = _number(row.get(m))
+        for name in range_names[1:]:
+            other = _number(row.get(f"{m}_{name}"))
+            if value is not None and other is not None:
+                row[f"{m}_pct_change_{name}"] = _pct_change(value, other)
+    return row
+
+
+def compare_rows(rows, dimensions, metrics, range_names):
+    """
+    Pivot a multi-range report (one row per dimension values and dateRange)
+    into one row per dimension values, with the deltas and percent changes of
+    the first range against each other range (see compare_columns).
+
+    GA4 leaves out rows whose metrics are all zero, so a range missing for
+    some dimension values counts as zero; percent changes from zero are None.
+    """
+    current, others = range_names[0], range_names[1:]
+    pivot = OrderedDict()
+    for row in rows:
+        pivot.setdefault(tuple(row.get(d) for d in dimensions), {})[row.get(RANGE_DIMENSION)] = row
+    result = []
+    for key, by_range in pivot.items():
+        data_row = dict(zip(dimensions, key))
+        base = by_range.get(current, {})
+        for m in metrics:
+            value = _number(base.get(m)) or 0.0
+            data_row[m] = base.get(m) or "0"
+            for name in others:
+                other_raw = by_range.get(name, {}).get(m)
+                other = _number(other_raw) or 0.0
+                data_row[f"{m}_{name}"] = other_raw or "0"
+                data_row[f"{m}_delta_{name}"] = _format_number(value - other)
+                data_row[f"{m}_pct_change_{name}"] = _pct_change(value, other)
+        result.append(data_row)
+    return result
+
+
+def _significance(row, sort_by):
+    value = _number(row.get(sort_by))
+    return value if value is not None else float("-inf")
+
+
+def _positive_int(name, value):
+    """Validate a row count option; MCP clients may send numbers as strings"""
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if number < 1 or isinstance(value, bool):
+        raise ValueError(f"{name} must be a positive integer.")
+    return number
+
+
+def postprocess_rows(rows, dimensions, metrics, additive, group_by=None, aggregate="sum",
+                     top_n=None, sort_by=None, max_rows=None, range_names=None, rollup_additive=frozenset()):
+    """
+    Shrink a formatted report before it is returned.
+
+    Args:
+        rows: Formatted rows (dicts of dimension and metric value strings).
+        dimensions, metrics: The requested dimension and metric names.
+        additive: Metric names whose values may be summed across date dimensions.
+        group_by: Subset of `dimensions` to group by; the other dimensions are dropped.
+        aggregate: 'sum' or 'mean', how grouped additive metrics are combined.
+        top_n: Keep the n rows with the largest `sort_by` value, in descending order,
+               and fold the rest into one "(other)" row.
+        sort_by: Metric ranking rows for top_n / max_rows (default: first metric).
+        max_rows: Row budget; larger results keep their most significant rows
+                  (by `sort_by`, in their original order) plus an "(other)" row.
+        range_names: Date range names of a multi-range report. Its rows are
+                     pivoted with compare_rows (after group_by), and sort_by
+                     may name any of the compare_columns.
+        rollup_additive: Metric names whose values may also be summed across
+                         other dimensions (see summable_metrics). Grouping away
+                         or folding rows over those dimensions only combines these.
+
+    Returns:
+        The processed rows. Raises ValueError for invalid options.
+    """
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"aggregate must be one of {list(AGGREGATES)}.")
+    columns = compare_columns(metrics, range_names) if range_names else metrics
+    if sort_by is not None and sort_by not in columns:
+        raise ValueError(f"sort_by must be one of the requested metrics {columns}.")
+    top_n = _positive_int("top_n", top_n)
+    max_rows = _positive_int("max_rows", max_rows)
+    sort_by = sort_by or metrics[0]
+
+    if group_by:
+        unknown = [d for d in group_by if d not in dimensions]
+        if unknown:
+            raise ValueError(f"group_by dimensions {unknown} are not among the requested dimensions {dimensions}.")
+        summable = summable_metrics([d for d in dimensions if d not in group_by], additive, rollup_additive)
+        if range_names:
+            # Group within each date range; the ranges are compared afterwards
+            rows = group_rows(rows, dimensions + [RANGE_DIMENSION], metrics, list(group_by) + [RANGE_DIMENSION],
+                              summable, aggregate)
+        else:
+            rows = group_rows(rows, dimensions, metrics, group_by, summable, aggregate)
+        dimensions = list(group_by)
+
+    # "(other)" rows fold rows across every remaining dimension
+    foldable = summable_metrics(dimensions, additive, rollup_additive)
+    base_metrics = metrics
+    if range_names:
+        rows = compare_rows(rows, dimensions, metrics, range_names)
+        # Per-range values and deltas of summable metrics stay summable; percent changes do not
+        foldable = set(foldable) | {
+            column for m in metrics if m in foldable
+            for name in range_names[1:] for column in (f"{m}_{name}", f"{m}_delta_{name}")
+        }
+        metrics = columns
+
+    def collapse(rest):
+        row = _collapse(rest, dimensions, metrics, foldable, aggregate)
+        return _fill_pct_changes(row, base_metrics, range_names) if range_names else row
+
+    if top_n is not None and len(rows) > top_n:
+        ranked = sorted(rows, key=lambda r: _significance(r, sort_by), reverse=True)
+        rows = ranked[:top_n] + [collapse(ranked[top_n:])]
+    elif top_n is not None:
+        rows = sorted(rows, key=lambda r: _significance(r, sort_by), reverse=True)
+
+    if max_rows is not None and len(rows) > max_rows:
+        if max_rows == 1:
+            return [collapse(rows)]
+        ranked = sorted(range(len(rows)), key=lambda i: _significance(rows[i], sort_by), reverse=True)
+        keep = set(ranked[:max_rows - 1])
+        rest = [rows[i] for i in ranked[max_rows - 1:]]
+        rows = [row for i, row in enumerate(rows) if i in keep] + [collapse(rest)]
+    return rows
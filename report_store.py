@@ -0,0 +1,120 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from ga4_dates import settled_on
+
+
+class ReportStore:
+    """
+    SQLite-backed store of materialized GA4 report rows, partitioned per day.
+
+    Each report spec (property, dimensions, metrics, filter) gets a stable key;
+    rows are stored per (spec key, day) together with the time they were fetched,
+    so a refresh only has to go back to GA4 for days that are missing or were
+    fetched while GA4 was still finalizing them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_specs ("
+                " spec_key TEXT PRIMARY KEY, spec TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_partitions ("
+                " spec_key TEXT NOT NULL, day TEXT NOT NULL, rows TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL, PRIMARY KEY (spec_key, day))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def spec_key(spec):
+        """Stable key for a report spec dictionary"""
+        canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def fetched_days(self, spec_key, start_date, end_date):
+        """Map of stored day -> fetch time (epoch seconds) within the range"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "SELECT day, fetched_at FROM report_partitions"
+                " WHERE spec_key = ? AND day BETWEEN ? AND ?",
+                (spec_key, start_date.isoformat(), end_date.isoformat())
+            )
+            return {date.fromisoformat(day): fetched_at for day, fetched_at in cursor}
+
+    def plan_refresh(self, spec_key, start_date, end_date, settling_days):
+        """
+        Work out which days of a range still have to be fetched from GA4.
+
+        A day needs fetching when it has never been stored, or when it was last
+        fetched less than `settling_days` full days after it ended (GA4 may still
+        have been processing late hits at that point; see ga4_dates.settled_on).
+
+        Returns:
+            List of (start, end) date tuples covering consecutive days to fetch.
+        """
+        fetched = self.fetched_days(spec_key, start_date, end_date)
+        ranges = []
+        day = start_date
+        while day <= end_date:
+            fetched_at = fetched.get(day)
+            settled = (
+                fetched_at is not None
+                and datetime.fromtimestamp(fetched_at).date() >= settled_on(day, settling_days)
+            )
+            if not settled:
+                if ranges and ranges[-1][1] == day - timedelta(days=1):
+                    ranges[-1] = (ranges[-1][0], day)
+                else:
+                    ranges.append((day, day))
+            day += timedelta(days=1)
+        return ranges
+
+    def save(self, spec_key, spec, day_rows, fetched_at=None):
+        """Store the rows of each day in `day_rows` (date -> list of row dicts)"""
+        fetched_at = fetched_at or time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO report_specs (spec_key, spec, created_at) VALUES (?, ?, ?)",
+                (spec_key, json.dumps(spec, sort_keys=True), fetched_at)
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO report_partitions (spec_key, day, rows, fetched_at)"
+                " VALUES (?, ?, ?, ?)",
+                [(spec_key, day.isoformat(), json.dumps(rows), fetched_at) for day, rows in day_rows.items()]
+            )
+
+    def load(self, spec_key, start_date, end_date):
+        """Return the stored rows for the range in chronological order"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "SELECT rows FROM report_partitions"
+                " WHERE spec_key = ? AND day BETWEEN ? AND ? ORDER BY day",
+                (spec_key, start_date.isoformat(), end_date.isoformat())
+            )
+            return [row for (rows,) in cursor for row in json.loads(rows)]
+
+    def invalidate(self, start=None, end=None):
+        """
+        Delete the stored days from start to end (YYYY-MM-DD strings, either
+        side open) of every report, or all stored days when neither is given,
+        so the next refresh fetches them again.
+
+        Returns:
+            Number of deleted (report, day) partitions.
+        """
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM report_partitions WHERE day >= ? AND day <= ?",
+                (start or "0000-00-00", end or "9999-99-99")
+            )
+            return cursor.rowcount
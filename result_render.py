@@ -0,0 +1,146 @@
+import json
+import os
+
+# Text form of MCP tool results: json (indented, the original output), tsv or markdown
+MCP_RESULT_FORMAT = os.getenv("MCP_RESULT_FORMAT", "json").lower()
+# Decimal places kept for fractional metric values in tsv/markdown (-1 keeps them as returned);
+# dimension values are never rounded
+MCP_RESULT_PRECISION = int(os.getenv("MCP_RESULT_PRECISION", "2"))
+# Maximum characters of MCP result text; longer tables are truncated with a summary line (0 disables)
+MCP_RESULT_MAX_CHARS = int(os.getenv("MCP_RESULT_MAX_CHARS", "0"))
+
+FORMATS = ("json", "tsv", "markdown")
+
+
+def _is_table(value):
+    return isinstance(value, list) and bool(value) and all(isinstance(row, dict) for row in value)
+
+
+def _round(value, precision):
+    """Round fractional numeric strings to `precision` decimals; everything else is left alone"""
+    if precision < 0 or not isinstance(value, str) or "." not in value:
+        return value
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    text = f"{number:.{precision}f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _cell(value, precision, fmt):
+    if value is None:
+        return ""
+    text = _round(value, precision) if isinstance(value, str) else str(value)
+    text = text.replace("\t", " ").replace("\r", " ").replace("\n", " ")
+    return text.replace("|", "\\|") if fmt == "markdown" else text
+
+
+def _line(cells, fmt):
+    if fmt == "markdown":
+        return "| " + " | ".join(cells) + " |"
+    return "\t".join(cells)
+
+
+def _header(columns, fmt):
+    lines = [_line([_cell(c, -1, fmt) for c in columns], fmt)]
+    if fmt == "markdown":
+        lines.append(_line(["---"] * len(columns), fmt))
+    return lines
+
+
+def _columns(rows):
+    columns = {}
+    for row in rows:
+        columns.update(dict.fromkeys(row))
+    return list(columns)
+
+
+def _is_metric_column(column, metrics):
+    """True for a metric and the columns derived from it (e.g. sessions_previous, sessions_delta_previous)"""
+    return column in metrics or any(column.startswith(m + "_") for m in metrics)
+
+
+def _truncation_note(shown, total):
+    return (f"[truncated: showing {shown} of {total} rows; narrow the query or use "
+            f"group_by, top_n or max_rows to summarize]")
+
+
+def render_table(rows, fmt, precision=MCP_RESULT_PRECISION, max_chars=MCP_RESULT_MAX_CHARS, metrics=()):
+    """
+    Render a list of row dictionaries as a TSV or markdown table with one header line.
+
+    Only the columns of `metrics` are rounded; dimension values such as app
+    versions ("1.10") are shown as returned. When max_chars > 0 rows are
+    dropped from the end to fit, and a line saying how many were shown
+    replaces them.
+    """
+    columns = _columns(rows)
+    precisions = [precision if _is_metric_column(c, metrics) else -1 for c in columns]
+    lines = _header(columns, fmt)
+    size = sum(len(line) + 1 for line in lines)
+    for i, row in enumerate(rows):
+        line = _line([_cell(row.get(c), p, fmt) for c, p in zip(columns, precisions)], fmt)
+        if max_chars > 0 and size + len(line) + 1 > max_chars - len(_truncation_note(i, len(rows))):
+            lines.append(_truncation_note(i, len(rows)))
+            break
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def _render_json(result, max_chars):
+    text = json.dumps(result, indent=2)
+    if max_chars <= 0 or len(text) <= max_chars or not _is_table(result):
+        return text
+
+    def truncated(shown):
+        return json.dumps({"data": result[:shown], "truncated": _truncation_note(shown, len(result))}, indent=2)
+
+    # Halve the rows until the document fits, then add back while it still does
+    shown = len(result)
+    while shown and len(truncated(shown)) > max_chars:
+        shown //= 2
+    step = max(shown // 2, 1)
+    while step and shown < len(result):
+        if len(truncated(shown + step)) <= max_chars:
+            shown += step
+        else:
+            step //= 2
+    return truncated(shown)
+
+
+def render_result(result, fmt=None, precision=None, max_chars=None, metrics=()):
+    """
+    Text for an MCP tool result.
+
+    Tables (lists of row dictionaries, also inside a stale {"data": [...]}
+    result) are rendered in `fmt`; anything else, such as error dictionaries
+    or category listings, stays JSON.
+
+    Args:
+        result: The tool's return value.
+        fmt: 'json', 'tsv' or 'markdown' (default MCP_RESULT_FORMAT).
+        precision: Decimal places for fractional metric values (default MCP_RESULT_PRECISION).
+        max_chars: Character budget, 0 for none (default MCP_RESULT_MAX_CHARS).
+        metrics: Metric names of the report; only their columns are rounded.
+    """
+    fmt = (fmt or MCP_RESULT_FORMAT).lower()
+    precision = MCP_RESULT_PRECISION if precision is None else precision
+    max_chars = MCP_RESULT_MAX_CHARS if max_chars is None else max_chars
+    if fmt not in FORMATS:
+        raise ValueError(f"Result format must be one of {list(FORMATS)}, got {fmt!r}")
+    if fmt == "json":
+        return _render_json(result, max_chars)
+
+    if _is_table(result):
+        return render_table(result, fmt, precision, max_chars, metrics)
+    if isinstance(result, dict) and _is_table(result.get("data")):
+        # Stale result: metadata first, then the table
+        meta = {k: v for k, v in result.items() if k != "data"}
+        note = json.dumps(meta, separators=(",", ":"))
+        budget = max(max_chars - len(note) - 1, 1) if max_chars > 0 else 0
+        return note + "\n" + render_table(result["data"], fmt, precision, budget, metrics)
+    if result == []:
+        return "(no rows)"
+    return json.dumps(result, separators=(",", ":"))
@@ -0,0 +1,261 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 250000)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+    type_name = "counter"
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for labels, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    type_name = "gauge"
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+    render = Counter.render
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; observe() is a bisect and a few additions"""
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for labels, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    label_str = _format_labels(self.labelnames, labels, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{label_str} {cumulative}")
+                label_str = _format_labels(self.labelnames, labels)
+                lines.append(f"{self.name}_sum{label_str} {_format_value(total)}")
+                lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Collection of metrics rendered in the Prometheus text format.
+
+    Collectors are callables run at scrape time that return extra exposition
+    lines, so values that already exist elsewhere (cache counters) cost nothing
+    on the request path.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+TOOL_LATENCY = REGISTRY.register(Histogram(
+    "ga4_mcp_tool_duration_seconds", "MCP tool call latency by tool name", ["tool"]))
+RUN_REPORT_LATENCY = REGISTRY.register(Histogram(
+    "ga4_run_report_duration_seconds", "Upstream GA4 run_report RPC latency"))
+RUN_REPORT_ERRORS = REGISTRY.register(Counter(
+    "ga4_run_report_errors_total", "Upstream GA4 run_report RPC failures"))
+REPORT_ROWS = REGISTRY.register(Histogram(
+    "ga4_run_report_rows", "Rows returned per GA4 run_report RPC", buckets=ROW_BUCKETS))
+SERIALIZATION_LATENCY = REGISTRY.register(Histogram(
+    "ga4_serialization_duration_seconds", "Time spent serializing tool results", ["transport"]))
+PAYLOAD_BYTES = REGISTRY.register(Histogram(
+    "ga4_response_payload_bytes", "Size of serialized tool results", ["transport"], buckets=BYTE_BUCKETS))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "ga4_http_requests_in_flight", "HTTP requests currently being handled"))
+ADMISSION_WAIT = REGISTRY.register(Histogram(
+    "ga4_admission_wait_seconds", "Time tool calls waited for an admission slot", ["lane"]))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "ga4_admission_rejected_total", "Tool calls rejected with 429 by lane and reason", ["lane", "reason"]))
+MERGED_REPORTS = REGISTRY.register(Counter(
+    "ga4_run_report_merged_total", "Report calls answered by another concurrent call's widened report"))
+CACHE_DERIVED = REGISTRY.register(Counter(
+    "ga4_cache_derived_total", "get_ga4_data requests computed from a cached finer-grained report"))
+HEDGED_CALLS = REGISTRY.register(Counter(
+    "ga4_run_report_hedges_total", "Hedged run_report calls by outcome (won, lost, failed, no_budget)", ["result"]))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "ga4_circuit_state", "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)", ["circuit"]))
+CIRCUIT_TRANSITIONS = REGISTRY.register(Counter(
+    "ga4_circuit_transitions_total", "Upstream circuit breaker state changes by new state", ["circuit", "state"]))
+TOKEN_REFRESHES = REGISTRY.register(Counter(
+    "ga4_credentials_refresh_total", "Background access token refreshes by result", ["result"]))
+
+
+def register_cache_collector(cache):
+    """Expose a ReportCache's hit/miss counters and hit ratio at scrape time"""
+    def collect():
+        stats = cache.stats()
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        ratio = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        return [
+            "# HELP ga4_cache_lookups_total Report cache lookups by result",
+            "# TYPE ga4_cache_lookups_total counter",
+            f'ga4_cache_lookups_total{{result="hit"}} {stats["hits"]}',
+            f'ga4_cache_lookups_total{{result="stale"}} {stats["stale_hits"]}',
+            f'ga4_cache_lookups_total{{result="miss"}} {stats["misses"]}',
+            "# HELP ga4_cache_hit_ratio Share of report cache lookups served from cache",
+            "# TYPE ga4_cache_hit_ratio gauge",
+            f"ga4_cache_hit_ratio {_format_value(ratio)}",
+            "# HELP ga4_cache_entries Report cache entries",
+            "# TYPE ga4_cache_entries gauge",
+            f'ga4_cache_entries {stats["entries"]}',
+        ]
+    REGISTRY.add_collector(collect)
+
+
+def serialize(result, transport, dumps):
+    """
+    Serialize a tool result with `dumps`, recording serialization time and payload size.
+
+    Returns:
+        (text, size of the text in bytes once UTF-8 encoded, as sent)
+    """
+    started = time.perf_counter()
+    text = dumps(result)
+    SERIALIZATION_LATENCY.observe(time.perf_counter() - started, (transport,))
+    size = len(text.encode("utf-8"))
+    PAYLOAD_BYTES.observe(size, (transport,))
+    return text, size
+
+
+def register_admission_collector(controller):
+    """Expose running and queued tool calls of an AdmissionController at scrape time"""
+    def collect():
+        stats = controller.stats()
+        lines = [
+            "# HELP ga4_admission_active_calls Tool calls holding an admission slot",
+            "# TYPE ga4_admission_active_calls gauge",
+            f"ga4_admission_active_calls {stats['active']}",
+            "# HELP ga4_admission_queued_calls Tool calls waiting for an admission slot by lane",
+            "# TYPE ga4_admission_queued_calls gauge",
+        ]
+        lines.extend(f'ga4_admission_queued_calls{{lane="{lane}"}} {count}' for lane, count in stats["queued"].items())
+        return lines
+    REGISTRY.add_collector(collect)
+
+
+def register_token_collector(get_refresher):
+    """Expose the age and remaining lifetime of the current access token at scrape time"""
+    def collect():
+        refresher = get_refresher()
+        age = refresher.token_age() if refresher is not None else None
+        expires_in = refresher.expires_in() if refresher is not None else None
+        if age is None or expires_in is None:
+            return []
+        return [
+            "# HELP ga4_credentials_token_age_seconds Seconds since the GA4 access token was fetched",
+            "# TYPE ga4_credentials_token_age_seconds gauge",
+            f"ga4_credentials_token_age_seconds {_format_value(round(age, 3))}",
+            "# HELP ga4_credentials_token_expires_in_seconds Seconds until the GA4 access token expires",
+            "# TYPE ga4_credentials_token_expires_in_seconds gauge",
+            f"ga4_credentials_token_expires_in_seconds {_format_value(round(expires_in, 3))}",
+        ]
+    REGISTRY.add_collector(collect)
+
+
+class InFlightMiddleware:
+    """ASGI middleware counting in-flight HTTP requests, including streamed bodies"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            HTTP_IN_FLIGHT.dec()
@@ -0,0 +1,70 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# ga4_mcp_server reads its configuration at import time
+os.environ.setdefault("GA4_PROPERTY_ID", "123456789")
+for name in ("GA4_PROJECT_ID", "GA4_PRIVATE_KEY_ID", "GA4_PRIVATE_KEY", "GA4_CLIENT_EMAIL", "GA4_CLIENT_ID"):
+    os.environ.setdefault(name, "test")
+
+
+class FakeGA4Client:
+    """
+    Stands in for BetaAnalyticsDataClient. run_report answers from `rows`
+    (dicts of dimension and metric values, plus an optional "dateRange"),
+    keeping the requested columns, date range names and page, or raises
+    `error` when it is set.
+    """
+
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.error = None
+        self.requests = []
+
+    def run_report(self, request):
+        self.requests.append(request)
+        if self.error is not None:
+            raise self.error
+        dimensions = [d.name for d in request.dimensions]
+        metrics = [m.name for m in request.metrics]
+        names = [r.name for r in request.date_ranges if r.name]
+        if len(names) > 1:
+            dimensions.append("dateRange")
+        rows = [row for row in self.rows if len(names) < 2 or row.get("dateRange") in names]
+        total = len(rows)
+        if request.limit:
+            rows = rows[request.offset:request.offset + request.limit]
+        return SimpleNamespace(
+            rows=[SimpleNamespace(
+                dimension_values=[SimpleNamespace(value=row.get(d, "")) for d in dimensions],
+                metric_values=[SimpleNamespace(value=row.get(m, "0")) for m in metrics]
+            ) for row in rows],
+            dimension_headers=[SimpleNamespace(name=d) for d in dimensions],
+            metric_headers=[SimpleNamespace(name=m) for m in metrics],
+            row_count=total
+        )
+
+
+@pytest.fixture
+def ga4(monkeypatch, tmp_path):
+    """
+    ga4_mcp_server wired to a single FakeGA4Client, with an empty cache, an
+    empty report store and a closed circuit
+    """
+    import ga4_mcp_server
+    from circuit_breaker import CircuitBreaker
+    from report_cache import ReportCache
+
+    ga4_mcp_server._import_ga4()
+    client = FakeGA4Client()
+    monkeypatch.setattr(ga4_mcp_server, "client_pool", [client])
+    monkeypatch.setattr(ga4_mcp_server, "report_cache", ReportCache(300, 64, stale_if_error=86400))
+    monkeypatch.setattr(ga4_mcp_server, "ga4_breaker", CircuitBreaker("test", 5, 60))
+    monkeypatch.setattr(ga4_mcp_server, "GA4_STORE_PATH", str(tmp_path / "store.sqlite3"))
+    monkeypatch.setattr(ga4_mcp_server, "report_store", None)
+    ga4_mcp_server.client = client
+    return ga4_mcp_server
@@ -0,0 +1,85 @@
+import asyncio
+import base64
+
+import pytest
+
+import admission
+from admission import AdmissionController, AdmissionMiddleware, request_client
+
+VALID = (admission.API_USERNAME, admission.API_PASSWORD)
+
+
+def basic(username, password):
+    return b"Basic " + base64.b64encode(f"{username}:{password}".encode())
+
+
+def identify(path, headers=(), client=("10.0.0.7", 5000)):
+    """(client, lane) AdmissionMiddleware records for a request"""
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen["client"] = request_client.get()
+
+    scope = {"type": "http", "path": path, "headers": list(headers), "client": client}
+    asyncio.run(AdmissionMiddleware(app)(scope, None, None))
+    return seen["client"]
+
+
+def test_authenticated_caller_is_identified_by_user():
+    assert identify("/stream", [(b"authorization", basic(*VALID))]) == ("user:" + VALID[0], "interactive")
+
+
+@pytest.mark.parametrize("headers", [
+    [(b"authorization", basic("someone-else", "guess"))],
+    [(b"authorization", basic(VALID[0], "wrong"))],
+    [(b"x-api-key", b"made-up")],
+    [(b"authorization", b"Bearer made-up")],
+])
+def test_unverified_identities_fall_back_to_the_address(headers):
+    assert identify("/stream", headers)[0] == "ip:10.0.0.7"
+
+
+def test_lane_follows_the_route():
+    assert identify("/data")[1] == "batch"
+    assert identify("/api/data")[1] == "batch"
+    assert identify("/mcp")[1] == "interactive"
+
+
+def test_priority_header_needs_credentials():
+    assert identify("/data", [(b"x-priority", b"interactive")])[1] == "batch"
+    assert identify("/data", [(b"x-priority", b"interactive"), (b"authorization", basic(*VALID))])[1] == "interactive"
+
+
+def test_fair_queuing_serves_the_heavier_lane_first():
+    controller = AdmissionController(1, 1, 10, 5, {"interactive": 4, "batch": 1})
+    order = []
+
+    async def call(client, lane):
+        async with controller.slot(client, lane):
+            order.append(lane)
+            await asyncio.sleep(0)
+
+    async def run():
+        async with controller.slot("holder", "batch"):
+            tasks = [asyncio.ensure_future(call("a", "batch")) for _ in range(2)]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.ensure_future(call("b", "interactive")))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order[0] == "interactive"
+
+
+def test_full_queue_is_rejected():
+    controller = AdmissionController(1, 1, 1, 5, {"interactive": 1, "batch": 1})
+
+    async def run():
+        async with controller.slot("a", "batch"):
+            waiting = asyncio.ensure_future(controller.acquire("b", "batch"))
+            await asyncio.sleep(0)
+            with pytest.raises(admission.Overloaded):
+                await controller.acquire("c", "batch")
+            waiting.cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import mcp_dispatch
+import mcp_http_bridge
+import mcp_http_streamable
+from mcp_dispatch import INVALID_REQUEST, METHOD_NOT_FOUND
+
+AUTH = (mcp_http_bridge.API_USERNAME, mcp_http_bridge.API_PASSWORD)
+
+
+@pytest.fixture(params=[mcp_http_bridge.app, mcp_http_streamable.app], ids=["bridge", "streamable"])
+def client(request):
+    return TestClient(request.param)
+
+
+def post(client, body):
+    return client.post("/mcp", json=body, auth=AUTH)
+
+
+def report_call(request_id, metric):
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": {
+        "name": "get_ga4_data",
+        "arguments": {"dimensions": ["country"], "metrics": [metric],
+                      "date_range_start": "2024-01-01", "date_range_end": "2024-01-07"}
+    }}
+
+
+def test_mixed_batch_answers_each_request(client):
+    response = post(client, [
+        {"jsonrpc": "2.0", "id": 1, "method": "ping"},
+        {"jsonrpc": "2.0", "id": 2},
+        {"jsonrpc": "2.0", "id": 3, "method": "no/such/method"},
+        {"jsonrpc": "2.0", "method": "notifications/initialized"},
+    ])
+    assert response.status_code == 200
+    by_id = {r["id"]: r for r in response.json()}
+    assert set(by_id) == {1, 2, 3}
+    assert by_id[1]["result"] == {}
+    assert by_id[2]["error"]["code"] == INVALID_REQUEST
+    assert by_id[3]["error"]["code"] == METHOD_NOT_FOUND
+
+
+def test_non_object_members_get_their_own_invalid_request_errors(client):
+    response = post(client, [1, 2])
+    assert response.status_code == 200
+    assert [(r["id"], r["error"]["code"]) for r in response.json()] == [(None, INVALID_REQUEST)] * 2
+
+
+def test_empty_batch_gets_one_invalid_request_error(client):
+    response = post(client, [])
+    assert response.status_code == 200
+    body = response.json()
+    assert isinstance(body, dict)
+    assert body["error"]["code"] == INVALID_REQUEST
+
+
+def test_oversized_batch_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(mcp_dispatch, "MCP_MAX_BATCH_SIZE", 2)
+    body = post(client, [{"jsonrpc": "2.0", "id": i, "method": "ping"} for i in range(3)]).json()
+    assert body["error"]["code"] == INVALID_REQUEST
+    assert "MCP_MAX_BATCH_SIZE=2" in body["error"]["message"]
+
+
+def test_batch_requests_run_concurrently(client, ga4):
+    # Each report waits for the other; run one after the other, both would time out
+    barrier = threading.Barrier(2, timeout=5)
+    run_report = ga4.client.run_report
+
+    def waiting_run_report(request):
+        barrier.wait()
+        return run_report(request)
+
+    ga4.client.run_report = waiting_run_report
+    ga4.client.rows = [{"country": "US", "sessions": "1", "screenPageViews": "2"}]
+    responses = post(client, [report_call(1, "sessions"), report_call(2, "screenPageViews")]).json()
+    assert [r["id"] for r in responses] == [1, 2]
+    assert all("result" in r and "error" not in r["result"]["content"][0]["text"] for r in responses)
@@ -0,0 +1,31 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import mcp_http_streamable
+
+AUTH = (mcp_http_streamable.API_USERNAME, mcp_http_streamable.API_PASSWORD)
+WARM_QUERY = {"name": "daily", "query": {"dimensions": ["date"], "metrics": ["sessions"]}}
+
+
+@pytest.fixture
+def client(ga4):
+    return TestClient(mcp_http_streamable.app)
+
+
+@pytest.mark.parametrize("method, path, body", [
+    ("get", "/warm", None),
+    ("post", "/warm", WARM_QUERY),
+    ("delete", "/warm/daily", None),
+    ("post", "/cache/invalidate", {}),
+])
+@pytest.mark.parametrize("auth", [None, ("admin", "wrong"), ("intruder", AUTH[1])])
+def test_cache_endpoints_require_credentials(client, method, path, body, auth):
+    kwargs = {"json": body} if body is not None else {}
+    response = getattr(client, method)(path, auth=auth, **kwargs) if auth else getattr(client, method)(path, **kwargs)
+    assert response.status_code == 401
+
+
+def test_cache_endpoints_accept_credentials(client):
+    assert client.post("/cache/invalidate", json={}, auth=AUTH).status_code == 200
+    assert client.post("/warm", json=WARM_QUERY, auth=AUTH).status_code == 200
+    assert client.delete("/warm/daily", auth=AUTH).status_code == 200
@@ -0,0 +1,99 @@
+import pytest
+from google.api_core.exceptions import InvalidArgument, ServiceUnavailable
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, is_upstream_failure
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def open_breaker(clock, probes=1):
+    breaker = CircuitBreaker("test", 3, 30, probes, clock=clock)
+    for _ in range(3):
+        breaker.record_failure(ServiceUnavailable("down"), breaker.before_call())
+    return breaker
+
+
+def test_opens_after_consecutive_upstream_failures(clock):
+    breaker = CircuitBreaker("test", 3, 30, clock=clock)
+    for _ in range(2):
+        breaker.record_failure(ServiceUnavailable("down"), breaker.before_call())
+    assert breaker.state == CLOSED
+    breaker.record_success(breaker.before_call())
+    assert breaker.failures == 0
+    for _ in range(3):
+        breaker.record_failure(ServiceUnavailable("down"), breaker.before_call())
+    assert breaker.state == OPEN
+
+
+def test_fails_fast_while_open(clock):
+    breaker = open_breaker(clock)
+    clock.now += 29
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after == pytest.approx(1)
+    assert breaker.snapshot()["retryAfter"] == 1
+
+
+@pytest.mark.parametrize("probes", [1, 2])
+def test_half_open_admits_limited_probes(clock, probes):
+    breaker = open_breaker(clock, probes)
+    clock.now += 30
+    assert [breaker.before_call() for _ in range(probes)] == [True] * probes
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_successful_probe_closes_the_circuit(clock):
+    breaker = open_breaker(clock)
+    clock.now += 30
+    breaker.record_success(breaker.before_call())
+    assert breaker.state == CLOSED
+    assert breaker.before_call() is False
+
+
+def test_failed_probe_reopens_the_circuit(clock):
+    breaker = open_breaker(clock)
+    clock.now += 30
+    breaker.record_failure(ServiceUnavailable("still down"), breaker.before_call())
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_request_errors_do_not_trip_the_breaker(clock):
+    assert not is_upstream_failure(InvalidArgument("bad dimension"))
+    assert is_upstream_failure(ServiceUnavailable("down"))
+    assert is_upstream_failure(TimeoutError())
+    breaker = CircuitBreaker("test", 1, 30, clock=clock)
+    breaker.record_failure(InvalidArgument("bad dimension"), breaker.before_call())
+    assert breaker.state == CLOSED
+
+
+def test_report_is_served_stale_while_the_circuit_is_open(ga4, monkeypatch, clock):
+    monkeypatch.setattr(ga4, "ga4_breaker", CircuitBreaker("test", 1, 30, clock=clock))
+    rows = [{"country": "US", "sessions": "10"}]
+    ga4.client.rows = rows
+    assert ga4.run_ga4_report("country", "sessions", "yesterday", "yesterday") == rows
+
+    ga4.client.error = ServiceUnavailable("down")
+    assert ga4.run_ga4_report("country", "sessions", "yesterday", "yesterday", refresh=True)["stale"] is True
+    assert ga4.ga4_breaker.state == OPEN
+
+    requests = len(ga4.client.requests)
+    result = ga4.run_ga4_report("country", "sessions", "yesterday", "yesterday", refresh=True)
+    assert result["data"] == rows
+    assert result["stale"] is True
+    assert "circuit open" in result["staleReason"]
+    assert len(ga4.client.requests) == requests
@@ -0,0 +1,88 @@
+from fastapi.testclient import TestClient
+
+from report_postprocess import compare_columns, compare_rows
+
+RANGES = ["current", "previous"]
+
+
+def compare(rows, metrics=("sessions",), range_names=RANGES):
+    return compare_rows(rows, ["country"], list(metrics), range_names)
+
+
+def test_deltas_and_percent_changes_against_the_other_range():
+    rows = compare([
+        {"country": "US", "dateRange": "current", "sessions": "120"},
+        {"country": "US", "dateRange": "previous", "sessions": "100"},
+    ])
+    assert rows == [{
+        "country": "US", "sessions": "120", "sessions_previous": "100",
+        "sessions_delta_previous": "20", "sessions_pct_change_previous": "20"
+    }]
+
+
+def test_fractional_percent_changes_are_rounded():
+    rows = compare([
+        {"country": "US", "dateRange": "current", "sessions": "2"},
+        {"country": "US", "dateRange": "previous", "sessions": "3"},
+    ])
+    assert rows[0]["sessions_delta_previous"] == "-1"
+    assert rows[0]["sessions_pct_change_previous"] == "-33.33"
+
+
+def test_missing_range_counts_as_zero():
+    rows = compare([
+        {"country": "NL", "dateRange": "previous", "sessions": "8"},
+        {"country": "DE", "dateRange": "current", "sessions": "5"},
+    ])
+    assert rows == [
+        {"country": "NL", "sessions": "0", "sessions_previous": "8",
+         "sessions_delta_previous": "-8", "sessions_pct_change_previous": "-100"},
+        {"country": "DE", "sessions": "5", "sessions_previous": "0",
+         "sessions_delta_previous": "5", "sessions_pct_change_previous": None},
+    ]
+
+
+def test_percent_change_from_zero_is_none():
+    rows = compare([
+        {"country": "US", "dateRange": "current", "sessions": "4"},
+        {"country": "US", "dateRange": "previous", "sessions": "0"},
+    ])
+    assert rows[0]["sessions_pct_change_previous"] is None
+
+
+def test_every_other_range_is_compared_with_the_first():
+    names = ["current", "period_1", "period_2"]
+    rows = compare([
+        {"country": "US", "dateRange": "current", "sessions": "10"},
+        {"country": "US", "dateRange": "period_1", "sessions": "5"},
+        {"country": "US", "dateRange": "period_2", "sessions": "20"},
+    ], range_names=names)
+    assert list(rows[0]) == ["country"] + compare_columns(["sessions"], names)
+    assert rows[0]["sessions_delta_period_1"] == "5"
+    assert rows[0]["sessions_pct_change_period_2"] == "-50"
+
+
+def test_rest_api_lists_the_comparison_columns_of_default_named_ranges(ga4):
+    import ga4_http_server
+
+    ga4.client.rows = [
+        {"country": "US", "dateRange": "current", "sessions": "12"},
+        {"country": "US", "dateRange": "previous", "sessions": "10"},
+    ]
+    response = TestClient(ga4_http_server.app).post("/data", auth=(
+        ga4_http_server.API_USERNAME, ga4_http_server.API_PASSWORD
+    ), json={
+        "dimensions": ["country"],
+        "metrics": ["sessions"],
+        "date_ranges": [
+            {"start_date": "2024-02-01", "end_date": "2024-02-07"},
+            {"start_date": "2024-01-25", "end_date": "2024-01-31"},
+        ],
+    })
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["metrics"] == [
+        "sessions", "sessions_previous", "sessions_delta_previous", "sessions_pct_change_previous"
+    ]
+    assert set(body["data"][0]) == {"country", *body["metrics"]}
+
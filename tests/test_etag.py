@@ -0,0 +1,60 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import mcp_http_bridge
+import mcp_http_streamable
+from mcp_sessions import SESSION_HEADER, sessions
+
+AUTH = ("admin", "changeme")
+ENDPOINTS = [(mcp_http_bridge.app, "/mcp"), (mcp_http_streamable.app, "/mcp"), (mcp_http_streamable.app, "/stream")]
+
+
+def rpc(method, request_id=1):
+    return {"jsonrpc": "2.0", "method": method, "id": request_id}
+
+
+@pytest.fixture(autouse=True)
+def credentials(monkeypatch):
+    for module in (mcp_http_bridge, mcp_http_streamable):
+        monkeypatch.setattr(module, "API_USERNAME", AUTH[0])
+        monkeypatch.setattr(module, "API_PASSWORD", AUTH[1])
+
+
+@pytest.mark.parametrize("app, path", ENDPOINTS)
+@pytest.mark.parametrize("method", ["initialize", "tools/list"])
+def test_etag_is_stable_and_answers_304(app, path, method):
+    client = TestClient(app)
+    first = client.post(path, json=rpc(method, 1), auth=AUTH)
+    second = client.post(path, json=rpc(method, 2), auth=AUTH)
+    assert first.status_code == second.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag and second.headers["ETag"] == etag
+    assert first.json()["id"] == 1 and second.json()["id"] == 2
+
+    not_modified = client.post(path, json=rpc(method, 3), auth=AUTH, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+
+    changed = client.post(path, json=rpc(method, 4), auth=AUTH, headers={"If-None-Match": '"stale"'})
+    assert changed.status_code == 200
+
+
+def test_initialize_starts_a_session():
+    client = TestClient(mcp_http_streamable.app)
+    response = client.post("/stream", json=rpc("initialize"), auth=AUTH)
+    session_id = response.headers[SESSION_HEADER]
+    assert sessions.get(session_id) is not None
+    sessions.close(session_id)
+
+
+def test_conditional_initialize_starts_no_session(monkeypatch):
+    created = []
+    monkeypatch.setattr(sessions, "create", lambda params=None: created.append(params))
+    client = TestClient(mcp_http_streamable.app)
+    etag = client.post("/mcp", json=rpc("initialize"), auth=AUTH).headers["ETag"]
+
+    response = client.post("/stream", json=rpc("initialize"), auth=AUTH, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert SESSION_HEADER not in response.headers
+    assert created == []
@@ -0,0 +1,60 @@
+from datetime import date
+
+import pytest
+
+from ga4_dates import parse_date_ranges
+
+TODAY = date(2024, 3, 15)
+
+
+def test_two_ranges_default_to_current_and_previous():
+    parsed = parse_date_ranges([
+        {"start_date": "7daysAgo", "end_date": "yesterday"},
+        {"start_date": "14daysAgo", "end_date": "8daysAgo"},
+    ], today=TODAY)
+    assert parsed == [("2024-03-08", "2024-03-14", "current"), ("2024-03-01", "2024-03-07", "previous")]
+
+
+def test_more_ranges_default_to_numbered_periods():
+    ranges = [{"start_date": "2024-01-0%d" % i, "end_date": "2024-01-0%d" % i} for i in range(1, 5)]
+    assert [name for _, _, name in parse_date_ranges(ranges)] == ["current", "period_1", "period_2", "period_3"]
+
+
+@pytest.mark.parametrize("ranges", [
+    None,
+    [{"start_date": "yesterday", "end_date": "yesterday"}],
+    [{"start_date": "yesterday", "end_date": "yesterday"}] * 5,
+])
+def test_rejects_fewer_than_two_or_more_than_four_ranges(ranges):
+    with pytest.raises(ValueError, match="2 to 4"):
+        parse_date_ranges(ranges)
+
+
+def test_rejects_ranges_without_dates():
+    with pytest.raises(ValueError, match="start_date and an end_date"):
+        parse_date_ranges([{"start_date": "yesterday"}, {"start_date": "today", "end_date": "today"}])
+
+
+def test_rejects_inverted_ranges():
+    with pytest.raises(ValueError, match="is after"):
+        parse_date_ranges([
+            {"start_date": "yesterday", "end_date": "7daysAgo"},
+            {"start_date": "today", "end_date": "today"},
+        ])
+
+
+@pytest.mark.parametrize("name", ["1st", "last week", "date_range_0", "RESERVED_x"])
+def test_rejects_invalid_names(name):
+    with pytest.raises(ValueError, match="Invalid date range name"):
+        parse_date_ranges([
+            {"start_date": "yesterday", "end_date": "yesterday", "name": name},
+            {"start_date": "today", "end_date": "today"},
+        ])
+
+
+def test_rejects_duplicate_names():
+    with pytest.raises(ValueError, match="unique"):
+        parse_date_ranges([
+            {"start_date": "yesterday", "end_date": "yesterday", "name": "previous"},
+            {"start_date": "today", "end_date": "today"},
+        ])
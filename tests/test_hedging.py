@@ -0,0 +1,141 @@
+import asyncio
+import threading
+
+import pytest
+
+import server_metrics
+from admission import request_client
+from hedging import HedgePolicy, hedge_allowed
+from mcp_dispatch import Tool, ToolRegistry
+from warm_queries import WarmQueryRegistry
+
+
+class FakeClient:
+    """Answers `name`, recording the calling thread; blocks until `release` is set when slow"""
+
+    def __init__(self, name, slow=False):
+        self.name = name
+        self.release = threading.Event()
+        if not slow:
+            self.release.set()
+        self.calls = 0
+        self.threads = []
+        self.finished = threading.Event()
+
+    def run(self):
+        self.calls += 1
+        self.threads.append(threading.current_thread())
+        assert self.release.wait(5)
+        self.finished.set()
+        return self.name
+
+
+def run(client):
+    return client.run()
+
+
+def hedges(result):
+    return server_metrics.HEDGED_CALLS._values.get((result,), 0)
+
+
+@pytest.fixture
+def interactive():
+    token = hedge_allowed.set(True)
+    yield
+    hedge_allowed.reset(token)
+
+
+def policy(budget=100, min_samples=5, min_delay=0.01):
+    hedge_policy = HedgePolicy(percentile=50, budget=budget, min_samples=min_samples, min_delay=min_delay)
+    for _ in range(min_samples):
+        hedge_policy.latency.observe(0.01)
+    return hedge_policy
+
+
+def test_first_answer_wins_and_the_loser_is_discarded(interactive):
+    primary, other = FakeClient("primary", slow=True), FakeClient("other")
+    won = hedges("won")
+    assert policy().call(run, primary, lambda: other) == "other"
+    assert hedges("won") == won + 1
+
+    primary.release.set()
+    assert primary.finished.wait(5)
+    assert primary.calls == 1
+
+
+def test_fast_calls_are_not_hedged(interactive):
+    primary = FakeClient("primary")
+    alternates = []
+    assert policy(min_delay=5).call(run, primary, lambda: alternates.append(1)) == "primary"
+    assert alternates == []
+    assert primary.threads != [threading.current_thread()]
+
+
+def test_no_hedging_before_min_samples(interactive):
+    hedge_policy = policy(min_samples=5)
+    hedge_policy.latency = type(hedge_policy.latency)()
+    for _ in range(4):
+        hedge_policy.latency.observe(0.01)
+    primary = FakeClient("primary")
+
+    assert hedge_policy.delay() is None
+    assert hedge_policy.call(run, primary, lambda: FakeClient("other")) == "primary"
+    # Unhedged calls run directly on the calling thread
+    assert primary.threads == [threading.current_thread()]
+
+
+def test_hedges_stay_within_the_budget(interactive):
+    hedge_policy = policy(budget=50)
+    no_budget, spent = hedges("no_budget"), hedges("won") + hedges("lost")
+    for _ in range(4):
+        primary, other = FakeClient("primary", slow=True), FakeClient("other")
+
+        def alternate():
+            # Let the primary finish too, so calls that may not hedge return
+            primary.release.set()
+            return other
+
+        hedge_policy.call(run, primary, alternate)
+    # Every call earns half a token: calls 2 and 4 may hedge, 1 and 3 may not
+    assert hedges("no_budget") - no_budget == 2
+    assert hedges("won") + hedges("lost") - spent == 2
+
+
+def test_calls_outside_interactive_contexts_are_not_hedged():
+    primary = FakeClient("primary")
+    assert hedge_allowed.get() is False
+    assert policy().call(run, primary, lambda: FakeClient("other")) == "primary"
+    assert primary.threads == [threading.current_thread()]
+
+
+@pytest.mark.parametrize("lane, allowed", [("interactive", True), ("batch", False)])
+def test_only_interactive_tool_calls_may_hedge(lane, allowed):
+    registry = ToolRegistry(None)
+    registry._tools = {"probe": Tool("probe", hedge_allowed.get, "", {"properties": {}, "required": []})}
+
+    async def call():
+        token = request_client.set(("test", lane))
+        try:
+            return await registry.call("probe")
+        finally:
+            request_client.reset(token)
+
+    assert asyncio.run(call()) is allowed
+
+
+def test_background_refreshes_may_not_hedge(ga4, interactive):
+    assert ga4.revalidation_executor.submit(hedge_allowed.get).result() is False
+
+    seen = []
+    done = threading.Event()
+
+    def refresh(**query):
+        seen.append(hedge_allowed.get())
+        done.set()
+        return []
+
+    warm = WarmQueryRegistry(refresh, lambda query: 3600, stagger=0)
+    warm.register({"dimensions": ["date"], "metrics": ["sessions"]})
+    warm.start()
+    assert done.wait(5)
+    assert seen == [False]
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from mcp_sessions import SESSION_HEADER, Session
+
+ROWS = [{"country": "US", "sessions": "10"}, {"country": "NL", "sessions": "4"}]
+
+
+def test_replay_after_last_event_id():
+    session = Session("s1", {})
+    for n in range(3):
+        session.publish({"jsonrpc": "2.0", "method": "notifications/message", "params": {"n": n}})
+    assert [event_id for event_id, _ in session.replay(1)] == [2, 3]
+    assert len(session.replay(None)) == 3
+
+
+@pytest.fixture
+def stream(ga4):
+    import mcp_http_streamable
+    ga4.client.rows = ROWS
+    client = TestClient(mcp_http_streamable.app)
+    response = client.post("/stream", json={"jsonrpc": "2.0", "method": "initialize", "params": {}, "id": 0})
+    return client, response.headers[SESSION_HEADER]
+
+
+def call(arguments, request_id=1, token=None):
+    params = {"name": "get_ga4_data", "arguments": arguments}
+    if token is not None:
+        params["_meta"] = {"progressToken": token}
+    return {"jsonrpc": "2.0", "method": "tools/call", "params": params, "id": request_id}
+
+
+ARGUMENTS = {"dimensions": ["country"], "metrics": ["sessions"],
+             "date_range_start": "2024-01-01", "date_range_end": "2024-01-07"}
+
+
+def session_events(session_id):
+    from mcp_sessions import sessions
+    return [message for _, message in sessions.get(session_id).replay(None)]
+
+
+def test_session_progress_goes_to_the_session_stream(stream):
+    client, session_id = stream
+    response = client.post("/stream", json=call(ARGUMENTS, token="t1"), headers={SESSION_HEADER: session_id})
+
+    assert response.status_code == 200
+    assert json.loads(response.text)["id"] == 1
+    progress = [m for m in session_events(session_id) if m["method"] == "notifications/progress"]
+    assert progress and progress[-1]["params"]["progressToken"] == "t1"
+    assert progress[-1]["params"]["progress"] == len(ROWS)
+
+
+def test_session_batch_progress_goes_to_the_session_stream(stream):
+    client, session_id = stream
+    batch = [call(ARGUMENTS, 1, "a"), call({**ARGUMENTS, "dimensions": ["city"]}, 2, "b")]
+    response = client.post("/stream", json=batch, headers={SESSION_HEADER: session_id})
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["id"] for line in lines) == [1, 2]
+    tokens = {m["params"]["progressToken"] for m in session_events(session_id)}
+    assert tokens == {"a", "b"}
+
+
+def test_sessionless_progress_is_streamed_in_the_response(stream):
+    client, _ = stream
+    response = client.post("/stream", json=call(ARGUMENTS, token="t2"))
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["method"] == "notifications/progress"
+    assert lines[-1]["id"] == 1
+
+
+def test_session_calls_see_fresh_data_after_invalidation(stream, ga4):
+    client, session_id = stream
+    first = client.post("/stream", json=call(ARGUMENTS), headers={SESSION_HEADER: session_id})
+    ga4.client.rows = [{"country": "US", "sessions": "99"}]
+    client.post("/cache/invalidate", json={}, auth=("admin", "changeme"))
+    second = client.post("/stream", json=call(ARGUMENTS), headers={SESSION_HEADER: session_id})
+    assert "99" not in first.text
+    assert "99" in second.text
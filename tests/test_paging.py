@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+ROWS = [{"pagePath": f"/p{n}", "screenPageViews": str(n)} for n in range(25)]
+
+
+@pytest.mark.skipif("GA4_MAX_ROWS" in os.environ, reason="GA4_MAX_ROWS set in the environment")
+def test_default_fetches_a_single_page(ga4):
+    assert ga4.GA4_MAX_ROWS == ga4.GA4_PAGE_SIZE
+
+
+def test_stops_at_max_rows(ga4, monkeypatch):
+    monkeypatch.setattr(ga4, "GA4_PAGE_SIZE", 10)
+    monkeypatch.setattr(ga4, "GA4_MAX_ROWS", 10)
+    ga4.client.rows = ROWS
+    result = ga4.run_ga4_report("pagePath", "screenPageViews", "2024-01-01", "2024-01-07")
+    assert result == ROWS[:10]
+    assert len(ga4.client.requests) == 1
+
+
+def test_follows_pages_up_to_max_rows(ga4, monkeypatch):
+    monkeypatch.setattr(ga4, "GA4_PAGE_SIZE", 10)
+    monkeypatch.setattr(ga4, "GA4_MAX_ROWS", 100)
+    ga4.client.rows = ROWS
+    result = ga4.run_ga4_report("pagePath", "screenPageViews", "2024-01-01", "2024-01-07")
+    assert result == ROWS
+    assert [r.offset for r in ga4.client.requests] == [0, 10, 20]
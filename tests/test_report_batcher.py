@@ -0,0 +1,81 @@
+import os
+import threading
+
+import pytest
+
+import report_batcher
+from report_batcher import ReportBatcher, _project
+
+ROWS = [
+    {"country": "US", "sessions": "10", "eventCount": "30"},
+    {"country": "NL", "sessions": "0", "eventCount": "5"},
+]
+
+
+@pytest.mark.skipif("GA4_BATCH_WINDOW" in os.environ, reason="GA4_BATCH_WINDOW set in the environment")
+def test_default_window_disables_merging():
+    assert report_batcher.GA4_BATCH_WINDOW == 0
+
+
+def test_project_drops_rows_whose_own_metrics_are_all_zero():
+    assert _project(ROWS, ["sessions"], ["sessions", "eventCount"]) == [{"country": "US", "sessions": "10"}]
+    assert _project(ROWS, ["eventCount"], ["sessions", "eventCount"]) == [
+        {"country": "US", "eventCount": "30"}, {"country": "NL", "eventCount": "5"}
+    ]
+
+
+def test_project_keeps_rows_of_an_unwidened_report():
+    assert _project(ROWS, ["sessions", "eventCount"], ["sessions", "eventCount"]) is ROWS
+
+
+def test_without_window_fetches_directly_with_the_callers_progress():
+    calls = []
+    progress = object()
+    batcher = ReportBatcher(0, 10)
+    batcher.run("k", ["sessions"], lambda metrics, p: calls.append((metrics, p)) or [])
+    batcher.run("k", ["sessions"], lambda metrics, p: calls.append((metrics, p)) or [], progress)
+    assert calls == [(["sessions"], None), (["sessions"], progress)]
+
+
+def run_concurrently(batcher, callers):
+    """Run batcher.run for each (metrics, progress) at once; returns results and fetched metric lists"""
+    fetched = []
+    results = [None] * len(callers)
+    start = threading.Barrier(len(callers))
+
+    def fetch(metrics, progress):
+        fetched.append(list(metrics))
+        if progress is not None:
+            progress(1, len(ROWS), len(ROWS))
+        return [{k: v for k, v in row.items() if k == "country" or k in metrics} for row in ROWS]
+
+    def call(i, metrics, progress):
+        start.wait()
+        results[i] = batcher.run("k", metrics, fetch, progress)
+
+    threads = [threading.Thread(target=call, args=(i, m, p)) for i, (m, p) in enumerate(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, fetched
+
+
+def test_concurrent_calls_share_one_fetch_and_its_progress():
+    seen = {"a": [], "b": []}
+    callers = [
+        (["sessions"], lambda *args: seen["a"].append(args)),
+        (["eventCount"], lambda *args: seen["b"].append(args)),
+    ]
+    results, fetched = run_concurrently(ReportBatcher(0.2, 10), callers)
+
+    assert len(fetched) == 1 and sorted(fetched[0]) == ["eventCount", "sessions"]
+    assert results[0] == [{"country": "US", "sessions": "10"}]
+    assert results[1] == [{"country": "US", "eventCount": "30"}, {"country": "NL", "eventCount": "5"}]
+    assert seen["a"] == seen["b"] == [(1, 2, 2)]
+
+
+def test_metric_limit_splits_batches():
+    callers = [(["sessions"], None), (["eventCount"], None)]
+    _, fetched = run_concurrently(ReportBatcher(0.2, 1), callers)
+    assert sorted(map(tuple, fetched)) == [("eventCount",), ("sessions",)]
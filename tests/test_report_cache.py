@@ -0,0 +1,64 @@
+import pytest
+
+import report_cache
+from report_cache import FRESH, STALE, ReportCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() for the cache"""
+    now = [1000.0]
+    monkeypatch.setattr(report_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_entries_go_from_fresh_to_stale_to_expired(clock):
+    cache = ReportCache(60, 8, stale_while_revalidate=30)
+    cache.set("k", "v")
+    assert cache.lookup("k") == ("v", FRESH)
+    clock[0] += 60
+    assert cache.lookup("k") == ("v", STALE)
+    assert cache.get("k") is None
+    clock[0] += 30
+    assert cache.lookup("k") == (None, None)
+
+
+def test_entry_ttl_overrides_cache_ttl(clock):
+    cache = ReportCache(60, 8)
+    cache.set("k", "v", ttl=3600)
+    clock[0] += 600
+    assert cache.get("k") == "v"
+    cache.set("skipped", "v", ttl=0)
+    assert cache.lookup("skipped") == (None, None)
+
+
+def test_last_good_result_is_kept_for_stale_if_error(clock):
+    cache = ReportCache(60, 8, stale_if_error=300)
+    cache.set("k", "v")
+    stored_at = clock[0]
+    clock[0] += 359
+    assert cache.get("k") is None
+    assert cache.get_if_error("k") == ("v", stored_at)
+    clock[0] += 1
+    assert cache.get_if_error("k") == (None, None)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ReportCache(60, 2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_invalidate_drops_overlapping_and_undated_entries(clock):
+    cache = ReportCache(60, 8)
+    cache.set("january", 1, date_range=("2024-01-01", "2024-01-31"))
+    cache.set("february", 2, date_range=("2024-02-01", "2024-02-29"))
+    cache.set("undated", 3)
+    assert cache.invalidate("2024-02-10", None) == 2
+    assert cache.get("january") == 1
+    assert cache.get("february") is None and cache.get("undated") is None
+    assert cache.invalidate() == 1
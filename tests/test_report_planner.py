@@ -0,0 +1,83 @@
+from report_planner import derive_rows
+
+ADDITIVE = frozenset({"sessions", "screenPageViews", "eventCount"})
+ROLLUP_ADDITIVE = frozenset({"screenPageViews", "eventCount"})
+
+CACHED_SPEC = {
+    "property": "properties/1",
+    "dimensions": ["date", "country"],
+    "metrics": ["sessions", "eventCount"],
+    "date_range": ("2024-01-01", "2024-01-03"),
+    "dimension_filter": None,
+}
+CACHED_ROWS = [
+    {"date": "20240101", "country": "US", "sessions": "10", "eventCount": "30"},
+    {"date": "20240101", "country": "NL", "sessions": "0", "eventCount": "5"},
+    {"date": "20240102", "country": "US", "sessions": "4", "eventCount": "8"},
+    {"date": "20240103", "country": "NL", "sessions": "2", "eventCount": "0"},
+]
+
+
+def spec(**overrides):
+    return {**CACHED_SPEC, **overrides}
+
+
+def derive(requested):
+    return derive_rows(requested, CACHED_SPEC, CACHED_ROWS, ADDITIVE, ROLLUP_ADDITIVE)
+
+
+def test_drops_date_dimension_and_sums_additive_metrics():
+    rows = derive(spec(dimensions=["country"]))
+    assert sorted(rows, key=lambda r: r["country"]) == [
+        {"country": "NL", "sessions": "2", "eventCount": "5"},
+        {"country": "US", "sessions": "14", "eventCount": "38"},
+    ]
+
+
+def test_narrower_date_range_filters_on_the_date_dimension():
+    rows = derive(spec(date_range=("2024-01-02", "2024-01-03")))
+    assert [r["date"] for r in rows] == ["20240102", "20240103"]
+
+
+def test_residual_filter_is_applied():
+    dimension_filter = {"filter": {"fieldName": "country", "stringFilter": {"value": "US"}}}
+    rows = derive(spec(dimension_filter=dimension_filter))
+    assert {r["country"] for r in rows} == {"US"}
+
+
+def test_refuses_to_sum_sessions_across_non_date_dimensions():
+    assert derive(spec(dimensions=["date"])) is None
+
+
+def test_drops_rows_whose_requested_metrics_are_all_zero():
+    rows = derive(spec(metrics=["sessions"]))
+    assert [(r["date"], r["country"]) for r in rows] == [("20240101", "US"), ("20240102", "US"), ("20240103", "NL")]
+    assert all(set(r) == {"date", "country", "sessions"} for r in rows)
+
+    rows = derive(spec(dimensions=["date"], metrics=["eventCount"]))
+    assert rows is not None
+    assert all(r["eventCount"] for r in rows)
+    assert [r["date"] for r in rows] == ["20240101", "20240102"]
+
+
+PAGE_ROWS = [{"date": "20240101", "pagePath": f"/p{n}", "screenPageViews": "1"} for n in range(25)]
+
+
+def test_complete_cached_report_answers_without_calling_ga4(ga4):
+    ga4.client.rows = PAGE_ROWS
+    ga4.run_ga4_report(["date", "pagePath"], "screenPageViews", "2024-01-01", "2024-01-01")
+    result = ga4.run_ga4_report("date", "screenPageViews", "2024-01-01", "2024-01-01")
+    assert result == [{"date": "20240101", "screenPageViews": "25"}]
+    assert len(ga4.client.requests) == 1
+
+
+def test_report_cut_off_at_max_rows_is_not_derived_from(ga4, monkeypatch):
+    monkeypatch.setattr(ga4, "GA4_PAGE_SIZE", 10)
+    monkeypatch.setattr(ga4, "GA4_MAX_ROWS", 10)
+    ga4.client.rows = PAGE_ROWS
+    assert len(ga4.run_ga4_report(["date", "pagePath"], "screenPageViews", "2024-01-01", "2024-01-01")) == 10
+
+    ga4.run_ga4_report("date", "screenPageViews", "2024-01-01", "2024-01-01")
+    assert len(ga4.client.requests) == 2
+    assert [r.dimensions[0].name for r in ga4.client.requests] == ["date", "date"]
+    assert len(ga4.client.requests[1].dimensions) == 1
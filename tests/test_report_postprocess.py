@@ -0,0 +1,69 @@
+import pytest
+
+from report_postprocess import OTHER, postprocess_rows
+
+ADDITIVE = frozenset(["sessions", "screenPageViews"])
+ROLLUP_ADDITIVE = frozenset(["screenPageViews"])
+
+PAGE_ROWS = [
+    {"country": "US", "pagePath": "/", "sessions": "10", "screenPageViews": "12"},
+    {"country": "US", "pagePath": "/pricing", "sessions": "6", "screenPageViews": "7"},
+    {"country": "NL", "pagePath": "/", "sessions": "3", "screenPageViews": "5"},
+]
+DAY_ROWS = [
+    {"date": "20240101", "country": "US", "sessions": "10", "screenPageViews": "20"},
+    {"date": "20240102", "country": "US", "sessions": "5", "screenPageViews": "8"},
+    {"date": "20240101", "country": "NL", "sessions": "2", "screenPageViews": "3"},
+]
+
+
+def process(rows, dimensions, metrics, **options):
+    return postprocess_rows(rows, dimensions, metrics, ADDITIVE, rollup_additive=ROLLUP_ADDITIVE, **options)
+
+
+def test_group_by_sums_sessions_across_dates():
+    rows = process(DAY_ROWS, ["date", "country"], ["sessions"], group_by=["country"])
+    assert rows == [{"country": "US", "sessions": "15"}, {"country": "NL", "sessions": "2"}]
+
+
+def test_group_by_refuses_to_sum_sessions_across_pages():
+    # A session visiting two pages would be counted twice
+    with pytest.raises(ValueError, match="pagePath"):
+        process(PAGE_ROWS, ["country", "pagePath"], ["sessions"], group_by=["country"])
+
+
+def test_group_by_sums_page_views_across_pages():
+    rows = process(PAGE_ROWS, ["country", "pagePath"], ["screenPageViews"], group_by=["country"])
+    assert rows == [{"country": "US", "screenPageViews": "19"}, {"country": "NL", "screenPageViews": "5"}]
+
+
+def test_group_by_refuses_rollup_over_item_dimensions():
+    rows = [{"itemName": "a", "country": "US", "screenPageViews": "1"}]
+    with pytest.raises(ValueError):
+        process(rows, ["itemName", "country"], ["screenPageViews"], group_by=["country"])
+
+
+def test_other_row_only_sums_rollup_metrics_across_dimensions():
+    rows = process(PAGE_ROWS, ["country", "pagePath"], ["sessions", "screenPageViews"], top_n=1)
+    assert rows[0]["pagePath"] == "/"
+    assert rows[-1] == {"country": OTHER, "pagePath": OTHER, "sessions": None, "screenPageViews": "12"}
+
+
+def test_other_row_sums_additive_metrics_across_dates():
+    rows = [{"date": f"2024010{d}", "sessions": str(d)} for d in range(1, 6)]
+    processed = process(rows, ["date"], ["sessions"], max_rows=3)
+    assert processed == [rows[3], rows[4], {"date": OTHER, "sessions": "6"}]
+
+
+def test_top_n_is_sorted_descending():
+    rows = process(DAY_ROWS, ["date", "country"], ["screenPageViews"], top_n=3)
+    assert [r["screenPageViews"] for r in rows] == ["20", "8", "3"]
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError, match="aggregate"):
+        process(DAY_ROWS, ["date", "country"], ["sessions"], aggregate="median")
+    with pytest.raises(ValueError, match="sort_by"):
+        process(DAY_ROWS, ["date", "country"], ["sessions"], top_n=1, sort_by="totalUsers")
+    with pytest.raises(ValueError, match="top_n"):
+        process(DAY_ROWS, ["date", "country"], ["sessions"], top_n=0)
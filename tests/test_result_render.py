@@ -0,0 +1,79 @@
+import json
+
+from result_render import render_result
+
+ROWS = [
+    {"appVersion": "1.10", "operatingSystemVersion": "10.0", "sessions": "3.14159"},
+    {"appVersion": "2.0", "operatingSystemVersion": "11", "sessions": "2"},
+]
+METRICS = ["sessions"]
+
+
+def test_tsv_has_one_header_line_and_rounds_only_metrics():
+    assert render_result(ROWS, "tsv", 2, 0, METRICS) == (
+        "appVersion\toperatingSystemVersion\tsessions\n"
+        "1.10\t10.0\t3.14\n"
+        "2.0\t11\t2"
+    )
+
+
+def test_derived_comparison_columns_are_rounded():
+    rows = [{"appVersion": "1.10", "sessions_previous": "1.005", "sessions_pct_change_previous": "12.3456"}]
+    assert render_result(rows, "tsv", 1, 0, METRICS).splitlines()[1] == "1.10\t1\t12.3"
+
+
+def test_markdown_table():
+    rows = [{"pagePath": "/a|b", "sessions": "1.5"}]
+    assert render_result(rows, "markdown", 2, 0, METRICS) == (
+        "| pagePath | sessions |\n"
+        "| --- | --- |\n"
+        "| /a\\|b | 1.5 |"
+    )
+
+
+def test_json_is_left_as_returned():
+    assert json.loads(render_result(ROWS, "json", 2, 0, METRICS)) == ROWS
+
+
+def test_non_tables_stay_json():
+    assert json.loads(render_result({"error": "boom"}, "tsv")) == {"error": "boom"}
+    assert render_result([], "tsv") == "(no rows)"
+
+
+def test_stale_result_puts_metadata_before_the_table():
+    text = render_result({"data": ROWS, "stale": True}, "tsv", 2, 0, METRICS)
+    meta, header, *rows = text.splitlines()
+    assert json.loads(meta) == {"stale": True}
+    assert header == "appVersion\toperatingSystemVersion\tsessions"
+    assert len(rows) == 2
+
+
+def test_tsv_is_truncated_at_a_row_boundary_with_a_note():
+    rows = [{"pagePath": f"/page/{n}", "sessions": str(n)} for n in range(100)]
+    text = render_result(rows, "tsv", 2, 300, METRICS)
+    assert len(text) <= 300
+    lines = text.splitlines()
+    shown = len(lines) - 2
+    assert 0 < shown < 100
+    assert lines[1:-1] == [f"/page/{n}\t{n}" for n in range(shown)]
+    assert lines[-1].startswith(f"[truncated: showing {shown} of 100 rows")
+
+
+def test_json_is_truncated_at_a_row_boundary_with_a_note():
+    rows = [{"pagePath": f"/page/{n}", "sessions": str(n)} for n in range(100)]
+    text = render_result(rows, "json", 2, 1000, METRICS)
+    assert len(text) <= 1000
+    document = json.loads(text)
+    shown = len(document["data"])
+    assert 0 < shown < 100
+    assert document["data"] == rows[:shown]
+    assert document["truncated"].startswith(f"[truncated: showing {shown} of 100 rows")
+
+
+def test_tool_content_rounds_the_report_metrics(monkeypatch):
+    import result_render
+    from mcp_dispatch import tool_content
+
+    monkeypatch.setattr(result_render, "MCP_RESULT_FORMAT", "tsv")
+    text = tool_content(ROWS, "mcp", METRICS)["content"][0]["text"]
+    assert text.splitlines()[1] == "1.10\t10.0\t3.14"
@@ -0,0 +1,51 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+import mcp_http_bridge
+import mcp_http_streamable
+import server_metrics
+
+AUTH = (mcp_http_bridge.API_USERNAME, mcp_http_bridge.API_PASSWORD)
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? (-?[0-9.e+-]+|[+-]Inf|NaN)$')
+
+
+def payload_sum(transport):
+    state = server_metrics.PAYLOAD_BYTES._values.get((transport,))
+    return state[1] if state else 0
+
+
+def test_payload_size_counts_utf8_bytes():
+    text, size = server_metrics.serialize(None, "test-utf8", lambda result: "Zürich\tMünchen")
+    assert text == "Zürich\tMünchen"
+    assert size == len(text.encode("utf-8")) == 16
+    assert payload_sum("test-utf8") == 16
+
+
+@pytest.mark.parametrize("app", [mcp_http_bridge.app, mcp_http_streamable.app], ids=["bridge", "streamable"])
+def test_metrics_exposition(app, ga4):
+    client = TestClient(app)
+    ga4.client.rows = [{"city": "Zürich", "sessions": "3"}]
+    call = {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": "get_ga4_data", "arguments": {
+        "dimensions": ["city"], "metrics": ["sessions"],
+        "date_range_start": "2024-01-01", "date_range_end": "2024-01-07"
+    }}}
+    assert "result" in client.post("/mcp", json=call, auth=AUTH).json()
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == server_metrics.CONTENT_TYPE
+    lines = response.text.strip().splitlines()
+    for line in lines:
+        assert line.startswith(("# HELP ", "# TYPE ")) or SAMPLE.match(line), line
+    assert "# TYPE ga4_response_payload_bytes histogram" in lines
+    assert "# TYPE ga4_cache_hit_ratio gauge" in lines
+
+    # Histogram buckets are cumulative and end with +Inf == _count
+    buckets = [line for line in lines if line.startswith('ga4_response_payload_bytes_bucket{transport="mcp"')]
+    counts = [float(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts) and counts[-1] >= 1
+    assert 'le="+Inf"' in buckets[-1]
+    count_line = next(line for line in lines if line.startswith('ga4_response_payload_bytes_count{transport="mcp"}'))
+    assert float(count_line.rsplit(" ", 1)[1]) == counts[-1]
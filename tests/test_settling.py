@@ -0,0 +1,65 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from ga4_dates import classify_date_range, settled_on
+from report_store import ReportStore
+
+TODAY = date(2024, 3, 10)
+SETTLING_DAYS = 3
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ReportStore(str(tmp_path / "store.sqlite3"))
+
+
+def fetched_on(day):
+    return datetime.combine(day, datetime.min.time()).timestamp() + 12 * 3600
+
+
+def test_a_day_settles_after_settling_days_full_days():
+    assert settled_on(date(2024, 3, 6), 3) == date(2024, 3, 10)
+
+
+@pytest.mark.parametrize("age, expected", [(0, "intraday"), (1, "recent"), (3, "recent"), (4, "historical")])
+def test_classify_date_range_boundaries(age, expected):
+    day = TODAY - timedelta(days=age)
+    assert classify_date_range(day, day, SETTLING_DAYS, today=TODAY) == expected
+
+
+def test_plan_refresh_refetches_the_settling_days(store):
+    start = TODAY - timedelta(days=9)
+    days = [start + timedelta(days=n) for n in range(10)]
+    store.save("k", {}, {day: [] for day in days}, fetched_at=fetched_on(TODAY))
+
+    # Fetched today: the last SETTLING_DAYS days before today (and today) may still change
+    assert store.plan_refresh("k", start, TODAY, SETTLING_DAYS) == [(TODAY - timedelta(days=3), TODAY)]
+
+
+def test_plan_refresh_agrees_with_classify_date_range(store):
+    start = TODAY - timedelta(days=9)
+    days = [start + timedelta(days=n) for n in range(10)]
+    store.save("k", {}, {day: [] for day in days}, fetched_at=fetched_on(TODAY))
+    refetched = {day for s, e in store.plan_refresh("k", start, TODAY, SETTLING_DAYS)
+                 for day in days if s <= day <= e}
+    for day in days:
+        historical = classify_date_range(day, day, SETTLING_DAYS, today=TODAY) == "historical"
+        assert (day not in refetched) == historical, day
+
+
+def test_plan_refresh_fetches_missing_days_and_keeps_settled_ones(store):
+    start = date(2024, 1, 1)
+    store.save("k", {}, {start: [], start + timedelta(days=2): []}, fetched_at=fetched_on(TODAY))
+    assert store.plan_refresh("k", start, start + timedelta(days=3), SETTLING_DAYS) == [
+        (start + timedelta(days=1), start + timedelta(days=1)),
+        (start + timedelta(days=3), start + timedelta(days=3)),
+    ]
+
+
+def test_plan_refresh_refetches_days_fetched_before_they_settled(store):
+    day = date(2024, 1, 1)
+    store.save("k", {}, {day: []}, fetched_at=fetched_on(settled_on(day, SETTLING_DAYS) - timedelta(days=1)))
+    assert store.plan_refresh("k", day, day, SETTLING_DAYS) == [(day, day)]
+    store.save("k", {}, {day: []}, fetched_at=fetched_on(settled_on(day, SETTLING_DAYS)))
+    assert store.plan_refresh("k", day, day, SETTLING_DAYS) == []
@@ -0,0 +1,77 @@
+import threading
+
+from conftest import FakeGA4Client
+
+
+class ShardedClient(FakeGA4Client):
+    """
+    Answers each request with the rows of its date range (the "date" values);
+    the first shard is held back until the last one was answered, so shards
+    complete out of order.
+    """
+
+    def __init__(self, rows, last_start):
+        super().__init__(rows)
+        self.last_start = last_start
+        self.last_answered = threading.Event()
+        self._lock = threading.Lock()
+
+    def run_report(self, request):
+        date_range = request.date_ranges[0]
+        start, end = date_range.start_date.replace("-", ""), date_range.end_date.replace("-", "")
+        shard = FakeGA4Client([row for row in self.rows if start <= row["date"] <= end])
+        if date_range.start_date != self.last_start:
+            assert self.last_answered.wait(5)
+        response = shard.run_report(request)
+        with self._lock:
+            self.requests.append(request)
+        if date_range.start_date == self.last_start:
+            self.last_answered.set()
+        return response
+
+
+def day_rows(days, countries=("US", "NL")):
+    return [{"date": day, "country": country, "sessions": "1"} for day in days for country in countries]
+
+
+def shard_ranges(client):
+    return sorted((r.date_ranges[0].start_date, r.date_ranges[0].end_date) for r in client.requests)
+
+
+def test_non_additive_metrics_need_a_date_dimension(ga4):
+    result = ga4.run_ga4_report("country", "bounceRate", "2024-01-01", "2024-01-31", shard_by="week")
+    assert "Cannot shard non-additive metrics ['bounceRate']" in result["error"]
+    assert ga4.client.requests == []
+
+
+def test_week_shards_are_fetched_and_concatenated_in_order(ga4, monkeypatch):
+    days = [f"202401{d:02d}" for d in range(3, 17)]
+    client = ShardedClient(day_rows(days), last_start="2024-01-15")
+    monkeypatch.setattr(ga4, "client_pool", [client])
+    monkeypatch.setattr(ga4, "GA4_SHARD_CONCURRENCY", 4)
+
+    # 2024-01-03 is a Wednesday; weeks start on Monday
+    result = ga4.run_ga4_report(["date", "country"], "sessions", "2024-01-03", "2024-01-16", shard_by="week")
+
+    assert shard_ranges(client) == [
+        ("2024-01-03", "2024-01-07"), ("2024-01-08", "2024-01-14"), ("2024-01-15", "2024-01-16")
+    ]
+    assert result == day_rows(days)
+
+
+def test_month_shards_without_a_date_dimension_are_summed(ga4, monkeypatch):
+    days = ["20240120", "20240131", "20240201", "20240229", "20240305"]
+    client = ShardedClient(day_rows(days) + [{"date": "20240301", "country": "DE", "sessions": "2"}],
+                           last_start="2024-03-01")
+    monkeypatch.setattr(ga4, "client_pool", [client])
+    monkeypatch.setattr(ga4, "GA4_SHARD_CONCURRENCY", 4)
+
+    result = ga4.run_ga4_report("country", "sessions", "2024-01-20", "2024-03-05", shard_by="month")
+
+    assert shard_ranges(client) == [
+        ("2024-01-20", "2024-01-31"), ("2024-02-01", "2024-02-29"), ("2024-03-01", "2024-03-05")
+    ]
+    # Countries in order of their first shard, sums across shards
+    assert result == [
+        {"country": "US", "sessions": "5"}, {"country": "NL", "sessions": "5"}, {"country": "DE", "sessions": "2"}
+    ]
@@ -0,0 +1,33 @@
+import pytest
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+
+ROWS = [{"country": "US", "sessions": "10"}, {"country": "NL", "sessions": "4"}]
+
+
+@pytest.mark.parametrize("error", [ResourceExhausted("quota exhausted"), ServiceUnavailable("backend down")])
+def test_ga4_error_serves_last_good_result(ga4, error):
+    ga4.client.rows = ROWS
+    fresh = ga4.run_ga4_report("country", "sessions", "yesterday", "yesterday")
+    assert fresh == ROWS
+
+    ga4.client.error = error
+    result = ga4.run_ga4_report("country", "sessions", "yesterday", "yesterday", refresh=True)
+
+    assert result["data"] == ROWS
+    assert result["stale"] is True
+    assert error.message in result["staleReason"]
+
+
+def test_ga4_error_without_cache_reports_ga4_message(ga4):
+    ga4.client.error = ResourceExhausted("quota exhausted")
+    result = ga4.run_ga4_report("country", "sessions", "yesterday", "yesterday")
+    assert "quota exhausted" in result["error"]
+    assert "not callable" not in result["error"]
+
+
+def test_grpc_style_details_method_is_called(ga4):
+    class RpcError(Exception):
+        def details(self):
+            return "rate limited"
+
+    assert ga4._describe_ga4_error(RpcError("boom")).endswith("Details: rate limited")
@@ -0,0 +1,18 @@
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from startup import DEFERRED, measure  # noqa: E402
+
+# Generous on purpose (imports take well under a second here) so slow CI machines pass;
+# tighten it locally with python benchmarks/startup.py --budget
+STARTUP_BUDGET = float(os.getenv("GA4_STARTUP_BUDGET", "5"))
+
+
+def test_startup_stays_within_budget_and_defers_heavy_imports():
+    times, loaded = measure(3)
+    assert loaded == [], f"imported at startup instead of on first use: {loaded} (of {DEFERRED})"
+    median = statistics.median(times)
+    assert median <= STARTUP_BUDGET, f"median import time {median:.2f}s exceeds the {STARTUP_BUDGET}s budget"
@@ -0,0 +1,29 @@
+import pytest
+
+import tracing
+
+pytest.importorskip("opentelemetry.sdk")
+
+
+@pytest.fixture
+def spans():
+    exporter = tracing.configure_tracing("memory")
+    yield exporter
+    tracing.configure_tracing("none")
+
+
+def test_report_call_records_spans(ga4, spans):
+    ga4.client.rows = [{"country": "US", "sessions": "10"}]
+    ga4.run_ga4_report("country", "sessions", "yesterday", "yesterday")
+
+    names = [span.name for span in spans.get_finished_spans()]
+    assert {"ga4.get_client", "ga4.run_report", "ga4.format_rows"} <= set(names)
+    run_report = next(span for span in spans.get_finished_spans() if span.name == "ga4.run_report")
+    assert run_report.attributes
+
+
+def test_spans_are_not_recorded_once_tracing_is_disabled(spans):
+    tracing.configure_tracing("none")
+    with tracing.start_span("ignored") as span:
+        assert span is None
+    assert spans.get_finished_spans() == ()
@@ -0,0 +1,49 @@
+from datetime import date, timedelta
+
+import pytest
+
+import ga4_mcp_server
+from warm_queries import WarmQueryRegistry, default_interval
+
+QUERY = {"dimensions": ["date"], "metrics": ["sessions"]}
+
+
+def days_ago(n):
+    return (date.today() - timedelta(days=n)).isoformat()
+
+
+@pytest.fixture
+def registry():
+    return WarmQueryRegistry(lambda **query: [], default_interval, stagger=0)
+
+
+def interval_of(registry, name):
+    return next(q["interval"] for q in registry.list() if q["name"] == name)
+
+
+@pytest.mark.parametrize("start, end, ttl", [
+    ("7daysAgo", "today", ga4_mcp_server.GA4_CACHE_TTL_INTRADAY),
+    ("7daysAgo", "yesterday", ga4_mcp_server.GA4_CACHE_TTL),
+    ("60daysAgo", "30daysAgo", ga4_mcp_server.GA4_CACHE_TTL_HISTORICAL),
+])
+def test_interval_follows_the_cache_ttl_of_the_dates(registry, start, end, ttl):
+    name = registry.register({**QUERY, "date_range_start": start, "date_range_end": end})
+    assert interval_of(registry, name) == max(int(ttl * 0.8), 1)
+
+
+def test_explicit_interval_wins(registry):
+    name = registry.register({**QUERY, "date_range_start": "today", "date_range_end": "today"}, interval=600)
+    assert interval_of(registry, name) == 600
+
+
+def test_date_ranges_use_their_span(registry):
+    ranges = [{"start_date": "7daysAgo", "end_date": "today"}, {"start_date": days_ago(60), "end_date": days_ago(54)}]
+    name = registry.register({**QUERY, "date_ranges": ranges})
+    assert interval_of(registry, name) == int(ga4_mcp_server.GA4_CACHE_TTL_INTRADAY * 0.8)
+
+
+def test_rejects_unknown_fields_and_bad_intervals(registry):
+    with pytest.raises(ValueError, match="Unknown query fields"):
+        registry.register({**QUERY, "group_by": ["date"]})
+    with pytest.raises(ValueError, match="interval"):
+        registry.register(QUERY, interval=-1)
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from ga4_logging import get_logger
+from server_metrics import TOKEN_REFRESHES
+
+logger = get_logger("credentials")
+
+# Seconds before expiry at which the access token is refreshed in the background (0 disables).
+# Must exceed google-auth's own refresh threshold (225s) so requests never refresh inline.
+GA4_TOKEN_REFRESH_MARGIN = int(os.getenv("GA4_TOKEN_REFRESH_MARGIN", "600"))
+# Seconds before retrying a failed refresh (doubled per consecutive failure, up to 5 minutes)
+GA4_TOKEN_REFRESH_RETRY = float(os.getenv("GA4_TOKEN_REFRESH_RETRY", "10"))
+
+
+def _utcnow():
+    # google-auth keeps expiry as a naive UTC datetime
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TokenRefresher:
+    """
+    Keeps the access token of a google-auth credentials object fresh from a
+    background thread, so no request pays for the OAuth round trip.
+
+    Every pooled client shares the same credentials object, so one refresh
+    covers all of them. The first token is fetched as soon as the thread
+    starts; later ones `margin` seconds before the current one expires.
+    """
+
+    def __init__(self, credentials, margin=GA4_TOKEN_REFRESH_MARGIN, retry=GA4_TOKEN_REFRESH_RETRY):
+        self.credentials = credentials
+        self.margin = margin
+        self.retry = retry
+        self.refreshed_at = None
+        self.failures = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Fetch a new access token now"""
+        # Imported here to keep google-auth's HTTP transport off the startup path
+        from google.auth.transport.requests import Request
+
+        with self._lock:
+            try:
+                self.credentials.refresh(Request())
+            except Exception:
+                TOKEN_REFRESHES.inc(labels=("error",))
+                raise
+            self.refreshed_at = time.time()
+        TOKEN_REFRESHES.inc(labels=("ok",))
+
+    def expires_in(self):
+        """Seconds until the current token expires, or None before the first token"""
+        expiry = getattr(self.credentials, "expiry", None)
+        if expiry is None or self.refreshed_at is None:
+            return None
+        return (expiry - _utcnow()).total_seconds()
+
+    def token_age(self):
+        """Seconds since the current token was fetched, or None before the first token"""
+        if self.refreshed_at is None:
+            return None
+        return time.time() - self.refreshed_at
+
+    def _next_delay(self):
+        expires_in = self.expires_in()
+        if expires_in is None:
+            # Token without an expiry: look again in an hour
+            return 3600
+        # Tokens shorter-lived than the margin are refreshed at half-life instead
+        return max(expires_in - self.margin, expires_in / 2, 1)
+
+    def start(self):
+        """Start the refresh thread (idempotent; no-op when margin is 0)"""
+        if self._thread is not None or self.margin <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="ga4-token-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        delay = 0
+        while not self._stop.wait(delay):
+            try:
+                self.refresh()
+                self.failures = 0
+                delay = self._next_delay()
+                logger.debug("Access token refreshed", extra={"fields": {"next_refresh_in": round(delay)}})
+            except Exception as e:
+                self.failures += 1
+                delay = min(self.retry * 2 ** (self.failures - 1), 300)
+                logger.warning("Access token refresh failed (retrying in %.1fs): %s", delay, e)
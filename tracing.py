@@ -0,0 +1,88 @@
+import os
+import sys
+from contextlib import nullcontext
+
+from ga4_logging import get_logger
+
+logger = get_logger("tracing")
+
+# Span exporter: "none" (default), "console", "otlp" or "memory" (in-process, for tests)
+GA4_TRACES_EXPORTER = os.getenv("GA4_TRACES_EXPORTER", os.getenv("OTEL_TRACES_EXPORTER", "none")).lower()
+
+# Shared no-op context manager returned while tracing is disabled
+_NO_SPAN = nullcontext()
+
+_tracer = None
+
+
+def configure_tracing(exporter=GA4_TRACES_EXPORTER):
+    """
+    Configure span export; call again to switch exporters (e.g. in tests).
+
+    Returns:
+        The span exporter in use (an InMemorySpanExporter for "memory", whose
+        get_finished_spans() lists recorded spans), or None when disabled.
+    """
+    global _tracer
+
+    _tracer = None
+    if exporter in ("", "none"):
+        return None
+    # OpenTelemetry is optional (pip install opentelemetry-sdk, plus opentelemetry-exporter-otlp
+    # for "otlp") and only imported when tracing is enabled, keeping it off the startup path
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    except ImportError:
+        logger.warning("Tracing exporter '%s' requested but opentelemetry-sdk is not installed", exporter)
+        return None
+
+    if exporter == "memory":
+        span_exporter = InMemorySpanExporter()
+        processor = SimpleSpanProcessor(span_exporter)
+    elif exporter == "console":
+        span_exporter = ConsoleSpanExporter(out=sys.stderr)
+        processor = SimpleSpanProcessor(span_exporter)
+    elif exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("OTLP tracing requires opentelemetry-exporter-otlp")
+            return None
+        span_exporter = OTLPSpanExporter()
+        processor = BatchSpanProcessor(span_exporter)
+    else:
+        logger.warning("Unknown tracing exporter '%s', tracing disabled", exporter)
+        return None
+
+    provider = TracerProvider(resource=Resource.create({
+        "service.name": os.getenv("OTEL_SERVICE_NAME", "ga4-mcp-server")
+    }))
+    provider.add_span_processor(processor)
+    _tracer = provider.get_tracer("ga4-mcp-server")
+    return span_exporter
+
+
+def start_span(name, attributes=None):
+    """
+    Context manager for a span named `name`.
+
+    Yields the span, or None while tracing is disabled, in which case this is a
+    shared nullcontext and costs next to nothing.
+    """
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def set_attributes(span, attributes):
+    """Set a dict of attributes on a span yielded by start_span (no-op when tracing is off)"""
+    if span is not None:
+        for key, value in attributes.items():
+            if value is not None:
+                span.set_attribute(key, value)
+
+
+configure_tracing()
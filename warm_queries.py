@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from ga4_logging import get_logger
+from ga4_mcp_server import report_cache_ttl, run_ga4_report
+from report_cache import ReportCache
+
+logger = get_logger("warm")
+
+# Optional JSON file with queries to keep warm, e.g.
+# [{"name": "daily-users", "dimensions": ["date"], "metrics": ["totalUsers"], "interval": 240}]
+GA4_WARM_QUERIES_FILE = os.getenv("GA4_WARM_QUERIES_FILE")
+# Refresh interval in seconds for queries registered without one; by default each query is
+# refreshed at WARM_TTL_FRACTION of its cache TTL, which depends on its dates (see _cache_policy)
+GA4_WARM_INTERVAL = int(os.getenv("GA4_WARM_INTERVAL", "0"))
+WARM_TTL_FRACTION = 0.8
+# Minimum number of seconds between two warm refreshes, to spread them over GA4's quota
+GA4_WARM_STAGGER = float(os.getenv("GA4_WARM_STAGGER", "2"))
+
+# get_ga4_data arguments a warm query may set
+QUERY_FIELDS = (
+    "dimensions", "metrics", "date_range_start", "date_range_end", "date_ranges",
+    "dimension_filter", "shard_by", "incremental"
+)
+
+
+def default_interval(query):
+    """Refresh interval for a query registered without one: GA4_WARM_INTERVAL, or just inside its cache TTL"""
+    if GA4_WARM_INTERVAL > 0:
+        return GA4_WARM_INTERVAL
+    ttl = report_cache_ttl(query["date_range_start"], query["date_range_end"], query.get("date_ranges"))
+    return max(int(ttl * WARM_TTL_FRACTION), 1)
+
+
+class WarmQueryRegistry:
+    """
+    Registry of hot get_ga4_data queries plus a background scheduler.
+
+    Each registered query is re-run with refresh=True every `interval` seconds so
+    its result-cache entry is always fresh; queries registered without an
+    interval use `interval_fn(query)`, recomputed after every run since
+    relative dates move between cache TTL classes. Consecutive refreshes are at
+    least `stagger` seconds apart so a dozen dashboards never hit GA4 at once.
+    """
+
+    def __init__(self, refresh_fn, interval_fn, stagger):
+        self.refresh_fn = refresh_fn
+        self.interval_fn = interval_fn
+        self.stagger = stagger
+        self._queries = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._last_finished = 0.0
+
+    def register(self, query, name=None, interval=None):
+        """Register (or replace) a warm query and return its name"""
+        unknown = set(query) - set(QUERY_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown query fields: {sorted(unknown)}. Allowed: {list(QUERY_FIELDS)}")
+        if not query.get("dimensions") or not query.get("metrics"):
+            raise ValueError("Warm queries must set both 'dimensions' and 'metrics'")
+        if interval is not None and interval <= 0:
+            raise ValueError("interval must be a positive number of seconds")
+
+        query = {"date_range_start": "7daysAgo", "date_range_end": "yesterday", **query}
+        name = name or ReportCache.make_key(query)[:12]
+        with self._condition:
+            self._queries[name] = {
+                "query": query,
+                "interval": interval,
+                "next_run": time.time(),
+                "last_run": None,
+                "last_error": None
+            }
+            self._condition.notify()
+        return name
+
+    def unregister(self, name):
+        """Remove a warm query; returns False when it was not registered"""
+        with self._condition:
+            return self._queries.pop(name, None) is not None
+
+    def list(self):
+        """Registered queries with their schedule and last outcome"""
+        with self._condition:
+            return [
+                {
+                    "name": name,
+                    "query": entry["query"],
+                    "interval": self._interval(entry),
+                    "next_run": datetime.fromtimestamp(entry["next_run"]).isoformat(),
+                    "last_run": datetime.fromtimestamp(entry["last_run"]).isoformat() if entry["last_run"] else None,
+                    "last_error": entry["last_error"]
+                }
+                for name, entry in self._queries.items()
+            ]
+
+    def _interval(self, entry):
+        return entry["interval"] or self.interval_fn(entry["query"])
+
+    def load_file(self, path):
+        """Register every query listed in a JSON config file"""
+        with open(path) as f:
+            entries = json.load(f)
+        for entry in entries:
+            entry = dict(entry)
+            name = entry.pop("name", None)
+            interval = entry.pop("interval", None)
+            self.register(entry, name=name, interval=interval)
+
+    def start(self):
+        """Start the scheduler thread (idempotent)"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="ga4-warm-queries", daemon=True)
+        self._thread.start()
+
+    def _next_due(self):
+        """Block until a query is due, then reschedule it and return (name, entry)"""
+        with self._condition:
+            while True:
+                if not self._queries:
+                    self._condition.wait()
+                    continue
+                name, entry = min(self._queries.items(), key=lambda item: item[1]["next_run"])
+                due = max(entry["next_run"], self._last_finished + self.stagger)
+                delay = due - time.time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                entry["next_run"] = time.time() + self._interval(entry)
+                return name, entry
+
+    def _run(self):
+        while True:
+            name, entry = self._next_due()
+            try:
+                result = self.refresh_fn(**entry["query"], refresh=True)
+                error = result.get("error") if isinstance(result, dict) else None
+            except Exception as e:
+                error = str(e)
+            if error:
+                logger.warning("Warm query '%s' failed", name, extra={"fields": {"error": error}})
+            with self._condition:
+                entry["last_run"] = time.time()
+                entry["last_error"] = error
+                self._last_finished = time.time()
+
+
+warm_registry = WarmQueryRegistry(run_ga4_report, default_interval, GA4_WARM_STAGGER)
+
+
+def start_warming():
+    """Load configured warm queries and start the scheduler"""
+    if GA4_WARM_QUERIES_FILE:
+        try:
+            warm_registry.load_file(GA4_WARM_QUERIES_FILE)
+        except Exception as e:
+            logger.error("Failed to load warm queries from %s: %s", GA4_WARM_QUERIES_FILE, e)
+    warm_registry.start()